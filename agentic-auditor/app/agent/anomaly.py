@@ -0,0 +1,439 @@
+# anomaly.py
+# Streaming, vectorized anomaly detector over the event stream.
+#
+# Events are ingested in batches: each batch is turned into a few numpy
+# columns and folded into array-backed per-agent / per-model state, so the
+# cost per event is a handful of vector operations and memory is bounded by
+# the number of agents, models and distinct inputs/outputs, not by events.
+#
+# State kept:
+#   agents: actions, x402 payments (total and per-minute burst), cost sum and
+#           max, empty links, timestamp skew
+#   models: inferences, registrations, latency histogram (log bins), input and
+#           output entropy, most repeated input and how many distinct outputs
+#           it produced, timestamp skew
+# Findings are computed on demand from that state.
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.agent.summarize import item_agent, item_model, item_time, item_type
+from app.core.logger import get_logger
+
+FUTURE_SKEW_S = float(os.getenv("ANOMALY_FUTURE_SKEW_S", "300"))
+PAYMENT_BURST_PER_MIN = int(os.getenv("ANOMALY_PAYMENT_BURST", "10"))
+REPEAT_MIN = int(os.getenv("ANOMALY_REPEAT_MIN", "10"))
+LATENCY_FACTOR = float(os.getenv("ANOMALY_LATENCY_FACTOR", "5"))
+COST_PER_PAYMENT_MAX = float(os.getenv("ANOMALY_COST_MAX", "1.0"))
+MIN_SAMPLES = 20
+
+# Latency histogram: 64 log-spaced bins from 0.1 ms to 100 s
+LATENCY_EDGES = np.geomspace(0.1, 1e5, 65)
+
+_M40 = (1 << 40) - 1
+_M63 = (1 << 63) - 1
+
+logger = get_logger("anomaly")
+
+
+def _h40(values):
+    return np.fromiter((hash(v) & _M40 for v in values), dtype=np.uint64, count=len(values))
+
+
+class _CountTable:
+    """Sorted uint64 keys -> counts (plus a second counter), merged by batch."""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.extra = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys):
+        """Count keys; returns (unique keys, positions, counts before, is_new)."""
+        uniq, n = np.unique(keys, return_counts=True)
+        pos = np.searchsorted(self.keys, uniq)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == uniq[found]
+
+        old = np.zeros(len(uniq), dtype=np.int64)
+        old[found] = self.counts[pos[found]]
+        self.counts[pos[found]] += n[found]
+
+        new = ~found
+        if new.any():
+            self.keys = np.insert(self.keys, pos[new], uniq[new])
+            self.counts = np.insert(self.counts, pos[new], n[new])
+            self.extra = np.insert(self.extra, pos[new], 0)
+        return uniq, np.searchsorted(self.keys, uniq), old, new
+
+    def bump_extra(self, keys):
+        pos = np.searchsorted(self.keys, keys)
+        np.add.at(self.extra, pos, 1)
+
+
+class _Entities:
+    """name -> row, with numpy columns that grow by doubling."""
+
+    def __init__(self, columns):
+        self.index = {}
+        self.names = []
+        self._specs = columns  # name -> (fill value, dtype, trailing shape)
+        self._cap = 0
+        for name, (fill, dtype, shape) in columns.items():
+            setattr(self, name, np.full((0, *shape), fill, dtype=dtype))
+
+    def __len__(self):
+        return len(self.names)
+
+    def rows(self, names):
+        index = self.index
+        out = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            row = index.get(name)
+            if row is None:
+                row = index[name] = len(self.names)
+                self.names.append(name)
+            out[i] = row
+        if len(self.names) > self._cap:
+            self._grow(len(self.names))
+        return out
+
+    def _grow(self, needed):
+        cap = max(needed, 2 * self._cap, 64)
+        for name, (fill, dtype, shape) in self._specs.items():
+            old = getattr(self, name)
+            new = np.full((cap, *shape), fill, dtype=dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self._cap = cap
+
+    def view(self, column):
+        return getattr(self, column)[:len(self.names)]
+
+
+def _entropy_bits(n, s):
+    # H = ln N - (sum c ln c) / N, from running N and S = sum c ln c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = (np.log(n) - s / n) / math.log(2)
+    return np.where(n > 0, h, 0.0)
+
+
+def _percentile_from_hist(hist, q):
+    total = hist.sum(axis=-1)
+    cum = np.cumsum(hist, axis=-1)
+    idx = (cum < (q * total)[..., None]).sum(axis=-1)
+    idx = np.minimum(idx, hist.shape[-1] - 1)
+    return np.where(total > 0, LATENCY_EDGES[idx + 1], np.nan)
+
+
+def _links_empty(e):
+    links = e.get("links")
+    if not isinstance(links, dict):
+        return True
+    return not any(links.get(k) for k in ("inference_ids", "model_ids", "inferenceIds", "modelIds"))
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.events_seen = 0
+        self.unattributed_actions = 0
+        self.inferences_without_model = 0
+        self.future_events = 0
+        self.agents = _Entities({
+            "actions": (0, np.int64, ()),
+            "payments": (0, np.int64, ()),
+            "cost_sum": (0.0, np.float64, ()),
+            "cost_max": (0.0, np.float64, ()),
+            "empty_links": (0, np.int64, ()),
+            "future": (0, np.int64, ()),
+            "max_skew": (0.0, np.float64, ()),
+            "first_ts": (np.inf, np.float64, ()),
+            "last_ts": (-np.inf, np.float64, ()),
+            "burst_minute": (-1, np.int64, ()),
+            "burst_count": (0, np.int64, ()),
+            "burst_max": (0, np.int64, ()),
+        })
+        self.models = _Entities({
+            "inferences": (0, np.int64, ()),
+            "versions": (0, np.int64, ()),
+            "registered": (0, np.int64, ()),
+            "referenced": (0, np.int64, ()),
+            "future": (0, np.int64, ()),
+            "max_skew": (0.0, np.float64, ()),
+            "latency": (0, np.int64, (len(LATENCY_EDGES) - 1,)),
+            "in_s": (0.0, np.float64, ()),
+            "out_s": (0.0, np.float64, ()),
+        })
+        self.inputs = _CountTable()    # (model, input) -> count, distinct outputs
+        self.outputs = _CountTable()   # (model, output) -> count
+        self.triples = _CountTable()   # (model, input, output) seen
+
+    # -- ingestion ---------------------------------------------------------
+
+    def ingest(self, events, now=None):
+        """Fold a batch of events into the state."""
+        if not events:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            self._ingest(events, now)
+            self.events_seen += len(events)
+        return len(events)
+
+    def _ingest(self, events, now):
+        types = [item_type(e) for e in events]
+        ts = np.array([item_time(e) or now for e in events], dtype=np.float64)
+        skew = ts - now
+        future = skew > FUTURE_SKEW_S
+        self.future_events += int(future.sum())
+
+        # -- agent actions -------------------------------------------------
+        act = [i for i, t in enumerate(types) if t == "agent_action"]
+        named = [i for i in act if item_agent(events[i])]
+        self.unattributed_actions += len(act) - len(named)
+        if named:
+            rows = self.agents.rows([item_agent(events[i]) for i in named])
+            idx = np.array(named)
+            pay = np.array([events[i].get("action_type") == "x402_payment" for i in named])
+            meta = [events[i].get("metadata") if isinstance(events[i].get("metadata"), dict) else {} for i in named]
+            cost = np.nan_to_num(np.array([_number(m.get("cost")) for m in meta]))
+            a = self.agents
+            np.add.at(a.actions, rows, 1)
+            np.add.at(a.payments, rows, pay.astype(np.int64))
+            np.add.at(a.cost_sum, rows, cost)
+            np.maximum.at(a.cost_max, rows, cost)
+            np.add.at(a.empty_links, rows, np.array([_links_empty(events[i]) for i in named], dtype=np.int64))
+            np.add.at(a.future, rows, future[idx].astype(np.int64))
+            np.maximum.at(a.max_skew, rows, skew[idx])
+            np.minimum.at(a.first_ts, rows, ts[idx])
+            np.maximum.at(a.last_ts, rows, ts[idx])
+            if pay.any():
+                self._payment_bursts(rows[pay], ts[idx][pay])
+
+        # -- model registrations / references ------------------------------
+        ver = [i for i, t in enumerate(types) if t == "model_version" and item_model(events[i])]
+        if ver:
+            rows = self.models.rows([item_model(events[i]) for i in ver])
+            np.add.at(self.models.versions, rows, 1)
+            has_meta = np.array([bool(events[i].get("metadata")) for i in ver], dtype=np.int64)
+            np.maximum.at(self.models.registered, rows, has_meta)
+
+        linked = [m for i in act for m in ((events[i].get("links") or {}).get("model_ids") or [])
+                  if isinstance(m, str)]
+        if linked:
+            # rows() may grow the columns: look them up after it
+            rows = self.models.rows(linked)
+            np.add.at(self.models.referenced, rows, 1)
+
+        # -- inferences ----------------------------------------------------
+        inf = [i for i, t in enumerate(types) if t == "model_inference"]
+        with_model = [i for i in inf if item_model(events[i])]
+        self.inferences_without_model += len(inf) - len(with_model)
+        if with_model:
+            self._inferences(events, with_model, future, skew)
+
+    def _payment_bursts(self, rows, ts):
+        # Payments per (agent, minute); a burst continuing from the previous
+        # batch's last minute is carried over.
+        a = self.agents
+        minutes = (ts // 60).astype(np.int64)
+        keys = rows.astype(np.int64) * (1 << 32) + minutes
+        uniq, counts = np.unique(keys, return_counts=True)
+        urows, umin = uniq >> 32, uniq & 0xFFFFFFFF
+        carry = a.burst_minute[urows] == umin
+        counts = counts + np.where(carry, a.burst_count[urows], 0)
+        np.maximum.at(a.burst_max, urows, counts)
+        # uniq is sorted by (row, minute): the last entry per row is its latest minute
+        last = np.r_[urows[1:] != urows[:-1], True]
+        later = umin[last] >= a.burst_minute[urows[last]]
+        a.burst_minute[urows[last][later]] = umin[last][later]
+        a.burst_count[urows[last][later]] = counts[last][later]
+
+    def _inferences(self, events, idx_list, future, skew):
+        m = self.models
+        idx = np.array(idx_list)
+        rows = m.rows([item_model(events[i]) for i in idx_list])
+        np.add.at(m.inferences, rows, 1)
+        np.add.at(m.future, rows, future[idx].astype(np.int64))
+        np.maximum.at(m.max_skew, rows, skew[idx])
+
+        latency = np.array([_number(events[i].get("latency_ms")) for i in idx_list])
+        ok = ~np.isnan(latency)
+        if ok.any():
+            bins = np.clip(np.searchsorted(LATENCY_EDGES, latency[ok], side="right") - 1, 0, len(LATENCY_EDGES) - 2)
+            np.add.at(m.latency, (rows[ok], bins), 1)
+
+        inputs = [str(events[i].get("input")) for i in idx_list]
+        outputs = [str(events[i].get("output")) for i in idx_list]
+        row_hi = rows.astype(np.uint64) << np.uint64(40)
+
+        # Entropy via running S = sum c ln c per model: a key going from
+        # count c0 to c1 adds c1 ln c1 - c0 ln c0.
+        for table, values, column in ((self.inputs, inputs, m.in_s), (self.outputs, outputs, m.out_s)):
+            uniq, _, old, _ = table.add(row_hi | _h40(values))
+            new = table.counts[np.searchsorted(table.keys, uniq)]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                delta = np.nan_to_num(new * np.log(new)) - np.nan_to_num(old * np.log(old))
+            np.add.at(column, (uniq >> np.uint64(40)).astype(np.int64), delta)
+
+        # Distinct outputs per (model, input): bump when a triple is new
+        triple = np.fromiter(
+            (hash((int(r), i, o)) & _M63 for r, i, o in zip(rows, inputs, outputs)),
+            dtype=np.uint64, count=len(rows),
+        )
+        uniq, _, _, is_new = self.triples.add(triple)
+        if is_new.any():
+            first = {}
+            for k, r, i in zip(triple, rows, inputs):
+                first.setdefault(int(k), (int(r), i))
+            fresh = [first[int(k)] for k in uniq[is_new]]
+            pair = (np.array([r for r, _ in fresh], dtype=np.uint64) << np.uint64(40)) | _h40([i for _, i in fresh])
+            self.inputs.bump_extra(pair)
+
+    # -- findings ----------------------------------------------------------
+
+    def findings(self):
+        with self._lock:
+            out = []
+            out += self._agent_findings()
+            out += self._model_findings()
+            attributed = int(self.agents.view("future").sum() + self.models.view("future").sum())
+            if self.future_events > attributed:
+                out.append({"kind": "future_timestamp", "severity": "medium", "agent": "(unattributed)",
+                            "events": self.future_events - attributed})
+            return out
+
+    def _agent_findings(self):
+        a = self.agents
+        if not len(a):
+            return []
+        names = a.names
+        payments, actions = a.view("payments"), a.view("actions")
+        cost_sum, cost_max = a.view("cost_sum"), a.view("cost_max")
+        span = np.maximum(a.view("last_ts") - a.view("first_ts"), 60.0)
+        rate = payments / span * 60
+        out = []
+
+        # Bursts are judged against the fleet: a generator or a busy service
+        # pays fast for every agent, the suspicious one pays much faster
+        burst = a.view("burst_max")
+        threshold = PAYMENT_BURST_PER_MIN
+        if (burst > 0).sum() >= 3:
+            threshold = max(threshold, 3 * float(np.median(burst[burst > 0])))
+        for r in np.flatnonzero(burst >= threshold):
+            out.append({"kind": "payment_burst", "severity": "high", "agent": names[r],
+                        "max_payments_per_min": int(a.burst_max[r]), "payments": int(payments[r]),
+                        "payments_per_min": round(float(rate[r]), 2)})
+
+        mean_cost = np.divide(cost_sum, payments, out=np.zeros_like(cost_sum), where=payments > 0)
+        payers = payments > 0
+        flagged = mean_cost > COST_PER_PAYMENT_MAX
+        if payers.sum() >= 3:
+            # Robust outlier on log mean cost (median / MAD over paying agents),
+            # and at least 10x the median so near-identical costs are not flagged
+            logc = np.log10(np.maximum(mean_cost, 1e-9))
+            med = np.median(logc[payers])
+            mad = np.median(np.abs(logc[payers] - med)) or 0.1
+            flagged |= payers & ((logc - med) / mad > 3.5) & (logc - med >= 1)
+        for r in np.flatnonzero(flagged):
+            out.append({"kind": "high_cost", "severity": "high", "agent": names[r],
+                        "cost_sum": round(float(cost_sum[r]), 6), "mean_cost": round(float(mean_cost[r]), 6),
+                        "max_cost": round(float(cost_max[r]), 6), "payments": int(payments[r])})
+
+        for r in np.flatnonzero(a.view("future")):
+            out.append({"kind": "future_timestamp", "severity": "medium", "agent": names[r],
+                        "events": int(a.future[r]), "max_skew_s": round(float(a.max_skew[r]), 1)})
+
+        for r in np.flatnonzero(a.view("empty_links")):
+            out.append({"kind": "empty_links", "severity": "low", "agent": names[r],
+                        "actions": int(a.empty_links[r]), "of": int(actions[r])})
+        return out
+
+    def _model_findings(self):
+        m = self.models
+        out = []
+        if len(self.inputs):
+            t = self.inputs
+            hot = np.flatnonzero((t.counts >= REPEAT_MIN) & (t.extra >= 0.8 * t.counts))
+            for p in hot:
+                r = int(t.keys[p] >> np.uint64(40))
+                out.append({"kind": "repeated_input_varying_output", "severity": "high", "model": m.names[r],
+                            "repeats": int(t.counts[p]), "distinct_outputs": int(t.extra[p])})
+        if not len(m):
+            return out
+
+        names = m.names
+        inferences = m.view("inferences")
+        in_h = _entropy_bits(inferences, m.view("in_s"))
+        out_h = _entropy_bits(inferences, m.view("out_s"))
+        for r in np.flatnonzero((inferences >= MIN_SAMPLES) & (out_h - in_h >= 2)):
+            out.append({"kind": "low_input_entropy", "severity": "medium", "model": names[r],
+                        "input_entropy_bits": round(float(in_h[r]), 2),
+                        "output_entropy_bits": round(float(out_h[r]), 2), "inferences": int(inferences[r])})
+
+        hist = m.view("latency")
+        samples = hist.sum(axis=1)
+        if (samples > 0).any():
+            p50 = _percentile_from_hist(hist, 0.50)
+            p95 = _percentile_from_hist(hist, 0.95)
+            p99 = _percentile_from_hist(hist, 0.99)
+            fleet = float(_percentile_from_hist(hist.sum(axis=0), 0.50))
+            for r in np.flatnonzero((samples >= MIN_SAMPLES) & (p95 > LATENCY_FACTOR * fleet)):
+                out.append({"kind": "latency_outlier", "severity": "medium", "model": names[r],
+                            "p50_ms": float(p50[r]), "p95_ms": float(p95[r]), "p99_ms": float(p99[r]),
+                            "fleet_p50_ms": fleet})
+
+        for r in np.flatnonzero(m.view("future")):
+            out.append({"kind": "future_timestamp", "severity": "medium", "model": names[r],
+                        "events": int(m.future[r]), "max_skew_s": round(float(m.max_skew[r]), 1)})
+
+        # Ghost models: known only from a bare version event, or used without
+        # ever being registered (only meaningful once registrations are seen)
+        versions, registered = m.view("versions"), m.view("registered")
+        used = (inferences + m.view("referenced")) > 0
+        ghost = (versions > 0) & (registered == 0) & ~used
+        if registered.any():
+            ghost |= used & (versions == 0)
+        for r in np.flatnonzero(ghost):
+            out.append({"kind": "ghost_model", "severity": "medium", "model": names[r],
+                        "versions": int(versions[r]), "inferences": int(inferences[r]),
+                        "references": int(m.referenced[r])})
+        return out
+
+    def summary(self, top=20):
+        findings = self.findings()
+        order = {"high": 0, "medium": 1, "low": 2}
+        findings.sort(key=lambda f: order[f["severity"]])
+        counts = {}
+        for f in findings:
+            counts[f["kind"]] = counts.get(f["kind"], 0) + 1
+        return {
+            "events_seen": self.events_seen,
+            "agents": len(self.agents),
+            "models": len(self.models),
+            "unattributed_actions": self.unattributed_actions,
+            "inferences_without_model": self.inferences_without_model,
+            "future_timestamps": self.future_events,
+            "finding_counts": counts,
+            "findings": findings[:top],
+            "findings_truncated": len(findings) > top,
+        }
+
+
+detector = AnomalyDetector()
@@ -0,0 +1,217 @@
+# cache.py
+# In-process response cache for the read-only auditor tools: per-tool TTL,
+# LRU eviction, single-flight coalescing of identical concurrent calls.
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+
+
+def _cacheable(value):
+    # Error payloads are never cached (e.g. get_block on a block not written yet)
+    return not (isinstance(value, dict) and "error" in value)
+
+
+def _freeze(value):
+    """Hashable stand-in for a tool argument: lists and tuples become tuples,
+    dicts sorted item tuples, sets frozensets."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return ("__dict__", tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _key(tool, args, kwargs):
+    """Cache key, or None when an argument cannot be hashed (call uncached)."""
+    try:
+        key = (tool, _freeze(args), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class _LeaderCancelled(Exception):
+    """The call the followers were waiting on was cancelled: retry it."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ToolCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at | None, value)
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        self._stats = {}
+
+    # -- bookkeeping -------------------------------------------------------
+
+    def _count(self, tool, field):
+        stats = self._stats.setdefault(tool, {"hits": 0, "misses": 0, "coalesced": 0})
+        stats[field] += 1
+
+    def _lookup(self, key):
+        # caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value, ttl):
+        if not _cacheable(value):
+            return
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tool=None):
+        """Drop every entry, or only the entries of one tool."""
+        with self._lock:
+            if tool is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == tool]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            sizes = {}
+            for key in self._entries:
+                sizes[key[0]] = sizes.get(key[0], 0) + 1
+            return {
+                tool: {**counters, "entries": sizes.get(tool, 0)}
+                for tool, counters in self._stats.items()
+            }
+
+    # -- lookups -----------------------------------------------------------
+
+    def call(self, tool, ttl, fn, args, kwargs):
+        key = _key(tool, args, kwargs)
+        if key is None:
+            return fn(*args, **kwargs)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._count(tool, "hits")
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count(tool, "misses")
+            else:
+                self._count(tool, "coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if isinstance(flight.error, _LeaderCancelled):
+                return self.call(tool, ttl, fn, args, kwargs)
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn(*args, **kwargs)
+            self._store(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.error = _LeaderCancelled()
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def acall(self, tool, ttl, fn, args, kwargs):
+        key = _key(tool, args, kwargs)
+        if key is None:
+            return await fn(*args, **kwargs)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._count(tool, "hits")
+                return value
+            future = self._async_flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                self._count(tool, "misses")
+            else:
+                self._count(tool, "coalesced")
+
+        if not leader:
+            # shield: a follower being cancelled must not cancel the shared call
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # Not our cancellation: one of the followers takes over
+                return await self.acall(tool, ttl, fn, args, kwargs)
+
+        try:
+            value = await fn(*args, **kwargs)
+            self._store(key, value, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+
+    def cached(self, tool, ttl):
+        """Decorator for sync or async tools. ttl=None caches until evicted."""
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            def normalize(args, kwargs):
+                # list_events(50) and list_events(limit=50) share one entry
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                return bound.arguments
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    return await self.acall(tool, ttl, fn, (), normalize(args, kwargs))
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.call(tool, ttl, fn, (), normalize(args, kwargs))
+            return wrapper
+        return decorator
+
+
+tool_cache = ToolCache()
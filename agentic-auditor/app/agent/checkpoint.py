@@ -0,0 +1,86 @@
+# checkpoint.py
+# Durable hashchain verification checkpoint (SQLite), so verify_chain only has
+# to check the blocks appended since the last successful run.
+import os
+import sqlite3
+import threading
+import time
+
+CHECKPOINT_DB = os.getenv("AUDITOR_CHECKPOINT_DB", os.path.join("data", "auditor.sqlite"))
+# Force a full re-verification from genesis at least this often (seconds)
+FULL_REVERIFY_INTERVAL = float(os.getenv("HASHCHAIN_FULL_REVERIFY_S", str(24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashchain_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_index INTEGER NOT NULL,
+    last_hash TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    verified_at REAL NOT NULL,
+    full_verified_at REAL NOT NULL
+)
+"""
+
+
+class CheckpointStore:
+    def __init__(self, path=CHECKPOINT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def load(self):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT last_index, last_hash, digest, verified_at, full_verified_at "
+                "FROM hashchain_checkpoint WHERE id = 1"
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "last_index": row[0],
+            "last_hash": row[1],
+            "digest": row[2],
+            "verified_at": row[3],
+            "full_verified_at": row[4],
+        }
+
+    def save(self, last_index, last_hash, digest, full):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO hashchain_checkpoint "
+                "(id, last_index, last_hash, digest, verified_at, full_verified_at) "
+                "VALUES (1, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_index = excluded.last_index, "
+                "last_hash = excluded.last_hash, digest = excluded.digest, "
+                "verified_at = excluded.verified_at, "
+                "full_verified_at = CASE WHEN ? THEN excluded.full_verified_at "
+                "ELSE hashchain_checkpoint.full_verified_at END",
+                (last_index, last_hash, digest, now, now, full),
+            )
+
+    def reset(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM hashchain_checkpoint")
+
+    def full_due(self, checkpoint):
+        return time.time() - checkpoint["full_verified_at"] >= FULL_REVERIFY_INTERVAL
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CheckpointStore()
+    return _store
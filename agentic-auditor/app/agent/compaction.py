@@ -0,0 +1,165 @@
+# compaction.py
+# Shrinks tool results before they go back to the LLM for the second pass.
+# The raw result stays available out of band under a result_id.
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", "800"))
+TOOL_TOKEN_BUDGETS = {
+    "healthcheck": 50,
+    "verify_chain": 600,
+    "list_events": 1200,
+    "list_models": 1000,
+    "provenance_by_model": 1200,
+    "detect_anomalies": 1200,
+    "query_store": 1200,
+}
+RESULT_STORE_MAX = int(os.getenv("RESULT_STORE_MAX", "256"))
+
+TRACE_KEYS = ("trace", "traceback", "exception")
+TRACE_LINES = 4
+
+# (max string length, max list items, max dict keys) tried in order until the
+# result fits; past the last one the JSON text itself is cut to the budget
+_LEVELS = [(2000, 50, 100), (500, 20, 50), (200, 10, 30), (80, 5, 20), (40, 3, 10), (20, 1, 5)]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ResultStore:
+    """Bounded (LRU) store of raw tool results, addressed by result_id."""
+
+    def __init__(self, max_entries=RESULT_STORE_MAX):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, value):
+        result_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._items[result_id] = value
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return result_id
+
+    def get(self, result_id):
+        with self._lock:
+            return self._items.get(result_id)
+
+
+result_store = ResultStore()
+
+
+def _trim_traces(value):
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in TRACE_KEYS and isinstance(v, str):
+                lines = v.strip().splitlines()
+                v = "\n".join(lines[-TRACE_LINES:])
+            out[k] = _trim_traces(v)
+        return out
+    if isinstance(value, list):
+        return [_trim_traces(v) for v in value]
+    return value
+
+
+def _dedupe(value):
+    """Hoist fields that are identical in every item of a list of dicts."""
+    if isinstance(value, dict):
+        return {k: _dedupe(v) for k, v in value.items()}
+    if not isinstance(value, list):
+        return value
+
+    items = [_dedupe(v) for v in value]
+    if len(items) < 2 or not all(isinstance(i, dict) for i in items):
+        return items
+
+    common = {}
+    for k, v in items[0].items():
+        if all(k in i and i[k] == v for i in items[1:]):
+            common[k] = v
+    if not common:
+        return items
+    return {
+        "common": common,
+        "items": [{k: v for k, v in i.items() if k not in common} for i in items],
+    }
+
+
+def _shrink(value, max_str, max_items, max_keys):
+    if isinstance(value, str):
+        if len(value) > max_str:
+            return value[:max_str] + f"...(+{len(value) - max_str} chars)"
+        return value
+    if isinstance(value, dict):
+        out = {}
+        for i, (k, v) in enumerate(value.items()):
+            if i == max_keys:
+                out["..."] = f"+{len(value) - max_keys} more keys"
+                break
+            out[_shrink(str(k), max_str, max_items, max_keys)] = _shrink(v, max_str, max_items, max_keys)
+        return out
+    if isinstance(value, list):
+        items = [_shrink(v, max_str, max_items, max_keys) for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"...(+{len(value) - max_items} more)")
+        return items
+    return value
+
+
+def compact(value, budget_tokens):
+    """Return a smaller version of value that fits budget_tokens if possible."""
+    value = _dedupe(_trim_traces(value))
+    text = json.dumps(value, default=str)
+    if estimate_tokens(text) <= budget_tokens:
+        return value
+    for max_str, max_items, max_keys in _LEVELS:
+        shrunk = _shrink(value, max_str, max_items, max_keys)
+        text = json.dumps(shrunk, default=str)
+        if estimate_tokens(text) <= budget_tokens:
+            return shrunk
+    return _truncate(text, budget_tokens)
+
+
+def _truncate(text, budget_tokens):
+    """Cut JSON text so that, encoded as a JSON string, it fits the budget."""
+    suffix = "...(truncated)"
+    limit = max(budget_tokens - 1, 0) * CHARS_PER_TOKEN
+    cut = text[:limit]
+    # Escaping (quotes, non-ASCII) makes the encoded string longer than cut
+    while cut and len(json.dumps(cut + suffix)) > limit:
+        cut = cut[:len(cut) * limit // len(json.dumps(cut + suffix))]
+    return cut + suffix if cut else suffix
+
+
+def compact_tool_result(name, result):
+    """Prompt content for one tool result, plus compaction stats."""
+    budget = TOOL_TOKEN_BUDGETS.get(name, DEFAULT_TOKEN_BUDGET)
+    raw = json.dumps(result, default=str)
+    raw_tokens = estimate_tokens(raw)
+    result_id = result_store.put(result)
+
+    # Tracebacks are only useful to humans: always cut them down for the LLM
+    trimmed = json.dumps(_trim_traces(result), default=str)
+    if estimate_tokens(trimmed) <= budget:
+        content = trimmed
+    else:
+        envelope = {"result_id": result_id, "compacted": True, "raw_tokens": raw_tokens, "data": None}
+        data_budget = max(budget - estimate_tokens(json.dumps(envelope)), 1)
+        envelope["data"] = compact(result, data_budget)
+        content = json.dumps(envelope, default=str)
+
+    prompt_tokens = estimate_tokens(content)
+    return content, {
+        "result_id": result_id,
+        "raw_tokens": raw_tokens,
+        "prompt_tokens": prompt_tokens,
+        "saved_tokens": max(raw_tokens - prompt_tokens, 0),
+    }
@@ -0,0 +1,37 @@
+# deadline.py
+# Per-request deadline carried in a contextvar, so code deep in a tool call
+# (HTTP requests to the backend, retries) can cap its own timeouts without the
+# deadline being threaded through every signature. asyncio tasks and
+# asyncio.to_thread copy the context, so the deadline follows the work.
+import contextvars
+import time
+
+_deadline = contextvars.ContextVar("auditor_deadline", default=None)
+
+
+def set_deadline(deadline):
+    """Set the absolute (time.monotonic) deadline for the current context."""
+    return _deadline.set(deadline)
+
+
+def get_deadline():
+    return _deadline.get()
+
+
+def remaining(deadline=None):
+    """Seconds left before the deadline (None when there is no deadline)."""
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def cap_timeout(timeout):
+    """timeout limited by what is left of the current deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if timeout is None:
+        return max(left, 0)
+    return max(min(timeout, left), 0)
@@ -0,0 +1,350 @@
+# event_store.py
+# Local columnar mirror (DuckDB) of the backend's events and blocks, for
+# analytical audits that would otherwise page the whole collection through
+# the NestJS API on every question.
+#
+# Both tables are append-only and synced by high-water mark: events by their
+# position in /api/events (the skip cursor), blocks by index. The rows of a
+# batch and the new high-water mark are committed in one transaction, so an
+# interrupted sync resumes where it stopped. tools.sync_store() drives it.
+#
+# Queries run on their own cursor with file access disabled, a row cap and a
+# timeout; only single SELECT statements are accepted.
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import duckdb
+import numpy as np
+
+from app.agent.summarize import item_agent, item_model, item_time, item_type, to_epoch
+from app.core.logger import get_logger
+
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", os.path.join("data", "events.duckdb"))
+# Keep the full event JSON next to the extracted columns (json_extract queries)
+EVENT_STORE_RAW = os.getenv("EVENT_STORE_RAW", "1") == "1"
+QUERY_TIMEOUT = float(os.getenv("EVENT_STORE_QUERY_TIMEOUT_S", "30"))
+MAX_ROWS = int(os.getenv("EVENT_STORE_MAX_ROWS", "1000"))
+MEMORY_LIMIT = os.getenv("EVENT_STORE_MEMORY_LIMIT")
+
+logger = get_logger("event_store")
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        seq BIGINT,             -- position in /api/events
+        type VARCHAR,
+        model_id VARCHAR,
+        agent_id VARCHAR,
+        action_type VARCHAR,
+        inference_id VARCHAR,
+        ts TIMESTAMP,
+        day DATE,
+        latency_ms DOUBLE,
+        cost DOUBLE,
+        input VARCHAR,
+        output VARCHAR,
+        raw JSON
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS blocks (
+        idx BIGINT,
+        ts TIMESTAMP,
+        hash VARCHAR,
+        previous_hash VARCHAR,
+        type VARCHAR,
+        model_id VARCHAR,
+        inference_id VARCHAR,
+        data JSON
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        source VARCHAR PRIMARY KEY,
+        high_water BIGINT NOT NULL,
+        last_hash VARCHAR,
+        synced_at TIMESTAMP
+    )
+    """,
+]
+
+# Columns the structured aggregation can group by
+GROUP_COLUMNS = {
+    "type": "type",
+    "model_id": "model_id",
+    "agent_id": "agent_id",
+    "action_type": "action_type",
+    "day": "day",
+    "hour": "date_trunc('hour', ts)",
+}
+
+_TS = "CASE WHEN isnan({0}) THEN NULL ELSE make_timestamp(CAST({0} * 1e6 AS BIGINT)) END"
+_NAN = "'nan'::DOUBLE"
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def _meta(item):
+    meta = item.get("metadata")
+    return meta if isinstance(meta, dict) else {}
+
+
+def _data(item):
+    data = item.get("data")
+    return data if isinstance(data, dict) else {}
+
+
+def _column(values):
+    # An all-NULL column is left out of the batch (inserted as NULL): DuckDB
+    # cannot infer the type of a large object array with no values
+    if all(v is None for v in values):
+        return None
+    return np.array(values, dtype=object)
+
+
+def _epoch_column(values):
+    return np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class EventStore:
+    def __init__(self, path=EVENT_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._con = duckdb.connect(path)
+        for statement in _SCHEMA:
+            self._con.execute(statement)
+        if MEMORY_LIMIT:
+            self._con.execute(f"SET memory_limit = '{MEMORY_LIMIT}'")
+        # Queries may come from the LLM: no file system access, and no way
+        # to turn it back on (batches are handed over with register())
+        self._con.execute("SET enable_external_access = false")
+        self._con.execute("SET lock_configuration = true")
+        self._lock = threading.Lock()
+
+    # -- sync --------------------------------------------------------------
+
+    def high_water(self, source):
+        """(high_water, last_hash): events synced so far / last block index."""
+        with self._lock:
+            row = self._con.execute(
+                "SELECT high_water, last_hash FROM sync_state WHERE source = ?", [source]
+            ).fetchone()
+        if row is None:
+            return (0, None) if source == "events" else (-1, None)
+        return row[0], row[1]
+
+    def _commit(self, table, columns, select, source, high_water, last_hash=None):
+        # select: one expression per table column, in order
+        name = f"batch_{table}"
+        select = ", ".join("NULL" if columns.get(expr, ...) is None else expr for expr in select)
+        self._con.register(name, {k: v for k, v in columns.items() if v is not None})
+        try:
+            self._con.execute("BEGIN")
+            try:
+                self._con.execute(f"INSERT INTO {table} SELECT {select} FROM {name}")
+                self._con.execute(
+                    "INSERT INTO sync_state VALUES (?, ?, ?, now()) ON CONFLICT (source) DO UPDATE SET "
+                    "high_water = excluded.high_water, last_hash = excluded.last_hash, synced_at = excluded.synced_at",
+                    [source, high_water, last_hash],
+                )
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+        finally:
+            self._con.unregister(name)
+
+    def append_events(self, events, start):
+        """Store events found at positions start.. of /api/events; returns
+        the new high-water mark."""
+        if not events:
+            return start
+        meta = [_meta(e) for e in events]
+        latency = [e.get("latency_ms") if e.get("latency_ms") is not None else m.get("latency_ms")
+                   for e, m in zip(events, meta)]
+        columns = {
+            "seq": np.arange(start, start + len(events), dtype=np.int64),
+            "type": _column([item_type(e) for e in events]),
+            "model_id": _column([item_model(e) for e in events]),
+            "agent_id": _column([item_agent(e) for e in events]),
+            "action_type": _column([e.get("action_type") or e.get("actionType") for e in events]),
+            "inference_id": _column([
+                e.get("inference_id") or e.get("inferenceId") or _data(e).get("inferenceId") for e in events
+            ]),
+            "ts": _epoch_column([item_time(e) for e in events]),
+            "latency_ms": np.array([_number(v) for v in latency], dtype=np.float64),
+            "cost": np.array([_number(e.get("cost", m.get("cost"))) for e, m in zip(events, meta)], dtype=np.float64),
+            "input": _column([_text(e.get("input", e.get("inputHash"))) for e in events]),
+            "output": _column([_text(e.get("output", e.get("outputHash"))) for e in events]),
+            "raw": _column([json.dumps(e, default=str) if EVENT_STORE_RAW else None for e in events]),
+        }
+        select = [
+            "seq", "type", "model_id", "agent_id", "action_type", "inference_id",
+            _TS.format("ts"), f"CAST({_TS.format('ts')} AS DATE)",
+            f"nullif(latency_ms, {_NAN})", f"nullif(cost, {_NAN})", "input", "output", "raw",
+        ]
+        high_water = start + len(events)
+        with self._lock:
+            self._commit("events", columns, select, "events", high_water)
+        return high_water
+
+    def append_blocks(self, blocks):
+        """Store the next blocks of the chain. Returns the number stored, or
+        None when they do not link to the last stored block (chain rebuilt)."""
+        if not blocks:
+            return 0
+        blocks = sorted(blocks, key=lambda b: int(b.get("index") or 0))
+        last_index, last_hash = self.high_water("blocks")
+        if last_index >= 0 and (
+            int(blocks[0].get("index") or 0) != last_index + 1 or blocks[0].get("previousHash") != last_hash
+        ):
+            return None
+        data = [_data(b) for b in blocks]
+        columns = {
+            "idx": np.array([int(b.get("index") or 0) for b in blocks], dtype=np.int64),
+            "ts": _epoch_column([to_epoch(b.get("timestamp")) for b in blocks]),
+            "hash": _column([b.get("hash") for b in blocks]),
+            "previous_hash": _column([b.get("previousHash") for b in blocks]),
+            "type": _column([d.get("type") for d in data]),
+            "model_id": _column([d.get("modelId") for d in data]),
+            "inference_id": _column([d.get("inferenceId") for d in data]),
+            "data": _column([json.dumps(d, default=str) for d in data]),
+        }
+        select = ["idx", _TS.format("ts"), "hash", "previous_hash", "type", "model_id", "inference_id", "data"]
+        with self._lock:
+            self._commit("blocks", columns, select, "blocks", int(columns["idx"][-1]), blocks[-1].get("hash"))
+        return len(blocks)
+
+    def reset(self, source):
+        """Drop the mirrored rows of one source ("events" or "blocks")."""
+        table = {"events": "events", "blocks": "blocks"}[source]
+        with self._lock:
+            self._con.execute("BEGIN")
+            self._con.execute(f"DELETE FROM {table}")
+            self._con.execute("DELETE FROM sync_state WHERE source = ?", [source])
+            self._con.execute("COMMIT")
+
+    # -- queries -----------------------------------------------------------
+
+    def query(self, sql, params=None, limit=MAX_ROWS, timeout=QUERY_TIMEOUT):
+        """Run one read-only SELECT; at most `limit` rows are returned."""
+        cursor = self._con.cursor()
+        try:
+            statements = cursor.extract_statements(sql)
+            if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+                raise ValueError("Only a single SELECT statement is allowed")
+            limit = max(1, min(int(limit), MAX_ROWS))
+            timer = threading.Timer(timeout, cursor.interrupt)
+            start = time.perf_counter()
+            timer.start()
+            try:
+                cursor.execute(sql, params or [])
+                rows = cursor.fetchmany(limit + 1)
+            except duckdb.InterruptException:
+                raise TimeoutError(f"Query cancelled after {timeout:.0f}s")
+            finally:
+                timer.cancel()
+            columns = [d[0] for d in cursor.description]
+        finally:
+            cursor.close()
+        return {
+            "columns": columns,
+            "rows": [[_plain(v) for v in row] for row in rows[:limit]],
+            "row_count": min(len(rows), limit),
+            "truncated": len(rows) > limit,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def aggregate(self, group_by=None, type=None, model_id=None, agent_id=None, since=None, until=None, limit=50):
+        """Event counts, latency percentiles and cost per group."""
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown}; valid: {sorted(GROUP_COLUMNS)}")
+
+        where, params = [], []
+        for column, value in (("type", type), ("model_id", model_id), ("agent_id", agent_id)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        for op, value in ((">=", to_epoch(since)), ("<=", to_epoch(until))):
+            if value is not None:
+                where.append(f"ts {op} make_timestamp(CAST(? * 1e6 AS BIGINT))")
+                params.append(value)
+
+        keys = [f"{GROUP_COLUMNS[g]} AS {g}" for g in group_by]
+        sql = (
+            "SELECT " + ", ".join(keys + [
+                "count(*) AS events",
+                "count(DISTINCT model_id) AS models",
+                "count(DISTINCT agent_id) AS agents",
+                "round(avg(latency_ms), 2) AS latency_avg_ms",
+                "round(quantile_cont(latency_ms, 0.5), 2) AS latency_p50_ms",
+                "round(quantile_cont(latency_ms, 0.95), 2) AS latency_p95_ms",
+                "round(sum(cost), 4) AS cost_total",
+                "min(ts) AS first",
+                "max(ts) AS last",
+            ]) + " FROM events"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + (" GROUP BY " + ", ".join(str(i + 1) for i in range(len(keys))) if keys else "")
+            + " ORDER BY events DESC"
+        )
+        result = self.query(sql, params, limit=limit)
+        result["groups"] = [dict(zip(result["columns"], row)) for row in result.pop("rows")]
+        result.pop("columns")
+        return result
+
+    def stats(self):
+        cursor = self._con.cursor()
+        try:
+            events = cursor.execute("SELECT count(*), min(ts), max(ts) FROM events").fetchone()
+            blocks = cursor.execute("SELECT count(*), max(idx) FROM blocks").fetchone()
+            state = cursor.execute("SELECT source, high_water, synced_at FROM sync_state").fetchall()
+        finally:
+            cursor.close()
+        return {
+            "path": self.path,
+            "events": events[0],
+            "events_first": _plain(events[1]),
+            "events_last": _plain(events[2]),
+            "blocks": blocks[0],
+            "last_block": blocks[1],
+            "sync": {source: {"high_water": hw, "synced_at": _plain(at)} for source, hw, at in state},
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_event_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EventStore()
+    return _store
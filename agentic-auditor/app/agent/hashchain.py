@@ -0,0 +1,391 @@
+# hashchain.py
+# In-process hashchain verifier. Port of `ernest hashchain verify` (cli-ernest)
+# that streams blocks from the backend page by page instead of loading the
+# whole chain, and verifies pages in parallel on a process pool.
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from app.agent.checkpoint import get_checkpoint_store
+from app.agent.http_client import request
+from app.core.logger import get_logger
+
+PAGE_SIZE = int(os.getenv("HASHCHAIN_PAGE_SIZE", "5000"))
+VERIFY_WORKERS = int(os.getenv("HASHCHAIN_WORKERS", str(os.cpu_count() or 1)))
+# Only the first N errors are kept in the report, the rest are just counted
+MAX_REPORTED_ERRORS = int(os.getenv("HASHCHAIN_MAX_ERRORS", "100"))
+
+logger = get_logger("hashchain")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_GO_ESCAPES = str.maketrans({
+    "<": "\\u003c",
+    ">": "\\u003e",
+    "&": "\\u0026",
+    "\u2028": "\\u2028",
+    "\u2029": "\\u2029",
+})
+_GO_SHORT_ESCAPES = {"b": "\\u0008", "f": "\\u000c"}
+_ESCAPE_SEQ = re.compile(r"\\(.)")
+_EXP_ZERO = re.compile(r"e([+-])0(\d)$")
+
+
+# ---------------------------------------------------------------------------
+# Canonicalization (must stay byte-for-byte identical to CleanObject /
+# OrderedJSONString / CalculateBlockHash in cli-ernest/cmd/hashchain/verify.go)
+# ---------------------------------------------------------------------------
+
+def clean_object(obj):
+    """Drop None and "" recursively; nested empty maps/lists are dropped from maps."""
+    if obj is None:
+        return None
+
+    if isinstance(obj, (list, tuple)):
+        arr = []
+        for item in obj:
+            item = clean_object(item)
+            if item is None or (isinstance(item, str) and item == ""):
+                continue
+            arr.append(item)
+        return arr
+
+    if isinstance(obj, dict):
+        cleaned = {}
+        for k, v in obj.items():
+            if v is None or (isinstance(v, str) and v == ""):
+                continue
+            if isinstance(v, (dict, list, tuple)):
+                v = clean_object(v)
+                if len(v) > 0:
+                    cleaned[k] = v
+            else:
+                cleaned[k] = v
+        return cleaned
+
+    return obj
+
+
+def _go_float(f):
+    # encoding/json: shortest repr, fixed notation for 1e-6 <= |f| < 1e21,
+    # exponent notation otherwise with "e-07" cleaned up to "e-7".
+    s = repr(f)
+    a = abs(f)
+    if a != 0 and (a < 1e-6 or a >= 1e21):
+        return _EXP_ZERO.sub(r"e\1\2", s)
+    return format(Decimal(s).normalize(), "f")
+
+
+def _go_string(s):
+    # Go escapes HTML characters and line/paragraph separators, and writes
+    # \b / \f as \u0008 / \u000c; everything else matches json.dumps.
+    out = json.dumps(s, ensure_ascii=False).translate(_GO_ESCAPES)
+    if "\b" in s or "\f" in s:
+        out = _ESCAPE_SEQ.sub(lambda m: _GO_SHORT_ESCAPES.get(m.group(1), m.group(0)), out)
+    return out
+
+
+def _go_json(value):
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _go_float(value)
+    if isinstance(value, str):
+        return _go_string(value)
+    if isinstance(value, dict):
+        return "{" + ",".join(
+            _go_string(str(k)) + ":" + _go_json(value[k]) for k in sorted(value, key=str)
+        ) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_go_json(v) for v in value) + "]"
+    return _go_string(str(value))
+
+
+def ordered_json_string(data):
+    return _go_json(data)
+
+
+def _to_int64(value):
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    return 0
+
+
+def calculate_block_hash(block):
+    data = block.get("data")
+    if not isinstance(data, dict):
+        data = {}
+    block_string = "%d|%d|%s|%s" % (
+        _to_int64(block.get("index")),
+        _to_int64(block.get("timestamp")),
+        ordered_json_string(clean_object(data)),
+        block.get("previousHash") or "",
+    )
+    return hashlib.sha256(block_string.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Verification
+# ---------------------------------------------------------------------------
+
+def verify_page(blocks, genesis=False):
+    """Verify one page of blocks. Runs in the worker processes.
+
+    Checks the stored hash of every block and the links inside the page; the
+    link between pages is checked by the caller with first_prev/last_hash.
+    With genesis, the first block is the start of the chain and, as in
+    verifyBlock (cli-ernest), its hash is not recomputed.
+    """
+    blocks = sorted(blocks, key=lambda b: _to_int64(b.get("index")))
+    errors = []
+    prev = None
+
+    for i, b in enumerate(blocks):
+        index = _to_int64(b.get("index"))
+        stored = b.get("hash") or ""
+
+        calculated = None if genesis and i == 0 else calculate_block_hash(b)
+        if calculated is not None and stored != calculated:
+            errors.append({
+                "index": index,
+                "kind": "hash_mismatch",
+                "stored": stored,
+                "calculated": calculated,
+            })
+
+        if prev is not None:
+            prev_index = _to_int64(prev.get("index"))
+            if index != prev_index + 1:
+                errors.append({
+                    "index": index,
+                    "kind": "index_gap",
+                    "expected_index": prev_index + 1,
+                })
+            if b.get("previousHash") != prev.get("hash"):
+                errors.append({
+                    "index": index,
+                    "kind": "broken_link",
+                    "previous_hash": b.get("previousHash"),
+                    "expected": prev.get("hash"),
+                })
+        prev = b
+
+    return {
+        "count": len(blocks),
+        "first_index": _to_int64(blocks[0].get("index")) if blocks else None,
+        "first_prev": blocks[0].get("previousHash") if blocks else None,
+        "last_index": _to_int64(blocks[-1].get("index")) if blocks else None,
+        "last_hash": blocks[-1].get("hash") if blocks else None,
+        "hashes": [(_to_int64(b.get("index")), b.get("hash") or "") for b in blocks],
+        "errors": errors,
+    }
+
+
+def get_process_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the auditor runs threads (uvicorn, asyncio.to_thread)
+                # and forking a threaded process is not safe.
+                _pool = ProcessPoolExecutor(
+                    max_workers=VERIFY_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _verified_pages(pages, workers, genesis=False):
+    # genesis: the first page starts the chain
+    pages = iter(pages)
+    first = next(pages, None)
+    if first is None:
+        return
+    second = next(pages, None)
+    if workers <= 1 or second is None:
+        # Single page (or no parallelism): not worth the IPC round-trip
+        yield verify_page(first, genesis)
+        for page in itertools.chain([second] if second else [], pages):
+            yield verify_page(page)
+        return
+
+    # Keep at most 2 pages per worker in flight so memory stays bounded no
+    # matter how long the chain is; results are consumed in chain order.
+    pool = get_process_pool()
+    pending = deque([pool.submit(verify_page, first, genesis)])
+    for page in itertools.chain([second], pages):
+        pending.append(pool.submit(verify_page, page))
+        if len(pending) >= workers * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def roll_digest(digest, block_hash):
+    """digest_n = sha256(digest_n-1 || hash_n), hex encoded. Starts from ""."""
+    return hashlib.sha256((digest + block_hash).encode()).hexdigest()
+
+
+def verify_blocks(pages, workers=VERIFY_WORKERS, max_errors=MAX_REPORTED_ERRORS,
+                  prev_index=None, prev_hash=None, digest="", checkpoint=None):
+    """Verify a chain given as an iterable of block pages (lists of dicts).
+
+    prev_index/prev_hash/digest resume from an already verified prefix (the
+    first page must link to it). If a checkpoint is given and the pages cover
+    its index, the recomputed rolling digest must match the stored one.
+    """
+    start = time.perf_counter()
+    errors = []
+    error_count = 0
+    checked = 0
+    first_index = None
+    last_index = prev_index
+    last_hash = prev_hash
+
+    def add(errs):
+        nonlocal error_count
+        error_count += len(errs)
+        room = max_errors - len(errors)
+        if room > 0:
+            errors.extend(errs[:room])
+
+    # Without a verified prefix the first block is the genesis block
+    for page in _verified_pages(pages, workers, genesis=prev_index is None):
+        if not page["count"]:
+            continue
+
+        link_errors = []
+        if last_index is not None:
+            if page["first_index"] != last_index + 1:
+                link_errors.append({
+                    "index": page["first_index"],
+                    "kind": "index_gap",
+                    "expected_index": last_index + 1,
+                })
+            if page["first_prev"] != last_hash:
+                link_errors.append({
+                    "index": page["first_index"],
+                    "kind": "broken_link",
+                    "previous_hash": page["first_prev"],
+                    "expected": last_hash,
+                })
+        if first_index is None:
+            first_index = page["first_index"]
+
+        for index, block_hash in page["hashes"]:
+            digest = roll_digest(digest, block_hash)
+            if checkpoint and index == checkpoint["last_index"] and digest != checkpoint["digest"]:
+                # Everything up to the checkpoint was valid once; a different
+                # digest now means history below it was rewritten.
+                link_errors.append({
+                    "index": index,
+                    "kind": "checkpoint_mismatch",
+                    "stored_digest": checkpoint["digest"],
+                    "calculated_digest": digest,
+                })
+
+        add(link_errors + page["errors"])
+        checked += page["count"]
+        last_index = page["last_index"]
+        last_hash = page["last_hash"]
+
+    return {
+        "valid": error_count == 0,
+        "blocks_checked": checked,
+        "first_index": first_index,
+        "last_index": last_index,
+        "last_hash": last_hash,
+        "digest": digest,
+        "error_count": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def verify_chain_incremental(full=False, store=None):
+    """Verify only the blocks appended since the last checkpoint.
+
+    Falls back to a full verification from genesis when asked to, when there
+    is no checkpoint yet, when the last full run is older than
+    HASHCHAIN_FULL_REVERIFY_S, or when the checkpointed tip was rewritten.
+    The checkpoint only moves forward on success.
+    """
+    store = store or get_checkpoint_store()
+    checkpoint = store.load()
+    full = full or checkpoint is None or store.full_due(checkpoint)
+
+    tip_error = None
+    if not full:
+        # The tail we resume from must still be the block we verified
+        r = request("GET", f"/api/blocks/{checkpoint['last_index']}", "blocks")
+        r.raise_for_status()
+        tip = r.json()
+        if tip.get("hash") != checkpoint["last_hash"]:
+            tip_error = {
+                "index": checkpoint["last_index"],
+                "kind": "checkpoint_mismatch",
+                "stored": checkpoint["last_hash"],
+                "actual": tip.get("hash"),
+            }
+            logger.warning(f"[hashchain] checkpoint tip {checkpoint['last_index']} was rewritten, "
+                           "re-verifying from genesis")
+            full = True
+
+    if full:
+        result = verify_blocks(iter_block_pages(), checkpoint=checkpoint)
+    else:
+        result = verify_blocks(
+            iter_block_pages(start=checkpoint["last_index"] + 1),
+            prev_index=checkpoint["last_index"],
+            prev_hash=checkpoint["last_hash"],
+            digest=checkpoint["digest"],
+        )
+    if tip_error:
+        result["valid"] = False
+        result["error_count"] += 1
+        result["errors"].insert(0, tip_error)
+
+    result["mode"] = "full" if full else "incremental"
+    if result["valid"] and result["last_index"] is not None:
+        store.save(result["last_index"], result["last_hash"], result["digest"], full)
+    result["checkpoint"] = store.load()
+    return result
+
+
+def iter_block_pages(start=0, page_size=PAGE_SIZE):
+    """Stream the chain from the backend, page_size blocks at a time."""
+    while True:
+        r = request("GET", "/api/blocks", "blocks", params={"from": start, "limit": page_size})
+        r.raise_for_status()
+        page = r.json()
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        start = _to_int64(page[-1].get("index")) + 1
@@ -0,0 +1,152 @@
+# http_client.py
+# Shared, pooled HTTP clients for talking to the Ernest (NestJS) backend.
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+import httpx
+
+from app.agent.deadline import cap_timeout, remaining
+from app.core.logger import get_logger
+
+ERNEST_URL = os.getenv("ERNEST_URL", "http://localhost:3001")
+
+MAX_CONNECTIONS = int(os.getenv("ERNEST_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("ERNEST_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("ERNEST_KEEPALIVE_EXPIRY", "30"))
+
+# Status codes worth retrying: the backend (or a proxy in front of it) is
+# temporarily unavailable, the request itself is fine.
+RETRY_STATUS = {502, 503, 504}
+
+logger = get_logger("http")
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    timeout: float = 2.0
+    retries: int = 2
+    backoff: float = 0.1  # base delay in seconds, doubled on every attempt
+
+
+# Per-endpoint timeouts and retries. POSTs are not retried: the backend
+# appends a block per request, so a retry could write twice.
+ENDPOINT_POLICIES = {
+    "health": EndpointPolicy(timeout=1.0, retries=0),
+    "events": EndpointPolicy(timeout=2.0, retries=2),
+    "models": EndpointPolicy(timeout=2.0, retries=2),
+    "provenance": EndpointPolicy(timeout=5.0, retries=1),
+    "blocks": EndpointPolicy(timeout=2.0, retries=2),
+    "audit": EndpointPolicy(timeout=5.0, retries=0),
+}
+DEFAULT_POLICY = EndpointPolicy()
+
+_limits = httpx.Limits(
+    max_connections=MAX_CONNECTIONS,
+    max_keepalive_connections=MAX_KEEPALIVE,
+    keepalive_expiry=KEEPALIVE_EXPIRY,
+)
+
+_sync_client = None
+_sync_lock = threading.Lock()
+
+# httpx.AsyncClient is bound to the event loop it was first used on, so we
+# keep one pool per loop (normally there is just uvicorn's).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(base_url=ERNEST_URL, limits=_limits)
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(base_url=ERNEST_URL, limits=_limits)
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_clients():
+    global _sync_client
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def _policy(endpoint):
+    return ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+
+
+def _delay(policy, attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, policy.backoff * (2 ** attempt))
+
+
+def _should_retry(method, policy, attempt):
+    if method != "GET" or attempt >= policy.retries:
+        return False
+    # No point backing off if the request deadline is already (almost) spent
+    left = remaining()
+    return left is None or left > policy.backoff * (2 ** attempt)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    pass
+
+
+def _timeout(policy, kwargs):
+    timeout = cap_timeout(kwargs.get("timeout", policy.timeout))
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return timeout
+
+
+def request(method, path, endpoint=None, **kwargs) -> httpx.Response:
+    policy = _policy(endpoint)
+    attempt = 0
+    while True:
+        kwargs["timeout"] = _timeout(policy, kwargs)
+        try:
+            r = get_client().request(method, path, **kwargs)
+            if r.status_code not in RETRY_STATUS or not _should_retry(method, policy, attempt):
+                return r
+            logger.warning(f"[http] {method} {path} -> {r.status_code}, retrying")
+        except httpx.TransportError as e:
+            if not _should_retry(method, policy, attempt):
+                raise
+            logger.warning(f"[http] {method} {path} failed ({e!r}), retrying")
+        time.sleep(_delay(policy, attempt))
+        attempt += 1
+
+
+async def request_async(method, path, endpoint=None, **kwargs) -> httpx.Response:
+    policy = _policy(endpoint)
+    attempt = 0
+    while True:
+        kwargs["timeout"] = _timeout(policy, kwargs)
+        try:
+            r = await get_async_client().request(method, path, **kwargs)
+            if r.status_code not in RETRY_STATUS or not _should_retry(method, policy, attempt):
+                return r
+            logger.warning(f"[http] {method} {path} -> {r.status_code}, retrying")
+        except httpx.TransportError as e:
+            if not _should_retry(method, policy, attempt):
+                raise
+            logger.warning(f"[http] {method} {path} failed ({e!r}), retrying")
+        await asyncio.sleep(_delay(policy, attempt))
+        attempt += 1
@@ -0,0 +1,362 @@
+# jobs.py
+# Batch audit jobs: a durable work queue (SQLite) plus a pool of asyncio
+# workers running inside the API process, sharing its LLM and HTTP clients.
+#
+# Every prompt of a job is a task row. Identical prompts (after whitespace /
+# case normalization) are executed once: a worker claims all pending tasks
+# with the same prompt_key together, and a prompt answered recently
+# (JOB_DEDUPE_TTL_S) is answered from the stored result without running the
+# agent again. Tasks left "running" by a crash are requeued on startup.
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import string
+import threading
+import time
+import uuid
+
+from app.agent.checkpoint import CHECKPOINT_DB
+from app.agent.run_agent import run_agent_async
+from app.agent.summarize import item_model
+from app.agent.tools import iter_pages_async
+from app.core.logger import get_logger
+from app.core.tracing import set_request_id
+
+JOBS_DB = os.getenv("AUDITOR_JOBS_DB", CHECKPOINT_DB)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_DEDUPE_TTL = float(os.getenv("JOB_DEDUPE_TTL_S", "3600"))
+JOB_MAX_PROMPTS = int(os.getenv("JOB_MAX_PROMPTS", "10000"))
+JOB_POLL_INTERVAL = 1.0
+
+logger = get_logger("jobs")
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS audit_jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        cancelled INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        prompt TEXT NOT NULL,
+        prompt_key TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        deduped INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        started_at REAL,
+        finished_at REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS audit_tasks_status ON audit_tasks (status, id)",
+    "CREATE INDEX IF NOT EXISTS audit_tasks_job ON audit_tasks (job_id, seq)",
+    "CREATE INDEX IF NOT EXISTS audit_tasks_key ON audit_tasks (prompt_key, status)",
+]
+
+STATUSES = ("pending", "running", "done", "failed", "cancelled")
+
+
+def prompt_key(prompt):
+    normalized = " ".join(prompt.split()).casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _result_record(result):
+    # What is kept of an agent run: the answer and which tools backed it.
+    # Raw tool payloads stay out of the queue DB.
+    if "error" in result:
+        return None, result["error"]
+    tools = [
+        {
+            "name": t["name"],
+            "args": t["args"],
+            "latency_ms": t["latency_ms"],
+            "error": t.get("result", {}).get("error") if isinstance(t.get("result"), dict) else None,
+        }
+        for t in result.get("tools", [])
+    ]
+    return {"response": result.get("response"), "steps": result.get("steps"), "tools": tools}, None
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def recover(self):
+        """Requeue tasks that were running when the process died."""
+        with self._lock, self._connect() as conn:
+            n = conn.execute(
+                # an interrupted run does not count as a failed attempt
+                "UPDATE audit_tasks SET status = 'pending', started_at = NULL, "
+                "attempts = MAX(attempts - 1, 0) WHERE status = 'running'"
+            ).rowcount
+        if n:
+            logger.warning(f"Requeued {n} interrupted audit tasks")
+        return n
+
+    def submit(self, prompts, kind="prompts"):
+        job_id = uuid.uuid4().hex
+        rows = [(job_id, seq, p, prompt_key(p)) for seq, p in enumerate(prompts)]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO audit_jobs (id, kind, created_at) VALUES (?, ?, ?)",
+                (job_id, kind, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO audit_tasks (job_id, seq, prompt, prompt_key) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return job_id
+
+    def cancel(self, job_id):
+        with self._lock, self._connect() as conn:
+            if not conn.execute("UPDATE audit_jobs SET cancelled = 1 WHERE id = ?", (job_id,)).rowcount:
+                return False
+            conn.execute(
+                "UPDATE audit_tasks SET status = 'cancelled', finished_at = ? "
+                "WHERE job_id = ? AND status = 'pending'",
+                (time.time(), job_id),
+            )
+        return True
+
+    def claim(self):
+        """Take the oldest pending prompt (and its duplicates) for execution.
+
+        Returns (prompt_key, prompt) or None. Prompts with a fresh stored
+        answer are completed here and never handed to a worker.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, prompt_key, prompt FROM audit_tasks WHERE status = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                task_id, key, prompt = row
+
+                # Only rows that actually ran: a deduped row's finished_at is
+                # when it was answered from another one, and counting it would
+                # keep an old answer fresh forever
+                done = conn.execute(
+                    "SELECT result FROM audit_tasks WHERE prompt_key = ? AND status = 'done' AND deduped = 0 "
+                    "AND finished_at >= ? ORDER BY finished_at DESC LIMIT 1",
+                    (key, now - JOB_DEDUPE_TTL),
+                ).fetchone()
+                if done is not None:
+                    conn.execute(
+                        "UPDATE audit_tasks SET status = 'done', deduped = 1, result = ?, finished_at = ? "
+                        "WHERE prompt_key = ? AND status = 'pending'",
+                        (done[0], now, key),
+                    )
+                    continue
+
+                conn.execute(
+                    "UPDATE audit_tasks SET status = 'running', started_at = ?, attempts = attempts + 1, "
+                    "deduped = (id != ?) WHERE prompt_key = ? AND status = 'pending'",
+                    (now, task_id, key),
+                )
+                return key, prompt
+
+    def complete(self, key, result):
+        record, error = _result_record(result)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE audit_tasks SET status = 'done', result = ?, error = NULL, finished_at = ? "
+                    "WHERE prompt_key = ? AND status = 'running'",
+                    (json.dumps(record, default=str), now, key),
+                )
+            else:
+                # Failed attempts go back to the queue until JOB_MAX_ATTEMPTS
+                conn.execute(
+                    "UPDATE audit_tasks SET error = ?, finished_at = ?, "
+                    "status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END "
+                    "WHERE prompt_key = ? AND status = 'running'",
+                    (error, now, JOB_MAX_ATTEMPTS, key),
+                )
+
+    def job(self, job_id):
+        with self._lock, self._connect() as conn:
+            job = conn.execute(
+                "SELECT id, kind, created_at, cancelled FROM audit_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM audit_tasks WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            deduped, finished_at = conn.execute(
+                "SELECT COALESCE(SUM(deduped), 0), MAX(finished_at) FROM audit_tasks WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+
+        counts = {s: counts.get(s, 0) for s in STATUSES}
+        total = sum(counts.values())
+        open_tasks = counts["pending"] + counts["running"]
+        if job[3]:
+            status = "cancelled" if open_tasks == 0 else "cancelling"
+        elif open_tasks == 0:
+            status = "done"
+        elif counts["pending"] == total:
+            status = "queued"
+        else:
+            status = "running"
+        return {
+            "job_id": job[0],
+            "kind": job[1],
+            "status": status,
+            "total": total,
+            "progress": round((total - open_tasks) / total, 4) if total else 1.0,
+            "counts": counts,
+            "deduped": deduped,
+            "created_at": job[2],
+            "finished_at": finished_at if open_tasks == 0 else None,
+        }
+
+    def results(self, job_id, offset=0, limit=100):
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, prompt, status, attempts, deduped, result, error, finished_at "
+                "FROM audit_tasks WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        return [
+            {
+                "seq": r[0],
+                "prompt": r[1],
+                "status": r[2],
+                "attempts": r[3],
+                "deduped": bool(r[4]),
+                "result": json.loads(r[5]) if r[5] else None,
+                "error": r[6],
+                "finished_at": r[7],
+            }
+            for r in rows
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+class JobRunner:
+    """JOB_WORKERS asyncio workers draining the queue with the agent loop."""
+
+    def __init__(self, store=None, workers=JOB_WORKERS):
+        self.store = store or get_job_store()
+        self.workers = workers
+        self._tasks = []
+        self._wakeup = None
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self.store.recover)
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Job runner started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Anything cancelled mid-run is requeued by recover() on next start
+
+    async def _worker(self, n):
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            key, prompt = claimed
+            # One request ID per executed prompt: its logs and trace
+            set_request_id()
+            try:
+                result = await run_agent_async(prompt)
+            except Exception as e:
+                logger.error(f"[job worker {n}] audit failed", exc_info=True)
+                result = {"error": str(e)}
+            await asyncio.to_thread(self.store.complete, key, result)
+
+
+_runner = None
+
+
+def get_job_runner():
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
+
+
+def check_model_template(template):
+    """Raise ValueError unless {model_id} is the template's only field.
+
+    The template comes from the API: attribute or index access
+    ({model_id.__class__}, {0}) and format specs are rejected.
+    """
+    try:
+        fields = [(name, spec, conversion) for _, name, spec, conversion in string.Formatter().parse(template)
+                  if name is not None]
+    except ValueError as e:
+        raise ValueError(f"Invalid model_template: {e}") from None
+    if not fields:
+        raise ValueError("model_template must contain {model_id}")
+    for name, spec, conversion in fields:
+        if name != "model_id" or spec or conversion:
+            raise ValueError("model_template may only use {model_id}")
+
+
+async def expand_model_template(template):
+    """One prompt per model known to the backend: template uses {model_id}."""
+    check_model_template(template)
+    models = {}
+    async for item in iter_pages_async("/api/models", "models"):
+        model_id = item_model(item)
+        if model_id:
+            models.setdefault(model_id, None)
+    return [template.format(model_id=m) for m in models]
@@ -0,0 +1,289 @@
+# llm_pool.py
+# Pool of OpenAI-compatible LLM endpoints (Ollama, vLLM, ...) behind the agent.
+#
+# LLM_ENDPOINTS is a comma separated list of "url|model|max_concurrency|flags"
+# (model, concurrency and flags optional), e.g.
+#   LLM_ENDPOINTS="http://gpu1:11434/v1|qwen3:8b|4,http://gpu2:8000/v1|qwen3:8b|16|batch"
+# Requests go to the healthy endpoint with the lowest load: requests in
+# flight plus requests queued for a slot, over its cap.
+# Timeouts, connection errors and 5xx fail over to the next endpoint; after
+# LLM_FAILURE_THRESHOLD consecutive failures an endpoint cools down for
+# LLM_COOLDOWN_S and then gets one trial request (half-open).
+#
+# Endpoints flagged "batch" accept a list of prompts on /completions (vLLM
+# does); concurrent complete() calls (short summaries) within
+# LLM_BATCH_WINDOW_MS are sent to them as one request.
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import openai
+from openai import AsyncOpenAI
+
+from app.core.logger import get_logger
+
+DEFAULT_LLM_URL = "http://192.168.1.74:11434/v1"
+DEFAULT_LLM_MODEL = "qwen3:8b"
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+FAILURE_THRESHOLD = int(os.getenv("LLM_FAILURE_THRESHOLD", "2"))
+COOLDOWN = float(os.getenv("LLM_COOLDOWN_S", "30"))
+BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW_MS", "20")) / 1000
+BATCH_MAX = int(os.getenv("LLM_BATCH_MAX", "16"))
+
+logger = get_logger("llm_pool")
+
+# Worth trying another endpoint for these; anything else (4xx) is our fault
+_FAILOVER_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+)
+
+
+class Endpoint:
+    def __init__(self, url, model=DEFAULT_LLM_MODEL, limit=DEFAULT_CONCURRENCY, batch=False):
+        self.url = url
+        self.model = model
+        self.limit = limit
+        self.batch = batch
+        self.in_flight = 0
+        self.waiting = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ewma_ms = None
+        # AsyncOpenAI (its httpx pool) and the concurrency semaphore are bound
+        # to the event loop that uses them
+        self._per_loop = weakref.WeakKeyDictionary()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._per_loop.get(loop)
+        if state is None:
+            state = self._per_loop[loop] = (
+                AsyncOpenAI(base_url=self.url, api_key="not-needed", max_retries=0),
+                asyncio.Semaphore(self.limit),
+            )
+        return state
+
+    @property
+    def client(self):
+        return self._loop_state()[0]
+
+    def available(self, now):
+        return now >= self.cooldown_until
+
+    def load(self):
+        return (self.in_flight + self.waiting) / self.limit
+
+    @asynccontextmanager
+    async def slot(self):
+        """One of the endpoint's concurrency slots (queued callers count as load)."""
+        semaphore = self._loop_state()[1]
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def record(self, ok, elapsed_ms=None):
+        if ok:
+            self.consecutive_failures = 0
+            self.cooldown_until = 0.0
+            if elapsed_ms is not None:
+                self.ewma_ms = elapsed_ms if self.ewma_ms is None else 0.8 * self.ewma_ms + 0.2 * elapsed_ms
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.cooldown_until = time.monotonic() + COOLDOWN
+            logger.warning(f"[llm_pool] {self.url} marked down for {COOLDOWN:.0f}s")
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "model": self.model,
+            "healthy": self.available(time.monotonic()),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "limit": self.limit,
+            "batch": self.batch,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.consecutive_failures,
+            "avg_latency_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+        }
+
+
+def parse_endpoints(spec):
+    endpoints = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        parts = entry.split("|")
+        url = parts[0]
+        model = parts[1] if len(parts) > 1 and parts[1] else DEFAULT_LLM_MODEL
+        limit = int(parts[2]) if len(parts) > 2 and parts[2] else DEFAULT_CONCURRENCY
+        flags = set(parts[3:])
+        endpoints.append(Endpoint(url, model, limit, batch="batch" in flags))
+    return endpoints
+
+
+class LLMPool:
+    def __init__(self, endpoints):
+        if not endpoints:
+            raise ValueError("LLM pool needs at least one endpoint")
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+        self._batches = weakref.WeakKeyDictionary()  # loop -> {(max_tokens, temperature, timeout): [pending]}
+        self.batched_requests = 0
+        self.batched_prompts = 0
+
+    def _pick(self, tried, batch=False):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in tried and (e.batch or not batch)]
+            healthy = [e for e in candidates if e.available(now)]
+            # Every endpoint cooling down: try the one that failed longest ago
+            # rather than failing the request outright
+            pool = healthy or sorted(candidates, key=lambda e: e.cooldown_until)[:1]
+            if not pool:
+                return None
+            return min(pool, key=lambda e: (e.load(), e.ewma_ms or 0))
+
+    def _attempts(self, batch=False):
+        """Endpoints to try, in order; the caller stops at the first success."""
+        tried = []
+        while True:
+            endpoint = self._pick(tried, batch)
+            if endpoint is None:
+                return
+            tried.append(endpoint)
+            yield endpoint
+
+    async def stream(self, messages, tools=None, timeout=60, **kwargs):
+        """Streamed chat completion; yields chunks. Failover happens before the
+        first chunk (connection, timeout, 5xx), never in the middle of a stream."""
+        if tools:
+            kwargs["tools"] = tools
+        last_error = None
+        for endpoint in self._attempts():
+            async with endpoint.slot():
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        endpoint.client.chat.completions.create(
+                            model=endpoint.model,
+                            messages=messages,
+                            stream=True,
+                            timeout=timeout,
+                            **kwargs,
+                        ),
+                        timeout=timeout,
+                    )
+                except _FAILOVER_ERRORS as e:
+                    endpoint.record(False)
+                    last_error = e
+                    logger.warning(f"[llm_pool] {endpoint.url} failed ({e!r}), failing over")
+                    continue
+                try:
+                    async for chunk in response:
+                        yield chunk
+                except _FAILOVER_ERRORS:
+                    endpoint.record(False)
+                    raise
+                endpoint.record(True, (time.perf_counter() - start) * 1000)
+                return
+        raise last_error
+
+    # -- micro-batched plain completions ------------------------------------
+
+    async def complete(self, prompt, max_tokens=256, temperature=0.0, timeout=60):
+        """Text completion. Concurrent calls are merged into one request on
+        endpoints that take prompt lists; otherwise sent one by one."""
+        if not any(e.batch for e in self.endpoints):
+            response = await self._completions([prompt], max_tokens, temperature, timeout, batch=False)
+            return response[0]
+
+        loop = asyncio.get_running_loop()
+        batches = self._batches.setdefault(loop, {})
+        key = (max_tokens, temperature, timeout)
+        future = loop.create_future()
+        pending = batches.get(key)
+        if pending is None:
+            pending = batches[key] = []
+            loop.call_later(BATCH_WINDOW, lambda: asyncio.ensure_future(self._flush(batches, key, pending)))
+        pending.append((prompt, future))
+        if len(pending) >= BATCH_MAX:
+            asyncio.ensure_future(self._flush(batches, key, pending))
+        return await future
+
+    async def _flush(self, batches, key, pending):
+        if batches.get(key) is not pending:
+            return  # already sent (full batch before the window closed)
+        del batches[key]
+        max_tokens, temperature, timeout = key
+        prompts = [p for p, _ in pending]
+        with self._lock:
+            self.batched_requests += 1
+            self.batched_prompts += len(prompts)
+        try:
+            texts = await self._completions(prompts, max_tokens, temperature, timeout, batch=True)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), text in zip(pending, texts):
+            if not future.done():
+                future.set_result(text)
+
+    async def _completions(self, prompts, max_tokens, temperature, timeout, batch):
+        last_error = None
+        for endpoint in self._attempts(batch=batch):
+            async with endpoint.slot():
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(
+                        endpoint.client.completions.create(
+                            model=endpoint.model,
+                            prompt=prompts if batch else prompts[0],
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            timeout=timeout,
+                        ),
+                        timeout=timeout,
+                    )
+                except _FAILOVER_ERRORS as e:
+                    endpoint.record(False)
+                    last_error = e
+                    logger.warning(f"[llm_pool] {endpoint.url} failed ({e!r}), failing over")
+                    continue
+                endpoint.record(True, (time.perf_counter() - start) * 1000)
+                texts = [""] * len(prompts)
+                for choice in result.choices:
+                    texts[choice.index] = choice.text
+                return texts
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "endpoints": [e.stats() for e in self.endpoints],
+                "batched_requests": self.batched_requests,
+                "batched_prompts": self.batched_prompts,
+            }
+
+
+llm_pool = LLMPool(parse_endpoints(os.getenv("LLM_ENDPOINTS", f"{DEFAULT_LLM_URL}|{DEFAULT_LLM_MODEL}")))
@@ -0,0 +1,265 @@
+# memo.py
+# Memoization of whole agent answers. An answer is reused while the data it
+# was computed from has not changed: entries are keyed on the normalized
+# prompt plus a fingerprint of the backend state (provenance chain tip and
+# the anchored-event and registered-model high-water marks). When the
+# fingerprint moves, every entry computed under the old one is dropped.
+#
+# Lookups are exact first, then "semantic": a prompt whose word set is close
+# enough (Jaccard) to a cached one reuses it, but only if both name the same
+# entities (ids/numbers, and the word after "agent", "model", "org", ...).
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.agent.checkpoint import get_checkpoint_store
+from app.agent.http_client import request_async
+from app.core.logger import get_logger
+
+MEMO_ENABLED = os.getenv("AGENT_MEMO", "1") == "1"
+MEMO_MAX_ENTRIES = int(os.getenv("AGENT_MEMO_MAX_ENTRIES", "512"))
+# Answers can depend on wall-clock time ("last hour"), so they also expire
+MEMO_TTL = float(os.getenv("AGENT_MEMO_TTL_S", "600"))
+MEMO_SIMILARITY = float(os.getenv("AGENT_MEMO_SIMILARITY", "0.8"))
+# Bursts of requests share one fingerprint probe
+FINGERPRINT_TTL = float(os.getenv("AGENT_MEMO_FINGERPRINT_TTL_S", "1"))
+
+logger = get_logger("memo")
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "be", "of", "for", "to", "in", "on", "and", "or",
+    "me", "my", "please", "can", "you", "show", "tell", "what", "whats", "do", "does",
+    "el", "la", "los", "las", "de", "del", "y", "en", "por", "favor",
+}
+
+# Words naming what a prompt is about: the word that follows is a filter value
+# ("agent alice", "model gpt 4", "org acme and globex")
+_ENTITY_KEYS = {
+    "agent", "agents", "model", "models", "org", "orgs", "organization", "organizations",
+    "organisation", "organisations", "address", "addresses", "wallet", "wallets", "domain",
+    "domains", "inference", "inferences", "user", "users", "id", "ids",
+    "agente", "agentes", "modelo", "modelos", "organizacion", "organizaciones", "direccion",
+    "dominio", "usuario",
+}
+_ENTITY_JOINERS = {"and", "or", "y", "o"}
+
+
+def normalize(prompt):
+    return " ".join(_WORD.findall(prompt.casefold()))
+
+
+def _entities(words):
+    found = set()
+    expecting = False
+    for prev, w in zip([None] + words, words):
+        if w in _ENTITY_KEYS:
+            expecting = True
+        elif expecting and w not in _STOPWORDS:
+            found.add(w)
+            expecting = False
+        elif w in _ENTITY_JOINERS and prev in found:
+            expecting = True  # "agents alice and bob": bob is a value too
+    return found
+
+
+def _tokens(normalized):
+    words = normalized.split()
+    content = frozenset(w for w in words if w not in _STOPWORDS)
+    # Ids, indexes, dates and filter values: two prompts only match if these
+    # are identical
+    exact = frozenset({w for w in words if any(c.isdigit() for c in w)} | _entities(words))
+    return content, exact
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ---------------------------------------------------------------------------
+# Backend fingerprint
+# ---------------------------------------------------------------------------
+
+async def _high_water(exists, known):
+    """Number of items in an append-only sequence, probing from a known count.
+
+    exists(i) tells whether item i is there. If nothing changed this costs two
+    probes; growth is found by galloping then bisecting (O(log delta)).
+    """
+    n = known
+    if n > 0 and not await exists(n - 1):
+        n = 0  # sequence shrank (backend reset): search from scratch
+    if not await exists(n):
+        return n
+    lo, step = n + 1, 1
+    while await exists(lo + step - 1):
+        lo += step
+        step *= 2
+    hi = lo + step - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if await exists(mid):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class Fingerprinter:
+    def __init__(self, checkpoint_store=None):
+        self._checkpoint_store = checkpoint_store
+        self._blocks = None
+        self._counts = {}  # path -> last known length
+        self._cached = None  # (expires_at, fingerprint)
+
+    def _known_blocks(self):
+        if self._blocks is not None:
+            return self._blocks
+        # The verifier checkpoint is a good first guess of the chain length
+        store = self._checkpoint_store or get_checkpoint_store()
+        checkpoint = store.load()
+        return checkpoint["last_index"] + 1 if checkpoint else 0
+
+    async def _chain_tip(self):
+        seen = {}
+
+        async def exists(i):
+            r = await request_async("GET", f"/api/blocks/{i}", "blocks")
+            r.raise_for_status()
+            block = r.json()
+            if isinstance(block, dict) and "error" not in block:
+                seen[i] = block.get("hash")
+                return True
+            return False
+
+        count = await _high_water(exists, self._known_blocks())
+        if count and count - 1 not in seen:
+            await exists(count - 1)
+        self._blocks = count
+        return count, seen.get(count - 1)
+
+    async def _count(self, path, endpoint):
+        async def exists(i):
+            r = await request_async("GET", path, endpoint, params={"skip": i, "limit": 1})
+            r.raise_for_status()
+            return bool(r.json())
+
+        self._counts[path] = await _high_water(exists, self._counts.get(path, 0))
+        return self._counts[path]
+
+    async def fingerprint(self):
+        now = time.monotonic()
+        if self._cached is not None and self._cached[0] > now:
+            return self._cached[1]
+        (blocks, tip_hash), events, models = await asyncio.gather(
+            self._chain_tip(), self._count("/api/events", "events"), self._count("/api/models", "models"),
+        )
+        fingerprint = f"{blocks}:{tip_hash}:{events}:{models}"
+        self._cached = (now + FINGERPRINT_TTL, fingerprint)
+        return fingerprint
+
+
+# ---------------------------------------------------------------------------
+# Answer memo
+# ---------------------------------------------------------------------------
+
+class AnswerMemo:
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, ttl=MEMO_TTL, similarity=MEMO_SIMILARITY, fingerprinter=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.fingerprinter = fingerprinter or Fingerprinter()
+        self._entries = OrderedDict()  # normalized prompt -> (expires_at, tokens, answer)
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits_exact": 0,
+            "hits_semantic": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "invalidations": 0,
+            "evictions": 0,
+        }
+
+    async def current_fingerprint(self):
+        try:
+            fingerprint = await self.fingerprinter.fingerprint()
+        except Exception as e:
+            # Backend unreachable: no way to know if data changed, do not memoize
+            logger.warning(f"[memo] fingerprint unavailable ({e!r}), bypassing")
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return None
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._entries:
+                    self._stats["invalidations"] += 1
+                    logger.info(f"[memo] data changed ({self._fingerprint} -> {fingerprint}), dropping {len(self._entries)} answers")
+                self._entries.clear()
+                self._fingerprint = fingerprint
+        return fingerprint
+
+    def get(self, prompt, fingerprint):
+        key = normalize(prompt)
+        now = time.monotonic()
+        with self._lock:
+            if fingerprint is None or fingerprint != self._fingerprint:
+                return None
+            for k in [k for k, e in self._entries.items() if e[0] <= now]:
+                del self._entries[k]
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits_exact"] += 1
+                return {**entry[2], "cached": "exact"}
+
+            content, exact = _tokens(key)
+            best, best_score = None, self.similarity
+            for k, (_, (c, e), answer) in self._entries.items():
+                if e != exact:
+                    continue
+                score = jaccard(content, c)
+                if score >= best_score:
+                    best, best_score = k, score
+            if best is not None:
+                self._entries.move_to_end(best)
+                self._stats["hits_semantic"] += 1
+                return {**self._entries[best][2], "cached": "semantic", "similarity": round(best_score, 3)}
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, prompt, fingerprint, answer):
+        key = normalize(prompt)
+        with self._lock:
+            if fingerprint is None or fingerprint != self._fingerprint:
+                return  # data moved while the agent was running
+            self._entries[key] = (time.monotonic() + self.ttl, _tokens(key), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self._stats["hits_exact"] + self._stats["hits_semantic"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "fingerprint": self._fingerprint,
+            }
+
+
+answer_memo = AnswerMemo()
@@ -0,0 +1,207 @@
+# merkle.py
+# Merkle roots and inclusion proofs over block hashes, built exactly like
+# merkle-wasm (calculate_merkle_root): leaves are the raw 32-byte block
+# hashes, parents are sha256(left || right) and an odd node is paired with
+# itself.
+#
+# Layers are kept as contiguous byte buffers (32 bytes per node) instead of
+# lists of objects, so a tree over millions of leaves is a handful of large
+# bytes objects and proofs are just slices into them.
+import hashlib
+import os
+import threading
+
+from app.agent.hashchain import get_process_pool, iter_block_pages
+from app.core.logger import get_logger
+
+NODE = 32
+# Layers with more pairs than this are hashed across the process pool
+PARALLEL_PAIRS = int(os.getenv("MERKLE_PARALLEL_PAIRS", "500000"))
+MERKLE_WORKERS = int(os.getenv("HASHCHAIN_WORKERS", str(os.cpu_count() or 1)))
+# Built trees kept by ChainMerkleIndex (one per anchored prefix)
+MAX_TREES = int(os.getenv("MERKLE_MAX_TREES", "2"))
+
+logger = get_logger("merkle")
+
+
+def hash_pairs(buf):
+    """Hash consecutive 64-byte pairs of buf into a buffer of 32-byte nodes."""
+    sha256 = hashlib.sha256
+    mv = memoryview(buf)
+    return b"".join([sha256(mv[i:i + 2 * NODE]).digest() for i in range(0, len(buf), 2 * NODE)])
+
+
+def _next_layer(layer):
+    # Odd node count: the last node is hashed with itself, separately, so the
+    # (possibly huge) layer is never copied just to append one node.
+    odd = (len(layer) // NODE) % 2
+    end = len(layer) - NODE if odd else len(layer)
+    pairs = end // (2 * NODE)
+
+    if MERKLE_WORKERS <= 1 or pairs < PARALLEL_PAIRS:
+        out = hash_pairs(memoryview(layer)[:end])
+    else:
+        step = -(-pairs // MERKLE_WORKERS) * 2 * NODE
+        chunks = [layer[i:min(i + step, end)] for i in range(0, end, step)]
+        out = b"".join(get_process_pool().map(hash_pairs, chunks))
+
+    if odd:
+        out += hashlib.sha256(layer[-NODE:] * 2).digest()
+    return out
+
+
+class MerkleTree:
+    def __init__(self, leaves):
+        """leaves: concatenated 32-byte leaf hashes."""
+        if not leaves:
+            raise ValueError("Cannot calculate merkle root from empty array")
+        if len(leaves) % NODE:
+            raise ValueError("Leaf buffer length must be a multiple of 32")
+        self.layers = [bytes(leaves)]
+        while len(self.layers[-1]) > NODE:
+            self.layers.append(_next_layer(self.layers[-1]))
+
+    @classmethod
+    def from_hex(cls, hashes):
+        return cls(bytes.fromhex("".join(h.removeprefix("0x") for h in hashes)))
+
+    def __len__(self):
+        return len(self.layers[0]) // NODE
+
+    @property
+    def root(self):
+        return self.layers[-1].hex()
+
+    def leaf(self, index):
+        return self.layers[0][index * NODE:(index + 1) * NODE].hex()
+
+    def proof(self, index):
+        """Sibling path from leaf to root: [{"hash", "position"}, ...]."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Leaf {index} out of range (0..{len(self) - 1})")
+        path = []
+        for layer in self.layers[:-1]:
+            count = len(layer) // NODE
+            sibling = index ^ 1
+            if sibling >= count:
+                sibling = index  # odd node paired with itself
+            path.append({
+                "hash": layer[sibling * NODE:(sibling + 1) * NODE].hex(),
+                "position": "left" if sibling < index else "right",
+            })
+            index //= 2
+        return path
+
+
+def verify_proof(leaf, proof, root):
+    node = bytes.fromhex(leaf.removeprefix("0x"))
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            node = hashlib.sha256(sibling + node).digest()
+        else:
+            node = hashlib.sha256(node + sibling).digest()
+    return node.hex() == root.removeprefix("0x").lower()
+
+
+def merkle_root(hashes):
+    return MerkleTree.from_hex(hashes).root
+
+
+# ---------------------------------------------------------------------------
+# Cached tree over the provenance chain, used by the inclusion-proof tool
+# ---------------------------------------------------------------------------
+
+class ChainMerkleIndex:
+    """Leaf hashes of the whole chain plus a cache of built trees.
+
+    New blocks are appended from the backend page by page; trees are cached
+    by leaf count (an anchor covers a prefix of the chain), so repeated proof
+    queries against the same anchor are only slicing.
+
+    Memory grows with the chain and stays resident: 32 bytes of leaves per
+    block, an inferenceId -> index entry per inference (~150 bytes), and
+    about 64 bytes per leaf for each cached tree (all its layers). For 1M
+    blocks that is ~32 MB of leaves plus ~64 MB per tree; at most max_trees
+    (MERKLE_MAX_TREES) trees are kept, oldest evicted first.
+    """
+
+    def __init__(self, max_trees=MAX_TREES):
+        self._leaves = bytearray()
+        self._inferences = {}
+        self._trees = {}
+        self._max_trees = max_trees
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        start = len(self._leaves) // NODE
+        for page in iter_block_pages(start=start):
+            for b in page:
+                if b["index"] != len(self._leaves) // NODE:
+                    raise ValueError(f"Unexpected block index {b['index']} while indexing chain")
+                self._leaves += bytes.fromhex(b["hash"])
+                inference_id = (b.get("data") or {}).get("inferenceId")
+                if inference_id:
+                    self._inferences[inference_id] = b["index"]
+
+    def tree(self, leaf_count=None):
+        with self._lock:
+            # A tree for a given anchor never changes: answer from the cache
+            # without asking the backend for new blocks
+            if leaf_count in self._trees:
+                return self._trees[leaf_count]
+            self._sync()
+            total = len(self._leaves) // NODE
+            leaf_count = total if leaf_count is None else min(leaf_count, total)
+            tree = self._trees.get(leaf_count)
+            if tree is None:
+                tree = MerkleTree(bytes(self._leaves[:leaf_count * NODE]))
+                if len(self._trees) >= self._max_trees:
+                    self._trees.pop(next(iter(self._trees)))
+                self._trees[leaf_count] = tree
+            return tree
+
+    def index_of_inference(self, inference_id):
+        with self._lock:
+            if inference_id not in self._inferences:
+                self._sync()
+            return self._inferences.get(inference_id)
+
+
+chain_index = ChainMerkleIndex()
+
+
+def inclusion_proof(block_index=None, inference_id=None, merkle_root=None, anchored_index=None):
+    """Prove a block (or the block of an inference) is under a Merkle root.
+
+    anchored_index is the last block covered by the anchor; the tree is built
+    over blocks 0..anchored_index (whole chain if omitted).
+    """
+    if block_index is None and inference_id is None:
+        return {"error": "block_index or inference_id is required"}
+    if block_index is None:
+        block_index = chain_index.index_of_inference(inference_id)
+        if block_index is None:
+            return {"error": f"No block found for inference {inference_id}"}
+    block_index = int(block_index)
+
+    leaf_count = None if anchored_index is None else int(anchored_index) + 1
+    tree = chain_index.tree(leaf_count)
+    if block_index >= len(tree):
+        return {"error": f"Block {block_index} is not covered by a tree of {len(tree)} leaves"}
+
+    leaf = tree.leaf(block_index)
+    proof = tree.proof(block_index)
+    result = {
+        "block_index": block_index,
+        "leaf": leaf,
+        "leaf_count": len(tree),
+        "root": tree.root,
+        "proof": proof,
+        "proof_valid": verify_proof(leaf, proof, tree.root),
+    }
+    if merkle_root:
+        result["anchored_root"] = merkle_root
+        result["root_matches"] = tree.root == merkle_root.removeprefix("0x").lower()
+        result["included"] = verify_proof(leaf, proof, merkle_root)
+    return result
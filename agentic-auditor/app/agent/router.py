@@ -0,0 +1,202 @@
+# router.py
+# Deterministic fast path in front of the LLM: requests that are just a tool
+# invocation ("health", "verify chain", "get block 123") are matched by
+# pattern, run directly and answered from a template. Anything else falls
+# back to the agent loop.
+import os
+import re
+import threading
+
+from app.core.logger import get_logger
+
+ROUTER_ENABLED = os.getenv("AGENT_ROUTER", "1") == "1"
+
+logger = get_logger("router")
+
+_ID = r"[\w.:-]+"
+_POLITE = r"(?:(?:please|por favor|can you|could you)[\s,]+)?"
+
+# (intent, tool, pattern). Patterns must match the whole request (case
+# insensitive, trailing punctuation ignored) so open-ended questions that
+# merely mention a block or the chain still go to the LLM.
+INTENTS = [
+    ("health", "healthcheck", r"(?:health(?:check)?|status|ping|estado"
+        r"|(?:check|show)\s+(?:the\s+)?(?:backend\s+)?health"
+        r"|is\s+(?:the\s+)?(?:backend|ernest)\s+(?:up|alive|ok|running))"),
+    ("verify_chain", "verify_chain", r"(?:(?:verify|check|validate|verifica(?:r)?)\s+(?:the\s+|la\s+)?"
+        r"(?:hash\s*)?(?:chain|cadena)(?:\s+integrity)?"
+        r"|is\s+the\s+(?:hash\s*)?chain\s+(?:intact|valid|ok))"
+        r"(?P<full>\s+(?:fully|full|from\s+genesis|completa))?"),
+    ("get_block", "get_block", r"(?:(?:get|show|fetch|dame|muestra)\s+)?(?:me\s+)?(?:the\s+)?"
+        r"(?:block|bloque)\s*#?(?P<block_id>\d+)"),
+    ("list_models", "list_models", r"(?:list|show|get)\s+(?:all\s+|the\s+)?(?:registered\s+)?models"),
+    ("list_events", "list_events", r"(?:list|show|get)\s+(?:all\s+|the\s+|recent\s+|latest\s+)?events"
+        rf"(?:\s+(?:for|of)\s+model\s+(?P<model_id>{_ID}))?"),
+    ("provenance", "provenance_by_model", r"(?:(?:get|show)\s+)?(?:the\s+)?provenance\s+(?:of|for)\s+"
+        rf"(?:model\s+)?(?P<model_id>{_ID})"),
+    ("anomalies", "detect_anomalies", r"(?:(?:list|show|find|detect|get)\s+)?(?:the\s+|all\s+)?"
+        r"(?:anomalies|suspicious\s+(?:agents|models|activity|events))"),
+    ("verify_inclusion", "verify_inclusion", r"(?:prove\s+(?:inclusion\s+of\s+)?|(?:verify|check)\s+inclusion\s+of\s+)block\s+#?(?P<block_index>\d+)"
+        r"(?:\s+(?:is\s+)?(?:included\s+)?(?:in|under|against)\s+(?:root\s+)?(?P<merkle_root>(?:0x)?[0-9a-fA-F]{64}))?"),
+]
+
+_COMPILED = [
+    (intent, tool, re.compile(rf"\s*{_POLITE}{pattern}\s*", re.IGNORECASE))
+    for intent, tool, pattern in INTENTS
+]
+
+
+class RouterStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routed = {}
+        self.fallbacks = 0
+
+    def record(self, intent):
+        with self._lock:
+            if intent is None:
+                self.fallbacks += 1
+            else:
+                self.routed[intent] = self.routed.get(intent, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            direct = sum(self.routed.values())
+            total = direct + self.fallbacks
+            return {
+                "direct": direct,
+                "fallback": self.fallbacks,
+                "direct_ratio": round(direct / total, 4) if total else None,
+                "by_intent": dict(self.routed),
+            }
+
+
+router_stats = RouterStats()
+
+
+def route(message):
+    """(intent, tool, args) when the request is a direct tool call, else None."""
+    text = (message or "").strip().rstrip("?.!¿¡ ")
+    for intent, tool, pattern in _COMPILED:
+        m = pattern.fullmatch(text)
+        if m is None:
+            continue
+        args = {k: v for k, v in m.groupdict().items() if v is not None}
+        if "full" in args:
+            args["full"] = True
+        for key in ("block_id", "block_index"):
+            if key in args:
+                args[key] = int(args[key])
+        router_stats.record(intent)
+        logger.info(f"[router] {intent} -> {tool} args={args}")
+        return intent, tool, args
+    router_stats.record(None)
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Templated answers
+# ---------------------------------------------------------------------------
+
+def _summary_health(result, args):
+    return f"Backend is **{result}**."
+
+
+def _summary_verify_chain(result, args):
+    head = (
+        f"{result['blocks_checked']} blocks checked ({result.get('mode', 'full')}), "
+        f"last block #{result['last_index']}, {result['duration_ms']} ms."
+    )
+    if result["valid"]:
+        return f"Hash chain is **valid**: {head}"
+    problems = ", ".join(f"{e.get('kind')} at #{e.get('index')}" for e in result["errors"][:5])
+    return f"Hash chain is **INVALID**: {result['error_count']} problems. {head}\n\nFirst problems: {problems}"
+
+
+def _summary_get_block(result, args):
+    data = result.get("data") or {}
+    lines = [f"Block **#{result.get('index')}**" + (f" ({data['type']})" if data.get("type") else "")]
+    lines.append(f"- hash: `{result.get('hash')}`")
+    lines.append(f"- previous: `{result.get('previousHash')}`")
+    if result.get("timestamp") is not None:
+        lines.append(f"- timestamp: {result['timestamp']}")
+    if data.get("modelId"):
+        lines.append(f"- model: {data['modelId']}")
+    return "\n".join(lines)
+
+
+def _summary_listing(label):
+    def summary(result, args):
+        scope = f" for model {args['model_id']}" if args.get("model_id") else ""
+        lines = [f"**{result['count']}** {label}{scope}."]
+        if result.get("by_type"):
+            lines.append("- by type: " + ", ".join(f"{t}: {n}" for t, n in result["by_type"].items()))
+        if result.get("per_model"):
+            top = list(result["per_model"].items())[:5]
+            lines.append(f"- {result['models']} models, top: " + ", ".join(f"{m} ({v['count']})" for m, v in top))
+        span = result.get("time_range") or {}
+        if span.get("first"):
+            lines.append(f"- from {span['first']} to {span['last']}")
+        if result.get("latency_ms"):
+            lat = result["latency_ms"]
+            lines.append(f"- latency p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms")
+        return "\n".join(lines)
+    return summary
+
+
+def _summary_provenance(result, args):
+    if isinstance(result, list):
+        return f"**{len(result)}** provenance records for model {args['model_id']}."
+    return f"Provenance for model {args['model_id']}: found."
+
+
+def _summary_anomalies(result, args):
+    head = (
+        f"Screened **{result['events_seen']}** events ({result['new_events']} new), "
+        f"{result['agents']} agents, {result['models']} models."
+    )
+    if not result["findings"]:
+        return head + " No anomalies found."
+    lines = [head, ""]
+    for f in result["findings"]:
+        who = f.get("agent") or f.get("model")
+        detail = ", ".join(f"{k}={v}" for k, v in f.items() if k not in ("kind", "severity", "agent", "model"))
+        lines.append(f"- **{f['severity']}** {f['kind']}: {who} ({detail})")
+    if result["findings_truncated"]:
+        lines.append(f"- ... totals by kind: {result['finding_counts']}")
+    return "\n".join(lines)
+
+
+def _summary_inclusion(result, args):
+    text = (
+        f"Block #{result['block_index']} is under the Merkle root of {result['leaf_count']} blocks "
+        f"(`{result['root']}`), proof of {len(result['proof'])} steps, proof valid: {result['proof_valid']}."
+    )
+    if "included" in result:
+        text += f"\n\nAgainst anchored root: **{'included' if result['included'] else 'NOT included'}**"
+        if not result["root_matches"]:
+            text += " (the anchored root does not match the recomputed root)"
+    return text
+
+
+SUMMARIES = {
+    "healthcheck": _summary_health,
+    "verify_chain": _summary_verify_chain,
+    "get_block": _summary_get_block,
+    "list_models": _summary_listing("model records"),
+    "list_events": _summary_listing("events"),
+    "provenance_by_model": _summary_provenance,
+    "verify_inclusion": _summary_inclusion,
+    "detect_anomalies": _summary_anomalies,
+}
+
+
+def render(tool, args, result):
+    if isinstance(result, dict) and "error" in result:
+        return f"`{tool}` failed: {result['error']}"
+    try:
+        return SUMMARIES[tool](result, args)
+    except (KeyError, TypeError, AttributeError):
+        # Unexpected shape: still answer, with the raw result
+        logger.warning(f"[router] no template for {tool} result shape")
+        return f"`{tool}` result:\n\n```\n{result}\n```"
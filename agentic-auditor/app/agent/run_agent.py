@@ -1,12 +1,42 @@
+import asyncio
 import json
-from openai import OpenAI
-from app.agent.tools import TOOLS_MAP
+import os
+import time
+from app.agent.compaction import compact_tool_result, estimate_tokens
+from app.agent.deadline import remaining as _remaining, set_deadline
+from app.agent.llm_pool import llm_pool
+from app.agent.memo import MEMO_ENABLED, answer_memo
+from app.agent.router import ROUTER_ENABLED, render, route
+from app.agent.tools import ASYNC_TOOLS_MAP
+from app.core import metrics
 from app.core.logger import get_logger
+from app.core.tracing import get_request_id, set_request_id, start_span
 import traceback
 
 logger = get_logger("agent")
 
-client = OpenAI(base_url="http://192.168.1.74:11434/v1", api_key="not-needed")
+# LLM endpoints (URL, model, concurrency) are configured in llm_pool.py
+# Multi-step tool loop limits: at most AGENT_MAX_STEPS LLM turns with tools,
+# and the whole run (LLM + tools) must finish within AGENT_DEADLINE_S.
+MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "4"))
+AGENT_DEADLINE = float(os.getenv("AGENT_DEADLINE_S", "120"))
+LLM_TIMEOUT = 60
+# Ask for token usage on the last streamed chunk (OpenAI, vLLM, recent
+# Ollama); without it token counts are estimated from the text
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"
+
+# Tool calls from one LLM turn run concurrently, at most TOOL_CONCURRENCY
+# at a time, each bounded by its own timeout (seconds).
+TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "8"))
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", "10"))
+TOOL_TIMEOUTS = {
+    "healthcheck": 2,
+    "verify_chain": 120,
+    "verify_inclusion": 120,
+    "detect_anomalies": 60,
+    "query_store": 120,
+    "provenance_by_model": 15,
+}
 
 TOOLS_SCHEMA = [
     {
@@ -21,8 +51,13 @@ TOOLS_SCHEMA = [
         "type": "function",
         "function": {
             "name": "verify_chain",
-            "description": "Verify the hashchain integrity stored in MongoDB using Ernest CLI",
-            "parameters": {"type": "object", "properties": {}},
+            "description": (
+                "Verify the hashchain integrity (recomputes block hashes and links) and return per-block errors. "
+                "Only blocks added since the last successful check are verified unless full=true"
+            ),
+            "parameters": {"type": "object", "properties": {
+                "full": {"type": "boolean", "description": "Re-verify the whole chain from genesis"}
+            }},
         },
     },
     {
@@ -44,16 +79,33 @@ TOOLS_SCHEMA = [
         "type": "function",
         "function": {
             "name": "list_models",
-            "description": "Return AI models registered in the Ernest system",
-            "parameters": {"type": "object", "properties": {}},
+            "description": (
+                "Summarize AI models registered in the Ernest system: total count, per-model counts, "
+                "registration time range and a small sample"
+            ),
+            "parameters": {"type": "object", "properties": {
+                "model_id": {"type": "string"},
+                "since": {"type": "string", "description": "Start of time range (ISO-8601 or unix seconds)"},
+                "until": {"type": "string", "description": "End of time range (ISO-8601 or unix seconds)"},
+                "sample": {"type": "integer", "description": "Number of raw items to include (default 10)"},
+            }},
         },
     },
     {
         "type": "function",
         "function": {
             "name": "list_events",
-            "description": "Return recent events stored in the Ernest system",
-            "parameters": {"type": "object", "properties": {}},
+            "description": (
+                "Summarize events stored in the Ernest system: counts by type, per-model counts and rates, "
+                "latency percentiles, time range and a small sample"
+            ),
+            "parameters": {"type": "object", "properties": {
+                "type": {"type": "string", "description": "Only events of this type"},
+                "model_id": {"type": "string"},
+                "since": {"type": "string", "description": "Start of time range (ISO-8601 or unix seconds)"},
+                "until": {"type": "string", "description": "End of time range (ISO-8601 or unix seconds)"},
+                "sample": {"type": "integer", "description": "Number of raw events to include (default 10)"},
+            }},
         },
     },
     {
@@ -76,100 +128,396 @@ TOOLS_SCHEMA = [
             }},
         },
     },
-]
-
-def run_agent(user_message: str):
-    logger.info(f"New request: {user_message}")
-
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an autonomous auditing agent. "
-                "You verify system health, hashchain integrity, and regiser inferences.\n\n"
-                "You have several tools:\n"
-                "- healthcheck(): checks if the NestJS backend is alive.\n"
-                "- verify_chain(): validates the hashchain using the Ernest CLI.\n"
-                "- audit_inference(): hashes input/output and detects drift.\n\n"
-                "- list_models(): lists AI models registered in the system.\n\n"
-                "- list_events(): lists recent events stored in the system.\n\n"
-                "- provenance_by_model(): retrieves provenance data for a given model ID.\n\n"
-                "- get_block(): retrieves block data for a given block ID.\n\n"
-                "Rules:\n"
-                "- ALWAYS use a tool when the user asks for real system data.\n"
-                "- Use verify_chain when the user asks for chain integrity or database consistency.\n"
-                "- Use audit_inference when the user provides an input/output pair.\n"
-                "- Use healthcheck for system status.\n"
-                "- After each tool call, analyze the returned JSON and give a final summary.\n"
-                "- Do not hallucinate. Do not invent facts.\n"
-                "- Be precise and technical."
+    {
+        "type": "function",
+        "function": {
+            "name": "verify_inclusion",
+            "description": (
+                "Build the Merkle tree over block hashes and return the inclusion proof of a block "
+                "(or of the block that logged an inference), optionally checked against an anchored root"
+            ),
+            "parameters": {"type": "object", "properties": {
+                "block_index": {"type": "integer"},
+                "inference_id": {"type": "string"},
+                "merkle_root": {"type": "string", "description": "Anchored Merkle root to check against"},
+                "anchored_index": {"type": "integer", "description": "Last block index covered by the anchor"},
+            }},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "detect_anomalies",
+            "description": (
+                "Screen the event stream for suspicious agents and models: payment bursts, abnormal costs, "
+                "repeated inputs with varying outputs, latency outliers, future timestamps, ghost models, "
+                "empty links. Incremental: only new events are processed"
             ),
+            "parameters": {"type": "object", "properties": {
+                "top": {"type": "integer", "description": "Max findings returned (default 20)"},
+                "reset": {"type": "boolean", "description": "Rebuild the statistics from the first event"},
+            }},
         },
-        {"role": "user", "content": user_message},
-    ]
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "query_store",
+            "description": (
+                "Aggregate events in the local columnar store (synced incrementally from the backend): "
+                "counts, latency avg/p50/p95 and total cost, optionally grouped and filtered. "
+                "For other questions pass a single read-only DuckDB SELECT in `sql`. Tables: "
+                "events(seq, type, model_id, agent_id, action_type, inference_id, ts TIMESTAMP, day DATE, "
+                "latency_ms, cost, input, output, raw JSON); "
+                "blocks(idx, ts, hash, previous_hash, type, model_id, inference_id, data JSON)"
+            ),
+            "parameters": {"type": "object", "properties": {
+                "group_by": {"type": "array", "items": {
+                    "type": "string", "enum": ["type", "model_id", "agent_id", "action_type", "day", "hour"],
+                }},
+                "type": {"type": "string"},
+                "model_id": {"type": "string"},
+                "agent_id": {"type": "string"},
+                "since": {"type": "string", "description": "ISO date or epoch seconds"},
+                "until": {"type": "string", "description": "ISO date or epoch seconds"},
+                "sql": {"type": "string", "description": "Read-only SELECT (overrides the structured arguments)"},
+                "limit": {"type": "integer", "description": "Max rows returned (default 50)"},
+            }},
+        },
+    },
+]
 
-    try:
-        response = client.chat.completions.create(
-            model="qwen3:8b",
-            messages=messages,
-            tools=TOOLS_SCHEMA,
-            timeout=60,
-        )
-    except Exception as e:
-        logger.error("LLM call failed", exc_info=True)
-        return {"error": str(e)}
+SYSTEM_PROMPT = (
+        "You are an autonomous auditing agent. "
+        "You verify system health, hashchain integrity, and regiser inferences.\n\n"
+        "You have several tools:\n"
+        "- healthcheck(): checks if the NestJS backend is alive.\n"
+        "- verify_chain(): validates the hashchain and reports invalid blocks.\n"
+        "- audit_inference(): hashes input/output and detects drift.\n"
+        "- detect_anomalies(): finds suspicious agents and models in the event stream.\n\n"
+        "- list_models(): summarizes AI models registered in the system.\n\n"
+        "- list_events(): summarizes events (filter by type, model_id, since, until).\n\n"
+        "- provenance_by_model(): retrieves provenance data for a given model ID.\n\n"
+        "- get_block(): retrieves block data for a given block ID.\n\n"
+        "- verify_inclusion(): proves a block or inference is included under a Merkle root.\n\n"
+        "- query_store(): counts, latencies and costs over all events (group by type, model, agent, day...).\n\n"
+        "Rules:\n"
+        "- ALWAYS use a tool when the user asks for real system data.\n"
+        "- Use verify_chain when the user asks for chain integrity or database consistency.\n"
+        "- Use audit_inference when the user provides an input/output pair.\n"
+        "- Use healthcheck for system status.\n"
+        "- After each tool call, analyze the returned JSON. Call more tools only if the results are not enough, "
+        "then give a final summary.\n"
+        "- Do not hallucinate. Do not invent facts.\n"
+        "- Be precise and technical."
 
-    msg = response.choices[0].message
+)
 
-    if not msg.tool_calls:
-        logger.warning("No tool calls detected in LLM response")
-        return {"response": msg.content}
 
-    tool_results = []
+def _parse_args(raw_args):
+    try:
+        args = json.loads(raw_args or "{}")
+    except ValueError:
+        return {}
+    return args if isinstance(args, dict) else {}
 
-    for call in msg.tool_calls:
-        name = call.function.name
-        raw_args = call.function.arguments or "{}"
 
-        try:
-            args = json.loads(raw_args)
-        except:
-            args = {}
+async def _run_tool(call, semaphore, deadline=None, parent=None):
+    name = call["function"]["name"]
+    args = _parse_args(call["function"]["arguments"])
+    timeout = TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
+    # Each tool runs in its own task: the deadline is visible to the HTTP
+    # layer below (http_client caps timeouts and retries with it)
+    if deadline is not None:
+        set_deadline(deadline)
 
+    async with semaphore:
+        remaining = _remaining(deadline)
+        if remaining is not None:
+            timeout = max(min(timeout, remaining), 0)
         logger.info(f"Tool-call: {name} args={args}")
-
+        span = start_span(f"tool.{name}", parent, tool=name, args=args, timeout_s=timeout)
+        start = time.perf_counter()
+        outcome = "ok"
         try:
-            result = TOOLS_MAP[name](**args)
+            result = await asyncio.wait_for(ASYNC_TOOLS_MAP[name](**args), timeout=timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            result = {"error": f"Tool '{name}' timed out after {timeout:.1f}s"}
+            logger.error(f"Tool timeout: {name}")
         except Exception as e:
+            outcome = "error"
             result = {"error": str(e), "trace": traceback.format_exc()}
             logger.error(f"Tool error: {name}", exc_info=True)
+        elapsed = time.perf_counter() - start
+        latency_ms = round(elapsed * 1000, 2)
+        if outcome == "ok" and isinstance(result, dict) and "error" in result:
+            outcome = "error"  # tools that report failures in their result
+        span.end(error=result["error"] if outcome != "ok" else None, outcome=outcome)
+        # Tool names come from the LLM: keep made-up ones out of the labels
+        label = name if name in ASYNC_TOOLS_MAP else "unknown"
+        metrics.tool_latency.observe(elapsed, tool=label)
+        metrics.tool_calls.inc(tool=label, outcome=outcome)
 
-        tool_results.append({"id": call.id, "name": name, "result": result})
+    return {"id": call["id"], "name": name, "args": args, "result": result, "latency_ms": latency_ms}
 
-    # Segunda pasada al LLM
-    followup_messages = [
-        msg,
-        *[
-            {
-                "role": "tool",
-                "tool_call_id": tr["id"],
-                "content": json.dumps(tr["result"]),
-            }
-            for tr in tool_results
-        ],
+
+def _start_tool_calls(tool_calls, deadline=None, parent=None):
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+    return [asyncio.create_task(_run_tool(call, semaphore, deadline, parent)) for call in tool_calls]
+
+
+def _cancel_pending(tasks):
+    # The run is over (client gone, deadline, error): stop the tool calls
+    # still in flight instead of letting them keep calling the backend
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+
+
+async def execute_tool_calls(tool_calls, deadline=None, parent=None):
+    """Run the tool calls of one LLM turn concurrently, keeping their order."""
+    tasks = _start_tool_calls(tool_calls, deadline, parent)
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        _cancel_pending(tasks)
+
+
+async def _stream_completion(messages, deadline, tools=True, parent=None, step=None):
+    """One streamed LLM turn. Yields ("token", text) and finally ("message", msg)."""
+    remaining = _remaining(deadline)
+    timeout = LLM_TIMEOUT if remaining is None else min(LLM_TIMEOUT, remaining)
+    extra = {"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {}
+    span = start_span("llm.turn", parent, step=step, tools=bool(tools), messages=len(messages))
+    start = time.perf_counter()
+    stream = llm_pool.stream(messages, tools=TOOLS_SCHEMA if tools else None, timeout=timeout, **extra)
+
+    content = []
+    calls = {}
+    usage = None
+    first_chunk = None
+    chunks = stream.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=_remaining(deadline))
+            except StopAsyncIteration:
+                break
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+                metrics.llm_ttft.observe(first_chunk, step=str(step))
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                yield "token", delta.content
+            for tc in delta.tool_calls or []:
+                # Tool calls arrive in fragments keyed by index
+                acc = calls.setdefault(tc.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                if tc.id:
+                    acc["id"] = tc.id
+                if tc.function and tc.function.name:
+                    acc["function"]["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    acc["function"]["arguments"] += tc.function.arguments
+    except BaseException as e:
+        # Also GeneratorExit / cancellation when the client goes away
+        if isinstance(e, Exception):
+            metrics.llm_errors.inc(error=type(e).__name__)
+        span.end(error=e if isinstance(e, Exception) else "cancelled")
+        raise
+
+    msg = {"role": "assistant", "content": "".join(content) or None}
+    if calls:
+        msg["tool_calls"] = [calls[i] for i in sorted(calls)]
+        for n, call in enumerate(msg["tool_calls"]):
+            call["id"] = call["id"] or f"call_{n}"
+
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        prompt_tokens = estimate_tokens(json.dumps(messages, default=str))
+        completion_tokens = estimate_tokens((msg["content"] or "") + json.dumps(msg.get("tool_calls") or ""))
+    metrics.llm_tokens.inc(prompt_tokens, kind="prompt")
+    metrics.llm_tokens.inc(completion_tokens, kind="completion")
+    elapsed = span.end(
+        ttft_ms=round(first_chunk * 1000, 2) if first_chunk is not None else None,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        tokens_estimated=usage is None,
+        tool_calls=len(msg.get("tool_calls") or []),
+    )
+    metrics.llm_latency.observe(elapsed, step=str(step))
+    yield "message", msg
+
+
+def _tool_failed(tr):
+    return isinstance(tr["result"], dict) and "error" in tr["result"]
+
+
+async def run_agent_stream(user_message: str, max_steps=MAX_STEPS, deadline_s=AGENT_DEADLINE, deadline=None, memo=MEMO_ENABLED, router=ROUTER_ENABLED):
+    """Multi-step agent loop as a stream of events.
+
+    Events: step, token, tool_start, tool_end, done, error. Each LLM turn may
+    call tools; their (compacted) results are fed back until the LLM answers
+    without tools, max_steps is reached or the deadline passes. deadline is
+    an absolute time.monotonic() value set by the caller (e.g. the request
+    deadline, which already includes time spent queued).
+
+    With router, requests that are a plain tool invocation are answered
+    from the tool result and a template (see router.py), without the LLM.
+    With memo, an answer computed earlier against the same backend state
+    (see memo.py) is returned as a single done event, without the LLM.
+
+    The run is traced (agent.run > router, memo.lookup, llm.turn, tool.*;
+    see GET /traces/{request_id}) and done/error events carry the request_id.
+    """
+    if get_request_id() is None:
+        set_request_id()
+    root = start_span("agent.run", prompt_chars=len(user_message or ""), max_steps=max_steps)
+    outcome = "cancelled"
+    try:
+        async for event in _agent_events(user_message, max_steps, deadline_s, deadline, memo, router, root):
+            if event["event"] in ("done", "error"):
+                if event["event"] == "error":
+                    outcome = "error"
+                else:
+                    outcome = "routed" if event.get("routed") else "memo" if event.get("cached") else "llm"
+                event = {**event, "request_id": root.request_id}
+            yield event
+    finally:
+        elapsed = root.end(error="agent run failed" if outcome == "error" else None, outcome=outcome)
+        metrics.agent_runs.inc(outcome=outcome)
+        metrics.agent_latency.observe(elapsed, outcome=outcome)
+
+
+async def _agent_events(user_message, max_steps, deadline_s, deadline, memo, router, root):
+    logger.info(f"New request: {user_message}")
+    own_deadline = time.monotonic() + deadline_s
+    deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
     ]
+    tool_results = []
+    tokens_saved = 0
+    fingerprint = None
 
     try:
-        second = client.chat.completions.create(
-            model="qwen3:8b",
-            messages=messages + followup_messages,
-            timeout=60,
-        )
+        routed = None
+        if router:
+            with start_span("router", root) as span:
+                routed = route(user_message)
+                span.set(intent=routed[0] if routed else None)
+        if routed is not None:
+            intent, name, args = routed
+            call = {"id": f"route_{intent}", "function": {"name": name, "arguments": json.dumps(args)}}
+            yield {"event": "tool_start", "id": call["id"], "name": name, "args": args}
+            [tr] = await execute_tool_calls([call], deadline, root)
+            yield {"event": "tool_end", "id": tr["id"], "name": name, "latency_ms": tr["latency_ms"],
+                   "error": tr["result"].get("error") if isinstance(tr["result"], dict) else None}
+            yield {
+                "event": "done",
+                "response": render(name, args, tr["result"]),
+                "tools": [tr],
+                "steps": 0,
+                "prompt_tokens_saved": 0,
+                "routed": intent,
+            }
+            return
+
+        if memo:
+            with start_span("memo.lookup", root) as span:
+                fingerprint = await asyncio.wait_for(answer_memo.current_fingerprint(), timeout=_remaining(deadline))
+                cached = answer_memo.get(user_message, fingerprint)
+                span.set(hit=cached["cached"] if cached else None)
+            if cached is not None:
+                logger.info(f"Answer served from memo ({cached['cached']})")
+                yield {"event": "done", **cached}
+                return
+
+        for step in range(1, max_steps + 2):
+            # Out of tool steps: one last turn without tools to force an answer
+            use_tools = step <= max_steps
+            yield {"event": "step", "step": step}
+
+            msg = None
+            async for kind, value in _stream_completion(messages, deadline, tools=use_tools, parent=root, step=step):
+                if kind == "token":
+                    yield {"event": "token", "text": value}
+                else:
+                    msg = value
+
+            if not msg.get("tool_calls"):
+                if not tool_results:
+                    logger.warning("No tool calls detected in LLM response")
+                logger.info("Final agent response", extra={"final": msg["content"]})
+                answer = {
+                    "response": msg["content"],
+                    "tools": tool_results,
+                    "steps": step,
+                    "prompt_tokens_saved": tokens_saved,
+                }
+                if fingerprint is not None and not any(_tool_failed(tr) for tr in tool_results):
+                    # Raw tool payloads are not kept in the memo (result_id points to them)
+                    tools = [{k: v for k, v in tr.items() if k != "result"} for tr in tool_results]
+                    answer_memo.put(user_message, fingerprint, {**answer, "tools": tools})
+                yield {"event": "done", **answer}
+                return
+
+            messages.append(msg)
+            for call in msg["tool_calls"]:
+                yield {
+                    "event": "tool_start",
+                    "id": call["id"],
+                    "name": call["function"]["name"],
+                    "args": _parse_args(call["function"]["arguments"]),
+                }
+
+            tasks = _start_tool_calls(msg["tool_calls"], deadline, root)
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    tr = await finished
+                    yield {
+                        "event": "tool_end",
+                        "id": tr["id"],
+                        "name": tr["name"],
+                        "latency_ms": tr["latency_ms"],
+                        "error": tr["result"].get("error") if isinstance(tr["result"], dict) else None,
+                    }
+            finally:
+                _cancel_pending(tasks)
+
+            # Resultados compactados, el raw queda en result_store
+            for task in tasks:
+                tr = task.result()
+                content, stats = compact_tool_result(tr["name"], tr["result"])
+                tr.update(stats, step=step)
+                tokens_saved += stats["saved_tokens"]
+                tool_results.append(tr)
+                messages.append({"role": "tool", "tool_call_id": tr["id"], "content": content})
+            logger.info(f"Step {step}: tool results compacted, prompt tokens saved so far: {tokens_saved}")
+
+    except asyncio.TimeoutError:
+        logger.error("Agent deadline exceeded")
+        yield {"event": "error", "error": "Agent deadline exceeded", "tools": tool_results}
     except Exception as e:
-        logger.error("LLM second-pass failed", exc_info=True)
-        return {"error": str(e)}
+        logger.error("LLM call failed", exc_info=True)
+        yield {"event": "error", "error": str(e), "tools": tool_results}
+
+
+def run_agent(user_message: str):
+    return asyncio.run(run_agent_async(user_message))
 
-    final_text = second.choices[0].message.content
 
-    logger.info("Final agent response", extra={"final": final_text})
-    return {"response": final_text, "tools": tool_results}
+async def run_agent_async(user_message: str, deadline=None):
+    async for event in run_agent_stream(user_message, deadline=deadline):
+        if event["event"] == "done":
+            return {k: v for k, v in event.items() if k != "event"}
+        if event["event"] == "error":
+            return {"error": event["error"], "request_id": event["request_id"]}
@@ -0,0 +1,243 @@
+# subscription.py
+# Follows /api/events by high-water mark and pushes every new batch to the
+# in-process consumers, so tools do not have to re-read the collection.
+#
+# The backend has no push feed: the subscription long-polls, immediately again
+# while pages come back full (catching up), backing off from
+# SUBSCRIPTION_POLL_S to SUBSCRIPTION_POLL_MAX_S while idle. Each poll asks for
+# the events after the last one seen (after=<blockNumber>:<logIndex>), which
+# the backend answers with an index lookup; skip=<mark> is only used until the
+# first positioned event arrives (start-up, or a backend without positions).
+#
+# Off by default (SUBSCRIPTION_ENABLED=1 to turn it on): it keeps polling the
+# backend for as long as the auditor runs.
+#
+# Each consumer has its own bounded queue and worker (its function runs in a
+# thread). Two policies:
+#   - "block": every batch must be processed (anomaly detector, event store).
+#     When its queue is full the poller waits: a slow consumer slows the
+#     subscription down (backpressure) instead of losing events.
+#   - "latest": only "something changed" matters (caches, chain verifier).
+#     Pending batches are replaced by the newest one and counted as dropped.
+import asyncio
+import os
+import time
+
+from app.agent.cache import tool_cache
+from app.agent.http_client import request_async
+from app.core.logger import get_logger
+
+SUBSCRIPTION_ENABLED = os.getenv("SUBSCRIPTION_ENABLED", "0") == "1"
+SUBSCRIPTION_CONSUMERS = [
+    c.strip() for c in os.getenv("SUBSCRIPTION_CONSUMERS", "anomaly,cache,verifier").split(",") if c.strip()
+]
+PAGE_SIZE = int(os.getenv("SUBSCRIPTION_PAGE_SIZE", "1000"))
+POLL_INTERVAL = float(os.getenv("SUBSCRIPTION_POLL_S", "0.5"))
+POLL_MAX_INTERVAL = float(os.getenv("SUBSCRIPTION_POLL_MAX_S", "2"))
+QUEUE_MAX = int(os.getenv("SUBSCRIPTION_QUEUE_MAX", "16"))  # batches per consumer
+VERIFY_MIN_INTERVAL = float(os.getenv("SUBSCRIPTION_VERIFY_INTERVAL_S", "5"))
+
+# Cached tools whose results depend on the event stream (blocks never change)
+EVENT_TOOLS = ("list_events", "list_models", "provenance_by_model")
+
+logger = get_logger("subscription")
+
+
+class Consumer:
+    def __init__(self, name, fn, policy="block", max_batches=QUEUE_MAX, min_interval=0.0):
+        if policy not in ("block", "latest"):
+            raise ValueError(f"Unknown policy {policy!r}")
+        self.name = name
+        self.fn = fn
+        self.policy = policy
+        self.max_batches = 1 if policy == "latest" else max_batches
+        self.min_interval = min_interval
+        self.queue = None
+        self.batches = 0
+        self.events = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.blocked_s = 0.0
+        self.busy_s = 0.0
+        self.position = None  # mark after the last processed batch
+
+    async def offer(self, events, start):
+        if self.policy == "latest":
+            while self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait((events, start))
+            return
+        if self.queue.full():
+            waited = time.perf_counter()
+            await self.queue.put((events, start))
+            self.blocked_s += time.perf_counter() - waited
+        else:
+            self.queue.put_nowait((events, start))
+
+    async def run(self):
+        while True:
+            events, start = await self.queue.get()
+            began = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.fn, events, start)
+                self.batches += 1
+                self.events += len(events)
+                self.position = start + len(events)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"[subscription] consumer {self.name} failed: {e}")
+            self.busy_s += time.perf_counter() - began
+            if self.min_interval:
+                await asyncio.sleep(self.min_interval)
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "max_batches": self.max_batches,
+            "batches": self.batches,
+            "events": self.events,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "position": self.position,
+            "blocked_s": round(self.blocked_s, 3),
+            "busy_s": round(self.busy_s, 3),
+        }
+
+
+class EventSubscription:
+    def __init__(self, consumers=(), start=0, page_size=PAGE_SIZE):
+        self.consumers = list(consumers)
+        self.high_water = start
+        self.page_size = page_size
+        self.polls = 0
+        self.empty_polls = 0
+        self.poll_errors = 0
+        self.last_event_at = None
+        self.cursor = None  # "<blockNumber>:<logIndex>" of the last event seen
+        self._first = None
+        self._tasks = []
+
+    def add(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    async def start(self):
+        for c in self.consumers:
+            c.queue = asyncio.Queue(maxsize=c.max_batches)
+            self._tasks.append(asyncio.create_task(c.run()))
+        self._tasks.append(asyncio.create_task(self._poll_loop()))
+        logger.info(f"Event subscription started at {self.high_water} "
+                    f"({', '.join(c.name for c in self.consumers)})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def poll(self):
+        """Fetch the events past the mark and hand them to the consumers."""
+        params = {"limit": self.page_size}
+        if self.cursor is not None:
+            params["after"] = self.cursor
+        else:
+            params["skip"] = self.high_water
+        r = await request_async("GET", "/api/events", "events", params=params)
+        r.raise_for_status()
+        page = r.json()
+        self.polls += 1
+        if page and self.high_water == 0:
+            self._first = page[0]
+        elif page and page[0] == self._first:
+            # The backend ignores skip/after: it sent the collection from the start
+            page = page[self.high_water:self.high_water + self.page_size]
+        if not page:
+            self.empty_polls += 1
+            return 0
+        start = self.high_water
+        self.high_water += len(page)
+        self.cursor = _position(page[-1])
+        self.last_event_at = time.time()
+        for c in self.consumers:
+            await c.offer(page, start)
+        return len(page)
+
+    async def _poll_loop(self):
+        delay = POLL_INTERVAL
+        while True:
+            try:
+                n = await self.poll()
+            except Exception as e:
+                self.poll_errors += 1
+                logger.warning(f"[subscription] poll failed: {e}")
+                n = 0
+            if n >= self.page_size:
+                delay = 0  # more waiting: catch up without sleeping
+            elif n:
+                delay = POLL_INTERVAL
+            else:
+                delay = min(max(delay * 2, POLL_INTERVAL), POLL_MAX_INTERVAL)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "high_water": self.high_water,
+            "cursor": self.cursor,
+            "polls": self.polls,
+            "empty_polls": self.empty_polls,
+            "poll_errors": self.poll_errors,
+            "last_event_at": self.last_event_at,
+            "consumers": {c.name: c.stats() for c in self.consumers},
+        }
+
+
+def _position(event):
+    """The event's log position as an after= cursor, or None without one."""
+    if isinstance(event, dict) and event.get("blockNumber") is not None and event.get("logIndex") is not None:
+        return f"{event['blockNumber']}:{event['logIndex']}"
+    return None
+
+
+def _invalidate_caches(events, start):
+    for tool in EVENT_TOOLS:
+        tool_cache.invalidate(tool)
+
+
+def _verify(events, start):
+    from app.agent.tools import verify_chain
+    result = verify_chain()
+    if not result["valid"]:
+        logger.warning(f"[subscription] chain invalid after event {start + len(events)}: "
+                       f"{result['error_count']} errors")
+
+
+def build_consumers(names=SUBSCRIPTION_CONSUMERS):
+    from app.agent import tools
+
+    available = {
+        "anomaly": lambda: Consumer("anomaly", tools.ingest_events),
+        "store": lambda: Consumer("store", tools.append_store_events),
+        "cache": lambda: Consumer("cache", _invalidate_caches, policy="latest"),
+        "verifier": lambda: Consumer("verifier", _verify, policy="latest", min_interval=VERIFY_MIN_INTERVAL),
+    }
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        raise ValueError(f"Unknown subscription consumers {unknown}; valid: {sorted(available)}")
+    return [available[n]() for n in names]
+
+
+_subscription = None
+
+
+def get_subscription():
+    global _subscription
+    if _subscription is None:
+        from app.agent.anomaly import detector
+        # Start where the detector is; consumers ahead of it skip what they have
+        _subscription = EventSubscription(build_consumers(), start=detector.events_seen)
+    return _subscription
@@ -0,0 +1,180 @@
+# summarize.py
+# Streaming aggregation of events / models, so tools hand the LLM a bounded
+# summary (counts, per-model rates, latency percentiles, a small sample)
+# instead of the raw result set.
+import random
+from datetime import datetime, timezone
+
+# Latency percentiles are computed over a uniform reservoir of this size
+RESERVOIR_SIZE = 10000
+# Distinct types / models counted one by one; the rest go under "other"
+MAX_KEYS = 1000
+# Types listed in the result (the rest are folded into "other")
+TOP_TYPES = 20
+
+
+def to_epoch(value):
+    """Unix seconds from a number (s or ms), numeric string or ISO-8601 string."""
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e12 else float(value)
+    try:
+        return to_epoch(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _data(item):
+    data = item.get("data")
+    return data if isinstance(data, dict) else {}
+
+
+def item_type(item):
+    return item.get("type") or _data(item).get("type")
+
+
+def item_model(item):
+    return item.get("model_id") or item.get("modelId") or _data(item).get("modelId")
+
+
+def item_agent(item):
+    return item.get("agent_id") or item.get("agentId") or _data(item).get("agentId")
+
+
+def item_time(item):
+    for field in ("timestamp", "createdAt", "executedAt"):
+        ts = to_epoch(item.get(field))
+        if ts is not None:
+            return ts
+    return to_epoch(_data(item).get("executedAt"))
+
+
+def matches(item, type=None, model_id=None, since=None, until=None):
+    if type and item_type(item) != type:
+        return False
+    if model_id and item_model(item) != model_id:
+        return False
+    if since is not None or until is not None:
+        ts = item_time(item)
+        if ts is None:
+            return False
+        if since is not None and ts < since:
+            return False
+        if until is not None and ts > until:
+            return False
+    return True
+
+
+def _iso(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _count(counts, key):
+    if key not in counts and len(counts) >= MAX_KEYS:
+        key = "other"
+    counts[key] = counts.get(key, 0) + 1
+
+
+def _top(counts, n):
+    top = dict(sorted(counts.items(), key=lambda kv: -kv[1])[:n])
+    rest = sum(counts.values()) - sum(top.values())
+    if rest:
+        top["other"] = top.get("other", 0) + rest
+    return top
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return round(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo), 2)
+
+
+class StreamSummary:
+    """Constant-memory summary of an item stream (plus a fixed-size sample)."""
+
+    def __init__(self, sample_size=10, seed=None):
+        self.sample_size = sample_size
+        self.count = 0
+        self.by_type = {}
+        self.by_model = {}
+        self.first_ts = None
+        self.last_ts = None
+        self.sample = []
+        self._latencies = []
+        self._latency_seen = 0
+        self._latency_max = None
+        self._rng = random.Random(seed)
+
+    def add(self, item):
+        self.count += 1
+        _count(self.by_type, item_type(item) or "unknown")
+        model = item_model(item)
+        if model:
+            _count(self.by_model, model)
+
+        ts = item_time(item)
+        if ts is not None:
+            self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+            self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+
+        latency = item.get("latency_ms")
+        if isinstance(latency, (int, float)) and not isinstance(latency, bool):
+            self._latency_seen += 1
+            self._latency_max = latency if self._latency_max is None else max(self._latency_max, latency)
+            if len(self._latencies) < RESERVOIR_SIZE:
+                self._latencies.append(latency)
+            else:
+                j = self._rng.randrange(self._latency_seen)
+                if j < RESERVOIR_SIZE:
+                    self._latencies[j] = latency
+
+        if len(self.sample) < self.sample_size:
+            self.sample.append(item)
+
+    def result(self):
+        span_h = None
+        if self.first_ts is not None and self.last_ts > self.first_ts:
+            span_h = (self.last_ts - self.first_ts) / 3600
+
+        top_models = sorted(self.by_model.items(), key=lambda kv: -kv[1])[:20]
+        per_model = {
+            m: {"count": c, "per_hour": round(c / span_h, 2) if span_h else None}
+            for m, c in top_models
+        }
+
+        out = {
+            "count": self.count,
+            "by_type": _top(self.by_type, TOP_TYPES),
+            "models": len(self.by_model),
+            "per_model": per_model,
+            "time_range": {"first": _iso(self.first_ts), "last": _iso(self.last_ts)},
+            "sample": self.sample,
+        }
+        if self._latencies:
+            values = sorted(self._latencies)
+            out["latency_ms"] = {
+                "count": self._latency_seen,
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": self._latency_max,
+            }
+        return out
+
+
+def summarize(items, sample_size=10, **filters):
+    summary = StreamSummary(sample_size)
+    for item in items:
+        if matches(item, **filters):
+            summary.add(item)
+    return summary.result()
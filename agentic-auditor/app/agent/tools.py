@@ -1,63 +1,290 @@
 
+import asyncio
 import os
-import requests, subprocess, time
+import subprocess, threading, time
+import duckdb
+import httpx
+from app.agent.anomaly import detector
+from app.agent.event_store import get_event_store
+from app.agent.hashchain import iter_block_pages, verify_chain_incremental
+from app.agent.cache import tool_cache
+from app.agent.merkle import inclusion_proof
+from app.agent.summarize import StreamSummary, matches, summarize, to_epoch
+from app.agent.http_client import ERNEST_URL, request, request_async
 from app.core.logger import get_logger
 
-ERNEST_URL = "http://localhost:3001"
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CLI_PATH = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "cli", "ernest"))
-
 logger = get_logger("tools")
 
-def ernest_health():
+# Cache TTLs (seconds) for the read-only tools. Blocks never change once
+# written, so get_block is cached until evicted (None).
+CACHE_TTLS = {
+    "list_models": float(os.getenv("CACHE_TTL_LIST_MODELS", "30")),
+    "list_events": float(os.getenv("CACHE_TTL_LIST_EVENTS", "5")),
+    "provenance_by_model": float(os.getenv("CACHE_TTL_PROVENANCE", "10")),
+    "get_block": None,
+}
+
+# Page size used when walking list endpoints
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "500"))
+# Events folded into the anomaly detector per vectorized batch
+ANOMALY_BATCH = int(os.getenv("ANOMALY_BATCH", "5000"))
+# Local event store: page size and time budget of one incremental sync
+STORE_PAGE_SIZE = int(os.getenv("EVENT_STORE_PAGE_SIZE", "5000"))
+STORE_SYNC_BUDGET_S = float(os.getenv("EVENT_STORE_SYNC_BUDGET_S", "20"))
+
+# ---------------------------------------------------------------------------
+# Tool bodies shared by the sync and async variants. A body is a generator
+# that yields the (args, kwargs) of each backend request it needs and gets the
+# response back (or the request's exception, raised at the yield); _run and
+# _run_async perform the requests with the sync or the async client.
+# ---------------------------------------------------------------------------
+
+def _run(body):
+    response, error = None, None
+    while True:
+        try:
+            args, kwargs = body.send(response) if error is None else body.throw(error)
+        except StopIteration as done:
+            return done.value
+        try:
+            response, error = request(*args, **kwargs), None
+        except Exception as e:
+            response, error = None, e
+
+async def _run_async(body):
+    response, error = None, None
+    while True:
+        try:
+            args, kwargs = body.send(response) if error is None else body.throw(error)
+        except StopIteration as done:
+            return done.value
+        try:
+            response, error = await request_async(*args, **kwargs), None
+        except Exception as e:
+            response, error = None, e
+
+def _health():
     try:
-        r = requests.get(f"{ERNEST_URL}/health", timeout=1)
-        logger.info("[healthcheck] status:", r.status_code)
+        r = yield ("GET", "/health", "health"), {}
+        logger.info(f"[healthcheck] status: {r.status_code}")
 
         return "ALIVE" if r.status_code==200 else "DOWN"
     except Exception as e:
-        logger.error("[healthcheck] error:", e)
+        logger.error(f"[healthcheck] error: {e}")
         return "DOWN"
 
-def verify_chain():
-    import subprocess
-    
-    result = subprocess.run(
-        [CLI_PATH, "hashchain", "verify"],
-        capture_output=True,
-        text=True,
-        timeout=5
-    )
-    
-    logger.info(f"[DEBUG] verify_chain stdout: {result.stdout}")
-    return result.stdout
-
-def list_events(limit=200):
-    r = requests.get(f"{ERNEST_URL}/api/events?limit={limit}", timeout=2)
+def _provenance(model_id):
+    r = yield ("GET", f"/api/provenances/{model_id}", "provenance"), {}
     r.raise_for_status()
     return r.json()
 
-def list_models(limit=200):
-    r = requests.get(f"{ERNEST_URL}/api/models?limit={limit}", timeout=2)
-    r.raise_for_status()
-    return r.json()
+def _block(block_id):
+    try:
+        r = yield ("GET", f"/api/blocks/{block_id}", "blocks"), {}
+        r.raise_for_status()
+        return r.json()
+    except httpx.HTTPError as e:
+        logger.error(f"[get_block] error fetching block {block_id}: {e}")
+        return {"error": str(e)}
+
+def _audit(report):
+    payload={"type":"audit_inference","timestamp":time.time(),"report":report}
+    r = yield ("POST", "/audit", "audit"), {"json": payload}
+    return {"status":r.status_code}
+
+class _Pager:
+    """Page planning for a list endpoint (limit/skip cursor), shared by
+    iter_pages and iter_pages_async: the params of the next request, which
+    items of a page to hand out, and when to stop."""
+
+    def __init__(self, params=None, page_size=LIST_PAGE_SIZE, limit=None, start=0):
+        self.params = {k: v for k, v in (params or {}).items() if v is not None}
+        self.page_size = page_size
+        self.limit = limit
+        self.start = start
+        self.skip = start
+        self.first = None
+        self.done = limit is not None and limit <= 0
+
+    def next_params(self):
+        return {**self.params, "limit": self.page_size, "skip": self.skip}
+
+    def take(self, page):
+        # An old backend ignores skip and keeps sending the first page
+        if not page or (self.skip > self.start and page[0] == self.first):
+            self.done = True
+            return []
+        self.first = page[0]
+        items = page
+        if self.limit is not None:
+            items = page[:self.limit - (self.skip - self.start)]
+        self.skip += len(items)
+        # Short page: end of data. Longer than asked: paging was ignored and
+        # the whole collection came in one go.
+        if len(page) != self.page_size or (self.limit is not None and self.skip - self.start >= self.limit):
+            self.done = True
+        return items
+
+def _list_query(path, endpoint, type=None, model_id=None, since=None, until=None):
+    """Backend params and client-side filters of list_events / list_models."""
+    filters = {"type": type, "model_id": model_id, "since": to_epoch(since), "until": to_epoch(until)}
+    # The time range goes to the backend; type is matched by summarize() on
+    # the items it gets back (anchored events carry no type or modelId,
+    # /api/models filters by modelId itself)
+    params = {"since": filters["since"], "until": filters["until"]}
+    if endpoint == "models":
+        params["modelId"] = model_id
+    return path, endpoint, params, filters
+
+def ernest_health():
+    return _run(_health())
+
+def verify_chain(full=False):
+    result = verify_chain_incremental(full=full)
+    logger.info(
+        f"[verify_chain] mode={result['mode']} valid={result['valid']} blocks={result['blocks_checked']} "
+        f"errors={result['error_count']} duration_ms={result['duration_ms']}"
+    )
+    return result
+
+def iter_pages(path, endpoint, params=None, page_size=LIST_PAGE_SIZE, limit=None, start=0):
+    """Yield the items of a list endpoint page by page, at most limit of them
+    (items read, before any client-side filtering)."""
+    pager = _Pager(params, page_size, limit, start)
+    while not pager.done:
+        r = request("GET", path, endpoint, params=pager.next_params())
+        r.raise_for_status()
+        yield from pager.take(r.json())
+
+@tool_cache.cached("list_events", CACHE_TTLS["list_events"])
+def list_events(type=None, model_id=None, since=None, until=None, limit=None, sample=10):
+    path, endpoint, params, filters = _list_query("/api/events", "events", type, model_id, since, until)
+    return summarize(iter_pages(path, endpoint, params, limit=limit), sample, **filters)
+
+@tool_cache.cached("list_models", CACHE_TTLS["list_models"])
+def list_models(model_id=None, since=None, until=None, limit=None, sample=10):
+    path, endpoint, params, filters = _list_query("/api/models", "models", None, model_id, since, until)
+    return summarize(iter_pages(path, endpoint, params, limit=limit), sample, **filters)
 
+@tool_cache.cached("provenance_by_model", CACHE_TTLS["provenance_by_model"])
 def provenance_by_model(model_id):
-    r = requests.get(f"{ERNEST_URL}/api/provenances/{model_id}", timeout=2)
-    r.raise_for_status()
-    return r.json()
+    return _run(_provenance(model_id))
 
+@tool_cache.cached("get_block", CACHE_TTLS["get_block"])
 def get_block(block_id):
+    return _run(_block(block_id))
+
+_anomaly_lock = threading.Lock()
+
+def _catch_up_anomalies():
+    # Caller holds _anomaly_lock
+    new = 0
+    batch = []
+    for item in iter_pages("/api/events", "events", start=detector.events_seen):
+        batch.append(item)
+        if len(batch) >= ANOMALY_BATCH:
+            new += detector.ingest(batch)
+            batch = []
+    return new + detector.ingest(batch)
+
+def detect_anomalies(top=20, reset=False):
+    # Incremental: only events past the detector's high-water mark are fetched
+    start = time.perf_counter()
+    with _anomaly_lock:
+        if reset:
+            detector.reset()
+        new = _catch_up_anomalies()
+    result = detector.summary(top)
+    result["new_events"] = new
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    logger.info(f"[detect_anomalies] new_events={new} findings={result['finding_counts']}")
+    return result
+
+_store_lock = threading.Lock()
+
+def sync_store(max_seconds=STORE_SYNC_BUDGET_S):
+    # Mirror new events and blocks into the local store, from its high-water
+    # marks. Stops after max_seconds; the next call resumes from there.
+    start = time.perf_counter()
+    store = get_event_store()
+    added = {"events": 0, "blocks": 0}
+    complete = True
+    with _store_lock:
+        seq, _ = store.high_water("events")
+        batch = []
+        for item in iter_pages("/api/events", "events", page_size=STORE_PAGE_SIZE, start=seq):
+            batch.append(item)
+            if len(batch) >= STORE_PAGE_SIZE:
+                seq = store.append_events(batch, seq)
+                added["events"] += len(batch)
+                batch = []
+                if time.perf_counter() - start > max_seconds:
+                    complete = False
+                    break
+        else:
+            store.append_events(batch, seq)
+            added["events"] += len(batch)
+
+        last_index, _ = store.high_water("blocks")
+        for page in iter_block_pages(start=last_index + 1):
+            n = store.append_blocks(page)
+            if n is None:
+                # The chain no longer extends what we stored: start over
+                logger.warning(f"[sync_store] block {last_index + 1} does not link to the stored chain, resyncing")
+                store.reset("blocks")
+                complete = False
+                break
+            added["blocks"] += n
+            if time.perf_counter() - start > max_seconds:
+                complete = False
+                break
+    result = {"added": added, "complete": complete, "duration_ms": round((time.perf_counter() - start) * 1000, 2)}
+    logger.info(f"[sync_store] events={added['events']} blocks={added['blocks']} complete={complete}")
+    return result
+
+def ingest_events(events, start):
+    """Fold events found at positions start.. of /api/events (pushed by the
+    subscription) into the anomaly detector; returns how many were new."""
+    with _anomaly_lock:
+        offset = detector.events_seen - start
+        if offset < 0:
+            # The detector is behind (reset): page from its own mark instead
+            return _catch_up_anomalies()
+        return detector.ingest(events[offset:])
+
+def append_store_events(events, start):
+    """Same for the local event store."""
+    with _store_lock:
+        seq, _ = get_event_store().high_water("events")
+        offset = seq - start
+        if offset >= 0:
+            events = events[offset:]
+            get_event_store().append_events(events, seq)
+            return len(events)
+    return sync_store()["added"]["events"]
+
+def query_store(sql=None, group_by=None, type=None, model_id=None, agent_id=None,
+                since=None, until=None, limit=50, sync=True):
+    # Local aggregations over the mirrored events: a structured summary by
+    # default, or a read-only SQL SELECT
+    sync_result = sync_store() if sync else None
+    store = get_event_store()
     try:
-        r = requests.get(f"{ERNEST_URL}/api/blocks/{block_id}", timeout=2)
-        r.raise_for_status()
-        return r.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"[get_block] error fetching block {block_id}: {e}")
+        if sql:
+            result = store.query(sql, limit=limit)
+        else:
+            result = store.aggregate(group_by, type, model_id, agent_id, since, until, limit)
+    except (ValueError, TimeoutError, duckdb.Error) as e:
         return {"error": str(e)}
-    
+    if sync_result is not None:
+        result["sync"] = sync_result
+    return result
+
+def verify_inclusion(block_index=None, inference_id=None, merkle_root=None, anchored_index=None):
+    return inclusion_proof(block_index, inference_id, merkle_root, anchored_index)
+
 def get_event(eid):
-    return requests.get(f"{ERNEST_URL}/events/{eid}").json()
+    return request("GET", f"/events/{eid}", "events").json()
 
 def verify_event_cli(eid):
     result = subprocess.run(
@@ -67,9 +294,67 @@ def verify_event_cli(eid):
     return result.stdout
 
 def audit_inference(report):
-    payload={"type":"audit_inference","timestamp":time.time(),"report":report}
-    r=requests.post(f"{ERNEST_URL}/audit",json=payload)
-    return {"status":r.status_code}
+    return _run(_audit(report))
+
+# ---------------------------------------------------------------------------
+# Async variants: the same bodies, but they share the per-loop connection
+# pool and never block the FastAPI event loop.
+# ---------------------------------------------------------------------------
+
+async def ernest_health_async():
+    return await _run_async(_health())
+
+async def verify_chain_async(full=False):
+    # CPU-bound and paged over the sync client: keep it off the event loop
+    return await asyncio.to_thread(verify_chain, full)
+
+async def iter_pages_async(path, endpoint, params=None, page_size=LIST_PAGE_SIZE, limit=None, start=0):
+    pager = _Pager(params, page_size, limit, start)
+    while not pager.done:
+        r = await request_async("GET", path, endpoint, params=pager.next_params())
+        r.raise_for_status()
+        for item in pager.take(r.json()):
+            yield item
+
+async def _summarize_async(items, sample, filters):
+    summary = StreamSummary(sample)
+    async for item in items:
+        if matches(item, **filters):
+            summary.add(item)
+    return summary.result()
+
+@tool_cache.cached("list_events", CACHE_TTLS["list_events"])
+async def list_events_async(type=None, model_id=None, since=None, until=None, limit=None, sample=10):
+    path, endpoint, params, filters = _list_query("/api/events", "events", type, model_id, since, until)
+    return await _summarize_async(iter_pages_async(path, endpoint, params, limit=limit), sample, filters)
+
+@tool_cache.cached("list_models", CACHE_TTLS["list_models"])
+async def list_models_async(model_id=None, since=None, until=None, limit=None, sample=10):
+    path, endpoint, params, filters = _list_query("/api/models", "models", None, model_id, since, until)
+    return await _summarize_async(iter_pages_async(path, endpoint, params, limit=limit), sample, filters)
+
+@tool_cache.cached("provenance_by_model", CACHE_TTLS["provenance_by_model"])
+async def provenance_by_model_async(model_id):
+    return await _run_async(_provenance(model_id))
+
+@tool_cache.cached("get_block", CACHE_TTLS["get_block"])
+async def get_block_async(block_id):
+    return await _run_async(_block(block_id))
+
+async def verify_inclusion_async(block_index=None, inference_id=None, merkle_root=None, anchored_index=None):
+    return await asyncio.to_thread(verify_inclusion, block_index, inference_id, merkle_root, anchored_index)
+
+async def detect_anomalies_async(top=20, reset=False):
+    # Paging plus numpy work: run it off the event loop
+    return await asyncio.to_thread(detect_anomalies, top, reset)
+
+async def query_store_async(sql=None, group_by=None, type=None, model_id=None, agent_id=None,
+                            since=None, until=None, limit=50, sync=True):
+    # Sync (paging) and DuckDB both block: run it off the event loop
+    return await asyncio.to_thread(query_store, sql, group_by, type, model_id, agent_id, since, until, limit, sync)
+
+async def audit_inference_async(report):
+    return await _run_async(_audit(report))
 
 TOOLS_MAP = {
     "healthcheck": ernest_health,
@@ -79,4 +364,20 @@ TOOLS_MAP = {
     "list_events": list_events,
     "provenance_by_model": provenance_by_model,
     "get_block": get_block,
+    "verify_inclusion": verify_inclusion,
+    "detect_anomalies": detect_anomalies,
+    "query_store": query_store,
+}
+
+ASYNC_TOOLS_MAP = {
+    "healthcheck": ernest_health_async,
+    "audit_inference": audit_inference_async,
+    "verify_chain": verify_chain_async,
+    "list_models": list_models_async,
+    "list_events": list_events_async,
+    "provenance_by_model": provenance_by_model_async,
+    "get_block": get_block_async,
+    "verify_inclusion": verify_inclusion_async,
+    "detect_anomalies": detect_anomalies_async,
+    "query_store": query_store_async,
 }
@@ -1,20 +1,172 @@
 # fastapi_app.py
 from fastapi import FastAPI
 from pydantic import BaseModel
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from app.agent.run_agent import run_agent
+from starlette.background import BackgroundTask
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
+import os
+import time
+from app.agent.run_agent import AGENT_DEADLINE, run_agent_async, run_agent_stream
+from app.api.limiter import audit_limiter
+from app.agent.http_client import aclose_clients
+from app.agent.cache import tool_cache
+from app.agent.compaction import result_store
+from app.agent.llm_pool import llm_pool
+from app.agent.memo import answer_memo
+from app.agent.router import router_stats
+from app.agent.event_store import get_event_store
+from app.agent.subscription import SUBSCRIPTION_ENABLED, get_subscription
+from app.agent.tools import query_store_async, sync_store
+from app.agent.jobs import JOB_MAX_PROMPTS, JOB_POLL_INTERVAL, expand_model_template, get_job_runner, get_job_store
+from app.core import metrics
+from app.core.logger import get_logger
+from app.core.tracing import set_request_id, summarize_trace, trace_store
 
 app = FastAPI(
     title="Auditor Agent",
     version="1.0.0",
 )
 templates = Jinja2Templates(directory="app/templates")
+logger = get_logger("api")
+
+# Keep the local event store in sync in the background (0 = only on demand)
+EVENT_STORE_SYNC_INTERVAL = float(os.getenv("EVENT_STORE_SYNC_INTERVAL_S", "0"))
+_store_sync_task = None
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Request ID for logs and traces: the caller's X-Request-ID or a new one
+    request_id = set_request_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.http_requests.inc(method=request.method, route=path, status=status)
+        metrics.http_latency.observe(time.perf_counter() - start, method=request.method, route=path)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@metrics.registry.collector
+def _component_stats():
+    """Counters kept by the caches, router, LLM pool and limiter, read at scrape time."""
+    cache = tool_cache.stats()
+    memo = answer_memo.stats()
+    router = router_stats.stats()
+    pool = llm_pool.stats()
+    limiter = audit_limiter.stats()
+    subscription = get_subscription().stats() if SUBSCRIPTION_ENABLED else None
+    subscription_metrics = [
+        ("auditor_subscription_high_water", "gauge", "Events consumed from the backend by the subscription",
+         [({}, subscription["high_water"])]),
+        ("auditor_subscription_poll_errors_total", "counter", "Failed subscription polls",
+         [({}, subscription["poll_errors"])]),
+        ("auditor_subscription_queued_batches", "gauge", "Batches waiting per subscription consumer",
+         [({"consumer": name}, c["queued"]) for name, c in subscription["consumers"].items()]),
+        ("auditor_subscription_dropped_total", "counter", "Batches superseded before a consumer took them",
+         [({"consumer": name}, c["dropped"]) for name, c in subscription["consumers"].items()]),
+        ("auditor_subscription_blocked_seconds_total", "counter", "Time the poller waited on a full consumer queue",
+         [({"consumer": name}, round(c["blocked_s"], 3)) for name, c in subscription["consumers"].items()]),
+    ] if subscription else []
+    return subscription_metrics + [
+        ("auditor_tool_cache_lookups_total", "counter", "Tool cache lookups by result (hits, misses, coalesced)",
+         [({"tool": tool, "result": field}, counts[field])
+          for tool, counts in cache.items() for field in ("hits", "misses", "coalesced")]),
+        ("auditor_tool_cache_entries", "gauge", "Entries in the tool cache",
+         [({"tool": tool}, counts["entries"]) for tool, counts in cache.items()]),
+        ("auditor_memo_lookups_total", "counter", "Answer memo lookups by result",
+         [({"result": field}, memo[field]) for field in ("hits_exact", "hits_semantic", "misses")]),
+        ("auditor_memo_entries", "gauge", "Entries in the answer memo", [({}, memo["entries"])]),
+        ("auditor_router_requests_total", "counter", "Requests answered by the router (intent) or sent to the LLM",
+         [({"intent": intent}, n) for intent, n in router["by_intent"].items()]
+         + [({"intent": "fallback"}, router["fallback"])]),
+        ("auditor_llm_endpoint_requests_total", "counter", "Requests per LLM endpoint",
+         [({"endpoint": e["url"]}, e["requests"]) for e in pool["endpoints"]]),
+        ("auditor_llm_endpoint_errors_total", "counter", "Failed requests per LLM endpoint",
+         [({"endpoint": e["url"]}, e["errors"]) for e in pool["endpoints"]]),
+        ("auditor_llm_endpoint_in_flight", "gauge", "Requests in flight per LLM endpoint",
+         [({"endpoint": e["url"]}, e["in_flight"]) for e in pool["endpoints"]]),
+        ("auditor_llm_endpoint_waiting", "gauge", "Requests queued for a slot per LLM endpoint",
+         [({"endpoint": e["url"]}, e["waiting"]) for e in pool["endpoints"]]),
+        ("auditor_llm_endpoint_healthy", "gauge", "1 unless the endpoint is cooling down after failures",
+         [({"endpoint": e["url"]}, int(e["healthy"])) for e in pool["endpoints"]]),
+        ("auditor_llm_batched_total", "counter", "Micro-batched completion requests and the prompts they carried",
+         [({"unit": "requests"}, pool["batched_requests"]), ({"unit": "prompts"}, pool["batched_prompts"])]),
+        ("auditor_audit_slots", "gauge", "Audit concurrency slots in use and requests waiting for one",
+         [({"state": "active"}, limiter["active"]), ({"state": "waiting"}, limiter["waiting"])]),
+        ("auditor_audit_rejected_total", "counter", "Audits rejected by the limiter (queue full or timed out)",
+         [({"reason": "queue_full"}, limiter["rejected"]), ({"reason": "timeout"}, limiter["timed_out"])]),
+    ]
+
+
+async def _sync_store_loop():
+    while True:
+        try:
+            await asyncio.to_thread(sync_store)
+        except Exception as e:
+            logger.error(f"[store] background sync failed: {e}")
+        await asyncio.sleep(EVENT_STORE_SYNC_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_job_runner():
+    global _store_sync_task
+    await get_job_runner().start()
+    if SUBSCRIPTION_ENABLED:
+        await get_subscription().start()
+    if EVENT_STORE_SYNC_INTERVAL > 0:
+        _store_sync_task = asyncio.create_task(_sync_store_loop())
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    if _store_sync_task is not None:
+        _store_sync_task.cancel()
+    if SUBSCRIPTION_ENABLED:
+        await get_subscription().stop()
+    await get_job_runner().stop()
+    await aclose_clients()
 
 
 class AuditRequest(BaseModel):
     message: str
+    # Total budget for the audit, queueing included (defaults to AGENT_DEADLINE_S)
+    deadline_s: float | None = None
+
+
+def _deadline(deadline_s=None):
+    return time.monotonic() + min(deadline_s or AGENT_DEADLINE, AGENT_DEADLINE)
+
+
+class StoreQuery(BaseModel):
+    sql: str | None = None
+    group_by: list[str] | None = None
+    type: str | None = None
+    model_id: str | None = None
+    agent_id: str | None = None
+    since: str | None = None
+    until: str | None = None
+    limit: int = 50
+    sync: bool = False
+
+
+class JobRequest(BaseModel):
+    prompts: list[str] = []
+    # "Audit every model": one prompt per model, e.g. "Audit model {model_id}"
+    model_template: str | None = None
+
+
+async def _audit(message, deadline):
+    async with audit_limiter.slot(timeout=deadline - time.monotonic()):
+        return await run_agent_async(message, deadline=deadline)
 
 from markdown2 import markdown
 
@@ -33,7 +185,7 @@ async def home(request: Request):
 async def ui_run(request: Request):
     data = await request.form()
     query = data.get("query")
-    result = run_agent(query)
+    result = await _audit(query, _deadline())
     if "result" in result:
         # Forma A
         data = result["result"]
@@ -62,7 +214,192 @@ async def ui_run(request: Request):
 def health():
     return {"alive": True, "service": "auditor-agent"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return tool_cache.stats()
+
+@app.delete("/cache")
+def cache_invalidate(tool: str | None = None):
+    tool_cache.invalidate(tool)
+    return {"invalidated": tool or "all"}
+
+@app.get("/memo/stats")
+def memo_stats():
+    return answer_memo.stats()
+
+@app.delete("/memo")
+def memo_invalidate():
+    answer_memo.invalidate()
+    return {"invalidated": "all"}
+
+@app.get("/llm/stats")
+def llm_stats():
+    return llm_pool.stats()
+
+@app.get("/router/stats")
+def router_metrics():
+    return router_stats.stats()
+
+@app.get("/subscription/stats")
+def subscription_stats():
+    if not SUBSCRIPTION_ENABLED:
+        raise HTTPException(status_code=404, detail="Event subscription disabled (SUBSCRIPTION_ENABLED=0)")
+    return get_subscription().stats()
+
+@app.get("/store/stats")
+def store_stats():
+    return get_event_store().stats()
+
+@app.post("/store/sync")
+async def store_sync():
+    return await asyncio.to_thread(sync_store)
+
+@app.post("/store/query")
+async def store_query(req: StoreQuery):
+    result = await query_store_async(**req.model_dump())
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/traces/{request_id}")
+def get_trace(request_id: str):
+    # Spans of a recent agent run (request_id from X-Request-ID or the result)
+    spans = trace_store.get(request_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace not found or evicted")
+    return {"request_id": request_id, "totals_ms": summarize_trace(spans), "spans": spans}
+
+@app.get("/results/{result_id}")
+def get_result(result_id: str):
+    # Full tool result behind a compacted prompt entry
+    result = result_store.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found or evicted")
+    return {"result_id": result_id, "result": result}
+
+@app.get("/audit/queue")
+def audit_queue():
+    return audit_limiter.stats()
+
 @app.post("/audit")
-def audit(req: AuditRequest):
-    result = run_agent(req.message)
+async def audit(req: AuditRequest):
+    result = await _audit(req.message, _deadline(req.deadline_s))
     return {"result": result}
+
+
+def _slot_releaser(started):
+    """Release an audit slot once, whichever of the callers gets there first."""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            audit_limiter.release(started)
+    return release
+
+
+async def _sse(message: str, deadline: float, release):
+    try:
+        async for event in run_agent_stream(message, deadline=deadline):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        release()
+
+
+async def _sse_response(message: str, deadline_s=None):
+    # The slot is taken before answering so overload is still a plain 429/503.
+    # The stream frees it when it ends; the background task frees it when the
+    # client went away before the generator ever started (its finally never
+    # runs then).
+    deadline = _deadline(deadline_s)
+    release = _slot_releaser(await audit_limiter.acquire(timeout=deadline - time.monotonic()))
+    try:
+        return StreamingResponse(
+            _sse(message, deadline, release),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(release),
+        )
+    except BaseException:
+        release()
+        raise
+
+@app.get("/audit/stream")
+async def audit_stream_get(message: str, deadline_s: float | None = None):
+    # GET so the browser EventSource can consume it
+    return await _sse_response(message, deadline_s)
+
+@app.post("/audit/stream")
+async def audit_stream(req: AuditRequest):
+    return await _sse_response(req.message, req.deadline_s)
+
+
+# ---------------------------------------------------------------------------
+# Batch jobs
+# ---------------------------------------------------------------------------
+
+def _job_or_404(job_id):
+    job = get_job_store().job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: JobRequest):
+    prompts = [p for p in req.prompts if p.strip()]
+    kind = "prompts"
+    if req.model_template:
+        try:
+            prompts += await expand_model_template(req.model_template)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        kind = "models"
+    if not prompts:
+        raise HTTPException(status_code=400, detail="No prompts to audit")
+    if len(prompts) > JOB_MAX_PROMPTS:
+        raise HTTPException(status_code=413, detail=f"At most {JOB_MAX_PROMPTS} prompts per job")
+
+    job_id = await asyncio.to_thread(get_job_store().submit, prompts, kind)
+    get_job_runner().notify()
+    return _job_or_404(job_id)
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _job_or_404(job_id)
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str, offset: int = 0, limit: int = 100):
+    job = _job_or_404(job_id)
+    return {**job, "offset": offset, "results": get_job_store().results(job_id, offset, min(limit, 1000))}
+
+@app.delete("/jobs/{job_id}")
+def job_cancel(job_id: str):
+    get_job_store().cancel(job_id)
+    return _job_or_404(job_id)
+
+async def _job_events(job_id):
+    last = None
+    while True:
+        job = await asyncio.to_thread(get_job_store().job, job_id)
+        if job != last:
+            yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            last = job
+        if job["status"] in ("done", "cancelled"):
+            yield f"event: done\ndata: {json.dumps(job)}\n\n"
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+@app.get("/jobs/{job_id}/stream")
+def job_stream(job_id: str):
+    _job_or_404(job_id)
+    return StreamingResponse(
+        _job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,98 @@
+# limiter.py
+# Admission control for LLM work (/audit, /ui/run, /audit/stream): at most
+# AUDIT_CONCURRENCY audits run at once, up to AUDIT_QUEUE_MAX wait for a slot.
+# When the queue is full the request is rejected right away with 429; when it
+# waits longer than AUDIT_QUEUE_TIMEOUT_S it gets 503. Both carry Retry-After.
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app.core.logger import get_logger
+
+AUDIT_CONCURRENCY = int(os.getenv("AUDIT_CONCURRENCY", "4"))
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "200"))
+AUDIT_QUEUE_TIMEOUT = float(os.getenv("AUDIT_QUEUE_TIMEOUT_S", "30"))
+
+logger = get_logger("limiter")
+
+
+class AuditLimiter:
+    def __init__(self, concurrency=AUDIT_CONCURRENCY, queue_max=AUDIT_QUEUE_MAX, queue_timeout=AUDIT_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        self._avg_s = None  # moving average of audit duration
+
+    def retry_after(self):
+        """Rough wait (seconds) for a new request: queue length x avg duration."""
+        avg = self._avg_s or 5.0
+        return max(1, math.ceil(avg * (self.waiting + 1) / self.concurrency))
+
+    def _overloaded(self, status, detail):
+        return HTTPException(
+            status_code=status,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self, timeout=None):
+        """Wait for a slot; raises 429 (queue full) or 503 (waited too long)."""
+        # Counters, not the semaphore: they are updated synchronously so a
+        # burst of requests arriving together is still counted correctly
+        if self.active + self.waiting >= self.concurrency + self.queue_max:
+            self.rejected += 1
+            raise self._overloaded(429, "Audit queue is full")
+
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning(f"Audit waited {timeout:.1f}s for a slot, giving up")
+            raise self._overloaded(503, "Timed out waiting for an audit slot")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return time.monotonic()
+
+    def release(self, started):
+        self.active -= 1
+        self.completed += 1
+        elapsed = time.monotonic() - started
+        self._avg_s = elapsed if self._avg_s is None else 0.8 * self._avg_s + 0.2 * elapsed
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, timeout=None):
+        started = await self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "queue_max": self.queue_max,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_duration_s": round(self._avg_s, 2) if self._avg_s is not None else None,
+            "retry_after_s": self.retry_after(),
+        }
+
+
+audit_limiter = AuditLimiter()
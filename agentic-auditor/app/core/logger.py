@@ -1,9 +1,34 @@
 # logger.py
+# Logging goes through a queue: the calling thread only renders the message
+# (truncated to LOG_MAX_FIELD_CHARS), tags it with the request ID and puts it
+# on a bounded queue; one writer thread formats the records (orjson when
+# installed) and writes them to stdout in batches. When the queue is full
+# records are dropped and counted instead of blocking the request.
+# DEBUG lines are sampled (LOG_DEBUG_SAMPLE_RATE, per call site).
+# LOG_ASYNC=0 writes synchronously from the calling thread, as before.
+import atexit
 import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-from datetime import datetime
+import threading
+import time
+
+from app.core.tracing import get_request_id
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") == "1"
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "512"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "4096"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
 
 COLORS = {
     "DEBUG": "\033[36m",
@@ -14,55 +39,218 @@ COLORS = {
 }
 RESET = "\033[0m"
 
+
+def truncate(text, limit=LOG_MAX_FIELD_CHARS):
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [+{len(text) - limit} chars]"
+
+
+def render_message(record):
+    try:
+        return record.getMessage()  # deja que Python intente el formato normal
+    except Exception:
+        # Si peta (args sin placeholders), construimos nosotros manualmente:
+        return f"{record.msg} {' '.join(map(str, record.args or ()))}".strip()
+
+
+def _timestamp(created):
+    # From the record (when it was logged), not from when it is written
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(created)) + f".{int(created % 1 * 1e6):06d}Z"
+
+
+def _json_dumps(data):
+    # Same bytes as orjson: compact separators, UTF-8 left unescaped
+    return json.dumps(data, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=str).decode()
+
+
+_dumps = _orjson_dumps if orjson is not None else _json_dumps
+
+
 class JsonFormatter(logging.Formatter):
     def format(self, record):
         data = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": _timestamp(record.created),
             "level": record.levelname,
-            "message": record.getMessage(),
+            "message": truncate(render_message(record)),
             "module": record.module,
             "function": record.funcName,
         }
 
+        # Queued records carry the ID of the thread/task that logged them
+        request_id = getattr(record, "request_id", None) or get_request_id()
+        if request_id:
+            data["request_id"] = request_id
+
         if record.exc_info:
-            data["exception"] = self.formatException(record.exc_info)
+            data["exception"] = truncate(self.formatException(record.exc_info))
+        elif record.exc_text:
+            data["exception"] = record.exc_text
 
-        return json.dumps(data)
+        return _dumps(data)
 
 class ColorFormatter(logging.Formatter):
     def format(self, record):
         color = COLORS.get(record.levelname, "")
-        try:
-            msg = record.getMessage()  # deja que Python intente el formato normal
-        except Exception:
-            # Si peta, construimos nosotros manualmente:
-            msg = f"{record.msg} {record.args}".strip()
+        msg = truncate(render_message(record))
+        if record.exc_info:
+            msg += "\n" + self.formatException(record.exc_info)
+        elif record.exc_text:
+            msg += "\n" + record.exc_text
 
         base = f"{record.levelname:<8} | {record.module:<12} | {msg}"
         return f"{color}{base}{RESET}"
 
-def get_logger(name="agent"):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
 
-    if logger.handlers:
-        return logger
+class DebugSampler(logging.Filter):
+    """Keeps one DEBUG record in 1/rate per call site; other levels pass."""
 
+    def __init__(self, rate=LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else None
+        self._seen = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.every is None:
+            return False
+        site = (record.pathname, record.lineno)
+        n = self._seen.get(site, 0)
+        self._seen[site] = n + 1
+        return n % self.every == 0
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, max_size=LOG_QUEUE_MAX):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only what depends on the calling context is done here: the message
+        # (args may be mutated later) and the request ID. The record is
+        # updated in place (other handlers render the same text) rather than
+        # copied: a copy costs more than the rest of the call.
+        record.msg = truncate(render_message(record))
+        record.args = None
+        record.request_id = get_request_id()
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue: a put is ~20x cheaper than queue.Queue; the bound is
+        # approximate, which is fine for shedding load
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put(record)
+
+
+class BatchWriter:
+    """Writer thread: drains the queue and writes what it got in one call."""
+
+    def __init__(self, log_queue, stream, formatter, batch_max=LOG_BATCH_MAX):
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_max = batch_max
+        self.handler = None
+        self._thread = None
+        self._stop = object()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        reported = 0
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._stop in batch
+            lines = []
+            for record in batch:
+                if record is self._stop:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception as e:
+                    lines.append(f"log formatting failed: {e!r} ({record.msg!r:.200})")
+            dropped = self.handler.dropped if self.handler else 0
+            if dropped > reported:
+                lines.append(self.formatter.format(logging.makeLogRecord({
+                    "name": "logger", "module": "logger", "funcName": "_run",
+                    "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"{dropped - reported} log records dropped (queue full)",
+                })))
+                reported = dropped
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass
+            if stop:
+                return
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _formatter():
     # Mode selection:
     # LOCAL DEVELOPMENT: LOG_MODE=local → COLOR ONLY
     # PRODUCTION: LOG_MODE=prod → JSON ONLY
     mode = os.getenv("LOG_MODE", "local").lower()
+    return ColorFormatter() if mode == "local" else JsonFormatter()
+
+
+def get_handler():
+    """The handler shared by every app logger (queue + writer thread, or a
+    plain stdout handler with LOG_ASYNC=0)."""
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                if LOG_ASYNC:
+                    log_queue = queue.SimpleQueue()
+                    handler = QueueHandler(log_queue)
+                    writer = BatchWriter(log_queue, sys.stdout, _formatter())
+                    writer.handler = handler
+                    writer.start()
+                    # Flush what is still queued on interpreter exit
+                    atexit.register(writer.stop)
+                else:
+                    handler = logging.StreamHandler(sys.stdout)
+                    handler.setFormatter(_formatter())
+                handler.addFilter(DebugSampler())
+                _handler = handler
+    return _handler
 
-    handler = logging.StreamHandler(sys.stdout)
 
-    if mode == "local":
-        # LOCAL DEV MODE → pretty colored logs
-        handler.setFormatter(ColorFormatter())
-    else:
-        # PROD MODE → JSON logs
-        handler.setFormatter(JsonFormatter())
+def get_logger(name="agent"):
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+
+    if logger.handlers:
+        return logger
 
-    logger.handlers = [handler]
+    logger.handlers = [get_handler()]
     logger.propagate = True
 
     return logger
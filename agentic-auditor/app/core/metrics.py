@@ -0,0 +1,181 @@
+# metrics.py
+# Minimal Prometheus metrics (text exposition format 0.0.4): labelled
+# counters and histograms, plus collectors that turn the stats() of the
+# caches, router, LLM pool and limiter into gauges at scrape time.
+import bisect
+import os
+import threading
+
+# Seconds; covers cached tool calls (sub-ms) up to full chain verifications
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Label sets kept per metric; past this, new ones are counted under "other"
+# so a label fed from outside input cannot grow the scrape without bound
+MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "500"))
+OVERFLOW = "other"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), max_series=MAX_SERIES):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _bounded(self, key):
+        # Called with the lock held
+        if key in self._values or len(self._values) < self.max_series:
+            return key
+        return (OVERFLOW,) * len(key)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            key = self._bounded(key)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            key = self._bounded(key)
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = (("le", _number(float(bound))),)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """fn() -> [(name, kind, documentation, [(labels_dict, value), ...])],
+        called on every scrape. Usable as a decorator."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for fn in collectors:
+            for name, kind, documentation, samples in fn():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# -- auditor metrics ---------------------------------------------------------
+
+http_requests = registry.counter(
+    "auditor_http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+http_latency = registry.histogram(
+    "auditor_http_request_duration_seconds", "HTTP request latency (until the response starts)", ("method", "route"))
+agent_runs = registry.counter(
+    "auditor_agent_runs_total", "Agent runs by how they were answered (llm, routed, memo, error)", ("outcome",))
+agent_latency = registry.histogram(
+    "auditor_agent_run_duration_seconds", "End-to-end agent run latency", ("outcome",))
+llm_latency = registry.histogram(
+    "auditor_llm_request_duration_seconds", "LLM turn latency (full streamed response)", ("step",))
+llm_ttft = registry.histogram(
+    "auditor_llm_time_to_first_token_seconds", "Time to the first streamed chunk of an LLM turn", ("step",))
+llm_tokens = registry.counter(
+    "auditor_llm_tokens_total", "LLM tokens (from usage when reported, estimated otherwise)", ("kind",))
+llm_errors = registry.counter(
+    "auditor_llm_errors_total", "LLM turns that failed", ("error",))
+tool_latency = registry.histogram(
+    "auditor_tool_duration_seconds", "Tool call latency", ("tool",))
+tool_calls = registry.counter(
+    "auditor_tool_calls_total", "Tool calls by outcome (ok, error, timeout)", ("tool", "outcome"))
@@ -0,0 +1,160 @@
+# tracing.py
+# Request IDs and lightweight spans for agent runs.
+#
+# The request ID lives in a context variable: set once per HTTP request (or
+# job task), it is inherited by the asyncio tasks started under it and shows
+# up in the JSON logs. Spans follow the OpenTelemetry model (32 hex trace id,
+# 16 hex span id, parent, attributes, status) and the finished spans of the
+# last TRACE_MAX_REQUESTS requests are kept in memory (GET /traces/{id}).
+# When opentelemetry-api is installed every span is mirrored to it, so an
+# SDK/exporter configured by the deployment receives them too.
+import contextvars
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+TRACE_MAX_REQUESTS = int(os.getenv("TRACE_MAX_REQUESTS", "500"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+
+try:
+    from opentelemetry import trace as _otel
+    _otel_tracer = _otel.get_tracer("agentic-auditor") if os.getenv("TRACING_OTEL", "1") == "1" else None
+except ImportError:
+    _otel = None
+    _otel_tracer = None
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_HEX32 = re.compile(r"[0-9a-f]{32}")
+# Caller supplied IDs end up in logs and URLs: keep them short and plain
+_SAFE_ID = re.compile(r"[\w.:-]{1,128}")
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id=None):
+    """Bind a request ID to the current context (a new one if not given or
+    not a plain token)."""
+    if not request_id or not _SAFE_ID.fullmatch(request_id):
+        request_id = new_request_id()
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+class TraceStore:
+    """Finished spans of the most recent requests, by request ID."""
+
+    def __init__(self, max_requests=TRACE_MAX_REQUESTS, max_spans=TRACE_MAX_SPANS):
+        self.max_requests = max_requests
+        self.max_spans = max_spans
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, request_id, span):
+        with self._lock:
+            spans = self._traces.get(request_id)
+            if spans is None:
+                spans = self._traces[request_id] = []
+                while len(self._traces) > self.max_requests:
+                    self._traces.popitem(last=False)
+            if len(spans) < self.max_spans:
+                spans.append(span)
+
+    def get(self, request_id):
+        with self._lock:
+            spans = self._traces.get(request_id)
+            return sorted(spans, key=lambda s: s["start_ns"]) if spans is not None else None
+
+
+trace_store = TraceStore()
+
+
+class Span:
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.request_id = parent.request_id if parent else (get_request_id() or new_request_id())
+        if parent:
+            self.trace_id = parent.trace_id
+        else:
+            self.trace_id = self.request_id if _HEX32.fullmatch(self.request_id) else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration_s = None
+        self._otel = None
+        if _otel_tracer is not None:
+            context = _otel.set_span_in_context(parent._otel) if parent is not None and parent._otel else None
+            self._otel = _otel_tracer.start_span(name, context=context, attributes=_otel_attributes(attributes))
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error=None, **attributes):
+        if self.duration_s is not None:
+            return self.duration_s
+        self.duration_s = time.perf_counter() - self._start
+        self.attributes.update(attributes)
+        if error is not None:
+            self.status = "error"
+            self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        if self._otel is not None:
+            self._otel.set_attributes(_otel_attributes(self.attributes))
+            if self.error:
+                self._otel.set_status(_otel.Status(_otel.StatusCode.ERROR, self.error))
+            self._otel.end()
+        trace_store.add(self.request_id, self.to_dict())
+        return self.duration_s
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_s * 1000, 3) if self.duration_s is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=exc)
+        return False
+
+
+def start_span(name, parent=None, **attributes):
+    """Start a span; end it with span.end() or use it as a context manager."""
+    return Span(name, parent, **attributes)
+
+
+def _otel_attributes(attributes):
+    # OpenTelemetry only takes str/bool/int/float (or sequences of them)
+    return {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in attributes.items() if v is not None}
+
+
+def summarize_trace(spans):
+    """Where the time went: total per span kind (llm.turn, tool.*, ...)."""
+    totals = {}
+    for s in spans:
+        if s["duration_ms"] is None:
+            continue
+        kind = "tool" if s["name"].startswith("tool.") else s["name"]
+        totals[kind] = round(totals.get(kind, 0) + s["duration_ms"], 3)
+    return totals
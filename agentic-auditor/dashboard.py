@@ -1,33 +1,232 @@
+# dashboard.py
+# Read-only dashboard. Viewers never reach the backend: a background task
+# refreshes one in-memory snapshot every DASHBOARD_REFRESH_S (events and audit
+# reports fetched concurrently, aggregates computed once) and every page and
+# /api/dashboard response is served from it, with an ETag per snapshot.
+#
+# Aggregates (counts by type/model, suspicious-agent leaderboard) cover the
+# last DASHBOARD_EVENTS_LIMIT events. Chain status comes from the auditor's
+# checkpointed verifier, re-run every DASHBOARD_VERIFY_S (0 = read only).
+# Snapshot fetches and the verifier both talk to the backend at ERNEST_URL.
+import asyncio
+import hashlib
+import json
+import os
+import time
 
-from fastapi import FastAPI,Request
-from fastapi.templating import Jinja2Templates
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-import requests
+from fastapi.templating import Jinja2Templates
+
+from app.agent.anomaly import AnomalyDetector
+from app.agent.checkpoint import get_checkpoint_store
+from app.agent.hashchain import verify_chain_incremental
+from app.agent.http_client import ERNEST_URL
+from app.agent.summarize import item_agent, item_model, item_type
+from app.core.logger import get_logger
+
+REFRESH_INTERVAL = float(os.getenv("DASHBOARD_REFRESH_S", "10"))
+FETCH_TIMEOUT = float(os.getenv("DASHBOARD_TIMEOUT_S", "5"))
+EVENTS_LIMIT = int(os.getenv("DASHBOARD_EVENTS_LIMIT", "1000"))
+RECENT_EVENTS = int(os.getenv("DASHBOARD_RECENT_EVENTS", "50"))
+LEADERBOARD_SIZE = int(os.getenv("DASHBOARD_LEADERBOARD_SIZE", "10"))
+VERIFY_INTERVAL = float(os.getenv("DASHBOARD_VERIFY_S", "60"))
+
+logger = get_logger("dashboard")
 
 app=FastAPI()
 app.mount("/static",StaticFiles(directory="static"),name="static")
 templates=Jinja2Templates(directory="templates")
-ERNEST_URL="http://localhost:4000"
 
-def get_events():
-    try: return requests.get(f"{ERNEST_URL}/events?limit=50").json()
-    except: return []
 
-def get_reports():
-    try: return requests.get(f"{ERNEST_URL}/audit").json()
-    except: return []
+def _top(counter, n=None):
+    return dict(sorted(counter.items(), key=lambda kv: (-kv[1], str(kv[0])))[:n])
+
+
+def aggregate(events):
+    by_type, by_model, by_agent = {}, {}, {}
+    for e in events:
+        for counter, key in ((by_type, item_type(e)), (by_model, item_model(e)), (by_agent, item_agent(e))):
+            if key is not None:
+                counter[key] = counter.get(key, 0) + 1
+    return {"events": len(events), "by_type": _top(by_type), "by_model": _top(by_model),
+            "top_agents": _top(by_agent, LEADERBOARD_SIZE)}
+
+
+def leaderboard(events):
+    """Agents ranked by anomaly findings (severity first, then count)."""
+    detector = AnomalyDetector()
+    detector.ingest(events)
+    weight = {"high": 100, "medium": 10, "low": 1}
+    agents = {}
+    for f in detector.findings():
+        agent = f.get("agent")
+        if agent is None:
+            continue
+        entry = agents.setdefault(agent, {"agent": agent, "score": 0, "findings": []})
+        entry["score"] += weight[f["severity"]]
+        entry["findings"].append(f["kind"])
+    return sorted(agents.values(), key=lambda a: -a["score"])[:LEADERBOARD_SIZE]
+
+
+class Snapshot:
+    """The current dashboard data, pre-serialized per section."""
+
+    SECTIONS = ("counts", "leaderboard", "chain", "events", "reports")
+
+    def __init__(self):
+        self.data = {"counts": aggregate([]), "leaderboard": [], "chain": None, "events": [], "reports": []}
+        self.errors = {}
+        self.refreshed_at = None
+        self._bodies = {}
+        self._publish()
+
+    def update(self, **sections):
+        self.data.update(sections)
+        self.refreshed_at = time.time()
+        self._publish()
+
+    def _publish(self):
+        # Serialized once per refresh; viewers get the same bytes. The refresh
+        # time is left out of the body so an unchanged section keeps its ETag.
+        bodies = {}
+        meta = {"errors": self.errors}
+        for name in self.SECTIONS:
+            bodies[name] = json.dumps({name: self.data[name], **meta}, default=str).encode()
+        bodies[None] = json.dumps({**self.data, **meta}, default=str).encode()
+        self._bodies = {
+            name: (body, '"' + hashlib.sha1(body).hexdigest() + '"') for name, body in bodies.items()
+        }
+
+    def body(self, section=None):
+        return self._bodies[section]
+
+    @property
+    def etag(self):
+        return self._bodies[None][1]
+
+
+snapshot = Snapshot()
+_tasks = []
+
+
+async def _fetch(client, path, params=None):
+    r = await client.get(path, params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+async def refresh(client):
+    events, reports = await asyncio.gather(
+        _fetch(client, "/events", {"limit": EVENTS_LIMIT}),
+        _fetch(client, "/audit"),
+        return_exceptions=True,
+    )
+    sections = {}
+    for name, value in (("events", events), ("reports", reports)):
+        if isinstance(value, Exception):
+            # Keep serving the last good data, flagged as stale
+            snapshot.errors[name] = f"{type(value).__name__}: {value}"
+            logger.warning(f"[dashboard] {name} refresh failed: {value}")
+        else:
+            snapshot.errors.pop(name, None)
+            sections[name] = value if isinstance(value, list) else []
+    if "events" in sections:
+        events = sections["events"]
+        sections["counts"], sections["leaderboard"] = await asyncio.to_thread(
+            lambda: (aggregate(events), leaderboard(events)))
+        sections["events"] = events[:RECENT_EVENTS]
+    if VERIFY_INTERVAL <= 0:
+        # Not verifying here: show what the auditor last checkpointed
+        sections["chain"] = await asyncio.to_thread(lambda: get_checkpoint_store().load())
+    snapshot.update(**sections)
+
+
+async def _refresh_loop():
+    async with httpx.AsyncClient(base_url=ERNEST_URL, timeout=FETCH_TIMEOUT) as client:
+        while True:
+            try:
+                await refresh(client)
+            except Exception as e:
+                logger.error(f"[dashboard] refresh failed: {e}")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+
+async def _verify_loop():
+    while True:
+        try:
+            result = await asyncio.to_thread(verify_chain_incremental)
+            snapshot.errors.pop("chain", None)
+            snapshot.update(chain={**(result.get("checkpoint") or {}), "valid": result["valid"],
+                                   "mode": result["mode"], "error_count": result["error_count"]})
+        except Exception as e:
+            snapshot.errors["chain"] = f"{type(e).__name__}: {e}"
+            snapshot.update()
+            logger.warning(f"[dashboard] chain verification failed: {e}")
+        await asyncio.sleep(VERIFY_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_refresher():
+    _tasks.append(asyncio.create_task(_refresh_loop()))
+    if VERIFY_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(_verify_loop()))
+
+
+@app.on_event("shutdown")
+async def stop_refresher():
+    for task in _tasks:
+        task.cancel()
+
+
+def _not_modified(request, etag):
+    return etag in request.headers.get("if-none-match", "")
+
+
+def _headers(etag):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if snapshot.refreshed_at is not None:
+        headers["X-Refreshed-At"] = f"{snapshot.refreshed_at:.3f}"
+    return headers
+
+
+def _json(request, section=None):
+    body, etag = snapshot.body(section)
+    headers = _headers(etag)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _page(request, template, context):
+    etag = snapshot.etag
+    headers = _headers(etag)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return templates.TemplateResponse(request, template, context, headers=headers)
+
 
 @app.get("/")
 def index(request:Request):
-    return templates.TemplateResponse("index.html",{
-        "request":request,
-        "events":get_events(),
-        "reports":get_reports()
+    return _page(request, "index.html", {
+        "events": snapshot.data["events"],
+        "reports": snapshot.data["reports"],
+        "counts": snapshot.data["counts"],
+        "leaderboard": snapshot.data["leaderboard"],
+        "chain": snapshot.data["chain"],
     })
 
 @app.get("/events")
 def events(request:Request):
-    return templates.TemplateResponse("events.html",{
-        "request":request,
-        "events":get_events()
-    })
+    return _page(request, "events.html", {"events": snapshot.data["events"]})
+
+@app.get("/api/dashboard")
+def dashboard_data(request:Request):
+    return _json(request)
+
+@app.get("/api/dashboard/{section}")
+def dashboard_section(section:str, request:Request):
+    if section not in Snapshot.SECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown section; valid: {', '.join(Snapshot.SECTIONS)}")
+    return _json(request, section)
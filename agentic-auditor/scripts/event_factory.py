@@ -1,6 +1,7 @@
 
 #!/usr/bin/env python3
 import requests, random, uuid, time, sys
+import argparse, asyncio, hashlib, json, math
 
 ERNEST_URL = "http://localhost:3001"
 MODELS = ["llama3-8b","mixtral-8x7b","phi-3-mini","gpt-neo","falcon-7b"]
@@ -82,12 +83,219 @@ def generate(n=100):
         post_event(random_agent_action(random.choice(ids) if ids else None))
     print("Generated",n,"events.")
 
+# ---------------------------------------------------------------------------
+# Load generation: asyncio + pooled connections, open-loop (Poisson arrivals
+# at a target RPS) or closed-loop (N workers back to back), warmup phase and
+# a JSON report with latency percentiles, histogram, errors and throughput.
+#
+#   python event_factory.py load --rps 500 --duration 30 --warmup 5
+#   python event_factory.py load --mix inference=1 --concurrency 64 --rps 0
+# ---------------------------------------------------------------------------
+
+DEFAULT_MIX = "model_inference=3,agent_action=2,model_version=1"
+HIST_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+def sha256_hex(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def random_log_inference():
+    # LogInferenceDto for the NestJS ingest path (POST /api/inferences)
+    return {
+        "modelId": random.choice(MODELS),
+        "inferenceId": str(uuid.uuid4()),
+        "inputHash": sha256_hex(f"in {uuid.uuid4()}"),
+        "outputHash": sha256_hex(f"out {uuid.uuid4()}"),
+        "params": {"temperature": round(random.random(), 2)},
+        "metadata": {"latency_ms": random.randint(5, 500), "source": "event_factory"},
+    }
+
+def suspicious_event():
+    if random.random() < 0.5:
+        return {"type":"model_inference","model_id":"llama3-8b","input":"same-input","output":str(uuid.uuid4())}
+    return {"type":"agent_action","agent_id":"agent-suspicious-999","action_type":"x402_payment",
+            "metadata":{"cost":random.random()*3}}
+
+def weird_event():
+    return random.choice([
+        {"type":"agent_action","links":{}},
+        {"type":"model_inference","input":"x","output":"y"},
+        {"type":"agent_action","timestamp":time.time()+9999999,"links":{"model_ids":["llama3-8b"],"inference_ids":[]}},
+        {"type":"model_version","model_id":"ghost","version":"999"},
+    ])
+
+# kind -> (path option, payload builder)
+EVENT_KINDS = {
+    "model_version": ("events_path", random_model_event),
+    "model_inference": ("events_path", random_inference_event),
+    "agent_action": ("events_path", random_agent_action),
+    "suspicious": ("events_path", suspicious_event),
+    "weird": ("events_path", weird_event),
+    "inference": ("inference_path", random_log_inference),
+}
+
+def parse_mix(spec):
+    mix = {}
+    for part in filter(None, spec.split(",")):
+        kind, _, weight = part.partition("=")
+        if kind not in EVENT_KINDS:
+            raise SystemExit(f"Unknown event kind '{kind}' (known: {', '.join(EVENT_KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k); hi = min(lo + 1, len(sorted_values) - 1)
+    return round(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo), 2)
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []   # from intended start (includes queueing, open loop)
+        self.service = []     # from actual send to response
+        self.status = {}
+        self.errors = {}
+        self.by_kind = {}
+        self.dropped = 0
+
+    def record(self, kind, latency_ms, service_ms, status=None, error=None):
+        self.latencies.append(latency_ms)
+        self.service.append(service_ms)
+        k = self.by_kind.setdefault(kind, {"requests": 0, "errors": 0})
+        k["requests"] += 1
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            k["errors"] += 1
+        else:
+            self.status[str(status)] = self.status.get(str(status), 0) + 1
+            if status >= 400:
+                k["errors"] += 1
+
+    def report(self, elapsed, args):
+        lat = sorted(self.latencies)
+        svc = sorted(self.service)
+        n = len(lat)
+        failed = sum(self.errors.values()) + sum(c for s, c in self.status.items() if int(s) >= 400)
+        hist = {}
+        for edge in HIST_EDGES_MS + [math.inf]:
+            hist[f"<={edge}" if edge != math.inf else f">{HIST_EDGES_MS[-1]}"] = 0
+        for v in lat:
+            for edge in HIST_EDGES_MS:
+                if v <= edge:
+                    hist[f"<={edge}"] += 1
+                    break
+            else:
+                hist[f">{HIST_EDGES_MS[-1]}"] += 1
+        return {
+            "target_url": args.url,
+            "mode": "open" if args.rps > 0 else "closed",
+            "target_rps": args.rps or None,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "warmup_s": args.warmup,
+            "requests": n,
+            "achieved_rps": round(n / elapsed, 2) if elapsed else None,
+            "errors": failed,
+            "error_rate": round(failed / n, 4) if n else None,
+            "dropped": self.dropped,
+            "status": self.status,
+            "exceptions": self.errors,
+            "latency_ms": {
+                "p50": percentile(lat, 0.50), "p95": percentile(lat, 0.95), "p99": percentile(lat, 0.99),
+                "max": round(lat[-1], 2) if lat else None,
+                "mean": round(sum(lat) / n, 2) if n else None,
+            },
+            "service_ms": {"p50": percentile(svc, 0.50), "p95": percentile(svc, 0.95), "p99": percentile(svc, 0.99)},
+            "histogram_ms": hist,
+            "by_kind": self.by_kind,
+        }
+
+async def _send(client, args, kinds, weights, stats, intended, semaphore):
+    kind = random.choices(kinds, weights)[0]
+    path_option, builder = EVENT_KINDS[kind]
+    async with semaphore:
+        sent = time.perf_counter()
+        try:
+            r = await client.post(getattr(args, path_option), json=builder())
+            status, error = r.status_code, None
+        except Exception as e:
+            status, error = None, type(e).__name__
+        done = time.perf_counter()
+    if stats is not None:
+        stats.record(kind, (done - intended) * 1000, (done - sent) * 1000, status, error)
+
+async def _open_loop(client, args, kinds, weights, until, stats):
+    # Poisson arrivals at args.rps; a request is never delayed by a slow one
+    # (open loop), at most --max-inflight in flight, the rest are dropped.
+    semaphore = asyncio.Semaphore(args.max_inflight)
+    tasks = set()
+    next_at = time.perf_counter()
+    while next_at < until:
+        now = time.perf_counter()
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+        if len(tasks) >= args.max_inflight:
+            if stats is not None:
+                stats.dropped += 1
+        else:
+            t = asyncio.create_task(_send(client, args, kinds, weights, stats, next_at, semaphore))
+            tasks.add(t)
+            t.add_done_callback(tasks.discard)
+        next_at += random.expovariate(args.rps)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def _closed_loop(client, args, kinds, weights, until, stats):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    async def worker():
+        while time.perf_counter() < until:
+            await _send(client, args, kinds, weights, stats, time.perf_counter(), semaphore)
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+
+async def run_load(args):
+    import httpx
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        phase = _open_loop if args.rps > 0 else _closed_loop
+        if args.warmup > 0:
+            await phase(client, args, kinds, weights, time.perf_counter() + args.warmup, None)
+        stats = LoadStats()
+        start = time.perf_counter()
+        await phase(client, args, kinds, weights, start + args.duration, stats)
+        elapsed = time.perf_counter() - start
+    return stats.report(elapsed, args)
+
+def load(argv):
+    parser = argparse.ArgumentParser(prog="event_factory.py load", description="Load-test the ingest endpoints")
+    parser.add_argument("--url", default=ERNEST_URL)
+    parser.add_argument("--rps", type=float, default=200, help="target arrivals/s (open loop); 0 = closed loop")
+    parser.add_argument("--concurrency", type=int, default=64, help="connections (and workers in closed loop)")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="open loop: requests in flight before dropping")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"kind=weight list, kinds: {', '.join(EVENT_KINDS)}")
+    parser.add_argument("--events-path", default="/events")
+    parser.add_argument("--inference-path", default="/api/inferences")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
 if __name__=="__main__":
     if len(sys.argv)<2:
-        print("Commands: generate N | weird | suspicious N | stress N")
+        print("Commands: generate N | weird | suspicious N | stress N | load [--help]")
         sys.exit(1)
     cmd=sys.argv[1]
     if cmd=="generate": generate(int(sys.argv[2]) if len(sys.argv)>2 else 100)
     elif cmd=="weird": inject_weird_cases()
     elif cmd=="suspicious": generate_suspicious_agent(int(sys.argv[2]) if len(sys.argv)>2 else 20)
     elif cmd=="stress": stress(int(sys.argv[2]) if len(sys.argv)>2 else 1000)
+    elif cmd=="load": load(sys.argv[2:])
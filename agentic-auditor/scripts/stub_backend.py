@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Minimal ingest stub for load-testing event_factory.py without the NestJS
+# backend: accepts POST /events, /api/inferences and /api/models, GET /health
+# and /stats (request counts). Accepted bodies are served back, in order, by
+# GET /api/events?skip=&limit= (as the event subscription reads them).
+#
+#   python scripts/stub_backend.py --port 3001 --delay 0.005 --fail-rate 0.01
+#   python scripts/event_factory.py load --url http://localhost:3001 --rps 500 --duration 20
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INGEST_PATHS = ("/events", "/api/inferences", "/api/models")
+# Event type recorded for bodies that do not carry one
+DEFAULT_TYPES = {"/api/inferences": "model_inference", "/api/models": "model_version"}
+
+args = None
+counts = {}
+counts_lock = threading.Lock()
+events = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, *a):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/health"):
+            return self._json(200, {"status": "ok"})
+        if self.path.startswith("/stats"):
+            with counts_lock:
+                return self._json(200, {**counts, "events_stored": len(events)})
+        url = urlparse(self.path)
+        if url.path.rstrip("/") == "/api/events":
+            query = parse_qs(url.query)
+            skip = int(query.get("skip", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            with counts_lock:
+                page = events[skip:skip + limit]
+            return self._json(200, page)
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0].rstrip("/")
+        if path not in INGEST_PATHS:
+            return self._json(404, {"error": "not found"})
+        time.sleep(max(0.0, random.gauss(args.delay, args.jitter)))
+        with counts_lock:
+            counts[path] = counts.get(path, 0) + 1
+        if random.random() < args.fail_rate:
+            return self._json(503, {"error": "stub overloaded"})
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            return self._json(400, {"error": "invalid JSON"})
+        if not isinstance(body, dict):
+            return self._json(400, {"error": "expected a JSON object"})
+        body.setdefault("type", DEFAULT_TYPES.get(path))
+        body.setdefault("timestamp", int(time.time() * 1000))
+        with counts_lock:
+            # Positions must stay stable for skip: past --keep, stop storing
+            if len(events) < args.keep:
+                events.append(body)
+            else:
+                counts["events_not_stored"] = counts.get("events_not_stored", 0) + 1
+        self._json(201, {"ok": True, "id": body.get("inferenceId") or body.get("modelId") or counts[path]})
+
+
+def main():
+    global args
+    parser = argparse.ArgumentParser(description="Ingest stub for event_factory load tests")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--delay", type=float, default=0.0, help="mean seconds before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="std dev of the delay")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--keep", type=int, default=1_000_000, help="events kept for GET /api/events")
+    args = parser.parse_args()
+    print(f"Ingest stub on :{args.port}")
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Minimal OpenAI-compatible LLM stub for testing the LLM pool without a GPU:
+#   /v1/chat/completions (stream and non-stream), /v1/completions (prompt
+#   lists, like vLLM), /v1/models
+#
+#   python scripts/stub_llm.py --port 11500 --delay 0.5 --fail-rate 0.1
+#   LLM_ENDPOINTS="http://localhost:11500/v1|stub|4|batch,http://localhost:11501/v1|stub|4" ./run.sh
+#
+# With --tools the first turn of every chat calls the healthcheck tool, the
+# next one answers, so the whole agent loop can be exercised.
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+args = None
+
+
+def chunk(delta, finish=None):
+    return {
+        "id": "stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *a):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(args.delay)
+        if random.random() < args.fail_rate:
+            return self._json(503, {"error": {"message": "stub overloaded"}})
+
+        if self.path.endswith("/chat/completions"):
+            return self._chat(body)
+        if self.path.endswith("/completions"):
+            prompts = body.get("prompt")
+            prompts = prompts if isinstance(prompts, list) else [prompts]
+            return self._json(200, {
+                "id": "stub",
+                "object": "text_completion",
+                "model": "stub",
+                "choices": [
+                    {"index": i, "text": f"[{args.name}] summary of: {str(p)[:60]}", "finish_reason": "stop"}
+                    for i, p in enumerate(prompts)
+                ],
+            })
+        self._json(404, {"error": "not found"})
+
+    def _chat(self, body):
+        messages = body.get("messages", [])
+        use_tool = args.tools and body.get("tools") and not any(m.get("role") == "tool" for m in messages)
+        if use_tool:
+            deltas = [{"role": "assistant", "tool_calls": [{
+                "index": 0, "id": "call_0", "type": "function",
+                "function": {"name": "healthcheck", "arguments": "{}"},
+            }]}]
+            finish = "tool_calls"
+        else:
+            question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+            text = f"[{args.name}] answer to: {question}"
+            deltas = [{"role": "assistant", "content": w + " "} for w in text.split()]
+            finish = "stop"
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": None}
+            for d in deltas:
+                if "content" in d:
+                    message["content"] = (message["content"] or "") + d["content"]
+                if "tool_calls" in d:
+                    message["tool_calls"] = [{k: v for k, v in tc.items() if k != "index"} for tc in d["tool_calls"]]
+            return self._json(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for d in deltas:
+            self.wfile.write(f"data: {json.dumps(chunk(d))}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(args.token_delay)
+        self.wfile.write(f"data: {json.dumps(chunk({}, finish))}\n\ndata: [DONE]\n\n".encode())
+        self.close_connection = True
+
+
+def main():
+    global args
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--name", default="stub")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds before answering")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--tools", action="store_true", help="call healthcheck on the first turn")
+    args = parser.parse_args()
+    print(f"LLM stub '{args.name}' on :{args.port}")
+    ThreadingHTTPServer(("0.0.0.0", args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# conftest.py
+# Benchmark harness for the auditor stack.
+#
+#   cd agentic-auditor && python -m pytest tests/benchmarks -q -m bench
+#
+# (or BENCH=1; the default run deselects benchmarks, see tests/conftest.py)
+#
+# Every benchmark records its metrics through the `bench` fixture; at the end
+# of the session they are written to BENCH_RESULTS (default
+# tests/benchmarks/results/latest.json) together with the environment.
+#
+# Regression gates:
+#   - thresholds.json: absolute limits per metric ("max" or "min"), scaled by
+#     BENCH_THRESHOLD_SCALE for slower machines (2 = twice as lenient)
+#   - BENCH_BASELINE=path/to/previous.json: fail when a gated metric (the
+#     median, for latencies) is more than BENCH_MAX_REGRESSION (default
+#     0.25 = 25%) worse than in the baseline results
+#
+# BENCH_LARGE=1 adds the 1M block chain (built once into BENCH_CACHE_DIR).
+# The mock servers and the app's environment come from tests/conftest.py.
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+HERE = os.path.dirname(__file__)
+RESULTS_PATH = os.getenv("BENCH_RESULTS", os.path.join(HERE, "results", "latest.json"))
+THRESHOLDS_PATH = os.getenv("BENCH_THRESHOLDS", os.path.join(HERE, "thresholds.json"))
+BASELINE_PATH = os.getenv("BENCH_BASELINE")
+THRESHOLD_SCALE = float(os.getenv("BENCH_THRESHOLD_SCALE", "1"))
+MAX_REGRESSION = float(os.getenv("BENCH_MAX_REGRESSION", "0.25"))
+BENCH_LARGE = os.getenv("BENCH_LARGE", "0") == "1"
+CACHE_DIR = os.getenv("BENCH_CACHE_DIR", os.path.join(HERE, ".cache"))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_stats(samples_s):
+    ms = sorted(s * 1000 for s in samples_s)
+    return {
+        "rounds": len(ms),
+        "min_ms": round(ms[0], 4),
+        "p50_ms": round(percentile(ms, 0.50), 4),
+        "p95_ms": round(percentile(ms, 0.95), 4),
+        "p99_ms": round(percentile(ms, 0.99), 4),
+        "max_ms": round(ms[-1], 4),
+        "mean_ms": round(sum(ms) / len(ms), 4),
+    }
+
+
+def _load_json(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+class Bench:
+    """Collects benchmark metrics and enforces the regression gates."""
+
+    def __init__(self):
+        self.results = {}
+        self.thresholds = _load_json(THRESHOLDS_PATH)
+        self.baseline = _load_json(BASELINE_PATH).get("benchmarks", {})
+
+    def measure(self, name, fn, rounds=100, warmup=5, setup=None, **extra):
+        """Time fn() over `rounds` calls (after `warmup` untimed ones); setup()
+        runs before each call, outside the timed region."""
+        for _ in range(warmup):
+            if setup:
+                setup()
+            fn()
+        samples = []
+        for _ in range(rounds):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return self.record(name, **latency_stats(samples), **extra)
+
+    def record(self, name, **metrics):
+        self.results[name] = metrics
+        failures = self._check(name, metrics)
+        assert not failures, f"{name}: " + "; ".join(failures)
+        return metrics
+
+    def _check(self, name, metrics):
+        failures = []
+        for metric, limit in self.thresholds.get(name, {}).items():
+            value = metrics.get(metric)
+            if value is None:
+                continue
+            if "max" in limit and value > limit["max"] * THRESHOLD_SCALE:
+                failures.append(f"{metric}={value} above threshold {limit['max'] * THRESHOLD_SCALE}")
+            if "min" in limit and value < limit["min"] / THRESHOLD_SCALE:
+                failures.append(f"{metric}={value} below threshold {limit['min'] / THRESHOLD_SCALE}")
+
+            # Run to run, tail latencies of sub-millisecond calls are noise:
+            # compare latencies against the baseline on the median
+            compared = "p50_ms" if metric.endswith("_ms") and "p50_ms" in metrics else metric
+            value = metrics[compared]
+            previous = self.baseline.get(name, {}).get(compared)
+            if not previous:
+                continue
+            if "max" in limit and value > previous * (1 + MAX_REGRESSION):
+                failures.append(f"{compared}={value} regressed from baseline {previous}")
+            if "min" in limit and value < previous * (1 - MAX_REGRESSION):
+                failures.append(f"{compared}={value} regressed from baseline {previous}")
+        return failures
+
+    def environment(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": commit,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "threshold_scale": THRESHOLD_SCALE,
+            "baseline": BASELINE_PATH,
+        }
+
+    def write(self, path=RESULTS_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"environment": self.environment(), "benchmarks": self.results}, f, indent=2, sort_keys=True)
+
+
+_bench = Bench()
+
+
+@pytest.fixture(autouse=True)
+def app_logging_only():
+    """pytest's log capture hangs its handlers on the root logger, adding its
+    own work to every log line the measured code emits: while a benchmark
+    runs, the app's loggers stop propagating to root."""
+    detached = [logger for logger in logging.Logger.manager.loggerDict.values()
+                if isinstance(logger, logging.Logger) and logger.handlers and logger.propagate]
+    for logger in detached:
+        logger.propagate = False
+    yield
+    for logger in detached:
+        logger.propagate = True
+
+
+@pytest.fixture(scope="session")
+def bench():
+    yield _bench
+    if _bench.results:
+        _bench.write()
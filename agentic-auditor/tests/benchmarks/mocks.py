@@ -0,0 +1,194 @@
+# mocks.py
+# In-process stand-ins for the Ernest backend and the LLM, plus synthetic
+# hash chains, so the benchmarks run without Docker, a GPU or the network.
+import importlib.util
+import json
+import os
+import pickle
+import threading
+from argparse import Namespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from app.agent.hashchain import calculate_block_hash
+
+MODELS = ["llama3-8b", "mistral-7b", "phi-3", "qwen2-7b", "gemma-2b"]
+GENESIS_TS = 1_700_000_000_000
+
+_SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "..", "scripts")
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def make_block(index, previous_hash):
+    block = {
+        "index": index,
+        "timestamp": GENESIS_TS + index * 1000,
+        "data": {
+            "type": "model_inference",
+            "modelId": MODELS[index % len(MODELS)],
+            "inferenceId": f"inf-{index}",
+            "inputHash": f"{index:064x}",
+            "metadata": {"latency_ms": 20 + index % 80, "tokens": index % 512},
+        },
+        "previousHash": previous_hash,
+    }
+    block["hash"] = calculate_block_hash(block)
+    return block
+
+
+def iter_chain_pages(n, page_size=5000):
+    """A valid chain of n blocks, page_size blocks at a time (deterministic)."""
+    previous = ""
+    page = []
+    for index in range(n):
+        block = make_block(index, previous)
+        previous = block["hash"]
+        page.append(block)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def make_chain(n):
+    return [b for page in iter_chain_pages(n) for b in page]
+
+
+def cached_chain_pages(n, cache_dir, page_size=5000):
+    """Like iter_chain_pages, but built once and replayed from a pickle file:
+    a 1M block chain takes over a minute to hash and does not fit comfortably
+    in memory as dicts."""
+    path = os.path.join(cache_dir, f"chain-{n}-{page_size}.pickle")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            for page in iter_chain_pages(n, page_size):
+                pickle.dump(page, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def pages():
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+    return pages
+
+
+def make_events(n):
+    events = []
+    for i in range(n):
+        if i % 3 == 2:
+            events.append({
+                "type": "agent_action",
+                "agentId": f"agent-{i % 40}",
+                "actionType": "x402_payment",
+                "timestamp": GENESIS_TS + i * 500,
+                "metadata": {"cost": round(0.01 + (i % 17) / 100, 3)},
+            })
+        else:
+            events.append({
+                "type": "model_inference",
+                "modelId": MODELS[i % len(MODELS)],
+                "inferenceId": f"inf-{i}",
+                "timestamp": GENESIS_TS + i * 500,
+                "metadata": {"latency_ms": 20 + i % 80},
+            })
+    return events
+
+
+# ---------------------------------------------------------------------------
+# Servers
+# ---------------------------------------------------------------------------
+
+class _Server:
+    def __init__(self, handler, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread = None
+        self.httpd.server_close()
+
+
+class MockErnest(_Server):
+    """Read-only subset of the NestJS API the auditor tools use."""
+
+    def __init__(self, blocks=2000, events=5000, port=0):
+        self.blocks = make_chain(blocks)
+        self.events = make_events(events)
+        self.models = [
+            {"modelId": m, "modelName": m, "version": "1.0", "timestamp": GENESIS_TS + i}
+            for i, m in enumerate(MODELS)
+        ]
+        super().__init__(self._handler(), port)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *a):
+                pass
+
+            def _json(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(url.query).items()}
+                parts = url.path.strip("/").split("/")
+                if url.path == "/health":
+                    return self._json({"status": "ok"})
+                if parts[:2] == ["api", "blocks"]:
+                    if len(parts) == 3:
+                        i = int(parts[2])
+                        if 0 <= i < len(mock.blocks):
+                            return self._json(mock.blocks[i])
+                        return self._json({"error": "Block not found"})
+                    start = int(q.get("from", 0))
+                    return self._json(mock.blocks[start:start + int(q.get("limit", 100))])
+                if url.path in ("/api/events", "/api/models"):
+                    items = mock.events if url.path == "/api/events" else mock.models
+                    skip = int(q.get("skip", 0))
+                    return self._json(items[skip:skip + int(q.get("limit", 100))])
+                if parts[:2] == ["api", "provenances"] and len(parts) == 3:
+                    return self._json([e for e in mock.events[:500] if e.get("modelId") == parts[2]])
+                self._json({"error": "not found"}, 404)
+
+        return Handler
+
+
+class MockLLM(_Server):
+    """scripts/stub_llm.py served in-process: the first chat turn calls the
+    healthcheck tool, the second one answers."""
+
+    def __init__(self, delay=0.0, token_delay=0.0, port=0):
+        spec = importlib.util.spec_from_file_location("stub_llm", os.path.join(_SCRIPTS, "stub_llm.py"))
+        stub = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(stub)
+        stub.args = Namespace(name="bench", delay=delay, token_delay=token_delay, fail_rate=0.0, tools=True)
+        super().__init__(stub.Handler, port)
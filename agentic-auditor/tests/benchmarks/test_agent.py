@@ -0,0 +1,31 @@
+# test_agent.py
+# run_agent end to end against the stub LLM: one turn that calls the
+# healthcheck tool, the tool against the mock backend, and the answer turn.
+import asyncio
+
+from app.agent.run_agent import run_agent, run_agent_async
+
+QUESTION = "Is the backend healthy, and is anything unusual going on?"
+
+
+def test_run_agent_sync(bench, ernest, llm):
+    # New event loop per call: includes creating the per-loop HTTP clients
+    def call():
+        result = run_agent(QUESTION)
+        assert "error" not in result, result
+
+    bench.measure("agent.run_agent", call, rounds=20, warmup=2)
+
+
+def test_run_agent_async(bench, ernest, llm):
+    # Steady state: one loop, connections reused across runs
+    loop = asyncio.new_event_loop()
+
+    def call():
+        result = loop.run_until_complete(run_agent_async(QUESTION))
+        assert "error" not in result, result
+
+    try:
+        bench.measure("agent.run_agent_async", call, rounds=30, warmup=2)
+    finally:
+        loop.close()
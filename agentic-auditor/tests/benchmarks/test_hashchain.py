@@ -0,0 +1,49 @@
+# test_hashchain.py
+# Hash chain verification throughput on synthetic chains. 10k blocks always;
+# 1M with BENCH_LARGE=1 (built once, replayed from BENCH_CACHE_DIR).
+import time
+
+import pytest
+
+from app.agent.hashchain import VERIFY_WORKERS, calculate_block_hash, verify_blocks
+from tests.benchmarks.conftest import BENCH_LARGE, CACHE_DIR
+from tests.benchmarks.mocks import cached_chain_pages, iter_chain_pages, make_block
+
+WORKERS = sorted({1, VERIFY_WORKERS})
+
+
+@pytest.fixture(scope="module")
+def chain_10k():
+    return list(iter_chain_pages(10_000, page_size=2_000))
+
+
+def _throughput(bench, name, pages, workers):
+    start = time.perf_counter()
+    result = verify_blocks(pages, workers=workers)
+    elapsed = time.perf_counter() - start
+    assert result["valid"], result["errors"][:3]
+    return bench.record(
+        name,
+        blocks=result["blocks_checked"],
+        workers=workers,
+        seconds=round(elapsed, 4),
+        blocks_per_s=round(result["blocks_checked"] / elapsed, 1),
+    )
+
+
+def test_block_hash(bench):
+    block = make_block(42, "ab" * 32)
+    bench.measure("hashchain.calculate_block_hash", lambda: calculate_block_hash(block), rounds=2000, warmup=50)
+
+
+@pytest.mark.parametrize("workers", WORKERS)
+def test_verify_10k(bench, chain_10k, workers):
+    _throughput(bench, f"hashchain.verify_10k.w{workers}", chain_10k, workers)
+
+
+@pytest.mark.skipif(not BENCH_LARGE, reason="set BENCH_LARGE=1 for the 1M block chain")
+@pytest.mark.parametrize("workers", WORKERS)
+def test_verify_1m(bench, workers):
+    pages = cached_chain_pages(1_000_000, CACHE_DIR)
+    # Includes unpickling the pages from disk, as the backend would stream them
+    _throughput(bench, f"hashchain.verify_1m.w{workers}", pages(), workers)
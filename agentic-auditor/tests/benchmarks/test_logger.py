@@ -0,0 +1,83 @@
+# test_logger.py
+# Cost of a log line: JsonFormatter / ColorFormatter alone, a full
+# logger.info() through a synchronous handler and through the queue handler
+# the app uses (writer thread running), against a disabled logger.
+import logging
+import os
+import queue
+
+import pytest
+
+from app.core.logger import BatchWriter, ColorFormatter, JsonFormatter, QueueHandler
+
+
+def _record():
+    return logging.LogRecord(
+        "bench", logging.INFO, __file__, 1, "[tools] %s took %.1f ms", ("get_block", 12.5), None, func="bench",
+    )
+
+
+@pytest.fixture
+def devnull_logger():
+    logger = logging.getLogger("bench.logger")
+    logger.propagate = False
+    stream = open(os.devnull, "w")
+    handler = logging.StreamHandler(stream)
+    logger.handlers = [handler]
+    yield logger, handler
+    logger.handlers = []
+    stream.close()
+
+
+def test_json_formatter(bench):
+    formatter, record = JsonFormatter(), _record()
+    bench.measure("logger.json_format", lambda: formatter.format(record), rounds=5000, warmup=100)
+
+
+def test_color_formatter(bench):
+    formatter, record = ColorFormatter(), _record()
+    bench.measure("logger.color_format", lambda: formatter.format(record), rounds=5000, warmup=100)
+
+
+def test_logger_overhead(bench, devnull_logger):
+    logger, handler = devnull_logger
+    handler.setFormatter(JsonFormatter())
+
+    def emit():
+        logger.info("[tools] %s took %.1f ms", "get_block", 12.5)
+
+    logger.setLevel(logging.WARNING)
+    disabled = bench.measure("logger.disabled", emit, rounds=5000, warmup=100)
+    logger.setLevel(logging.INFO)
+    enabled = bench.measure("logger.json_emit", emit, rounds=5000, warmup=100)
+    bench.record(
+        "logger.json_overhead",
+        per_call_us=round((enabled["mean_ms"] - disabled["mean_ms"]) * 1000, 3),
+        ratio=round(enabled["mean_ms"] / disabled["mean_ms"], 1),
+    )
+
+
+def test_queue_logger(bench):
+    logger = logging.getLogger("bench.queue")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    log_queue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    stream = open(os.devnull, "w")
+    writer = BatchWriter(log_queue, stream, JsonFormatter())
+    writer.handler = handler
+    writer.start()
+    logger.handlers = [handler]
+    try:
+        # Time seen by the caller, with the writer thread draining meanwhile
+        bench.measure(
+            "logger.queue_emit",
+            lambda: logger.info("[tools] %s took %.1f ms", "get_block", 12.5),
+            rounds=20000,
+            warmup=100,
+        )
+    finally:
+        writer.stop()
+        logger.handlers = []
+        stream.close()
+    assert handler.dropped == 0
@@ -0,0 +1,55 @@
+# test_tools.py
+# Tool latency against the mock Ernest backend: cold (cache cleared before
+# every call, i.e. backend round-trips) and warm (served from the tool cache).
+import asyncio
+
+import pytest
+
+from app.agent.cache import tool_cache
+from app.agent.checkpoint import get_checkpoint_store
+from app.agent.tools import ASYNC_TOOLS_MAP, TOOLS_MAP
+
+CALLS = {
+    "healthcheck": {},
+    "get_block": {"block_id": 1234},
+    "list_models": {},
+    "list_events": {},
+    "provenance_by_model": {"model_id": "llama3-8b"},
+}
+CACHED = {"get_block", "list_models", "list_events", "provenance_by_model"}
+
+
+@pytest.mark.parametrize("tool", list(CALLS))
+def test_tool_cold(bench, ernest, tool):
+    fn, args = TOOLS_MAP[tool], CALLS[tool]
+    bench.measure(f"tools.{tool}.cold", lambda: fn(**args), rounds=50, setup=tool_cache.invalidate)
+
+
+@pytest.mark.parametrize("tool", sorted(CACHED))
+def test_tool_warm(bench, ernest, tool):
+    fn, args = TOOLS_MAP[tool], CALLS[tool]
+    fn(**args)
+    bench.measure(f"tools.{tool}.warm", lambda: fn(**args), rounds=200)
+
+
+def test_tool_async_get_block(bench, ernest):
+    loop = asyncio.new_event_loop()
+    try:
+        fn = ASYNC_TOOLS_MAP["get_block"]
+        bench.measure(
+            "tools.get_block_async.cold",
+            lambda: loop.run_until_complete(fn(block_id=1234)),
+            rounds=50,
+            setup=tool_cache.invalidate,
+        )
+    finally:
+        loop.close()
+
+
+def test_verify_chain(bench, ernest):
+    store = get_checkpoint_store()
+    bench.measure("tools.verify_chain.full", lambda: TOOLS_MAP["verify_chain"](full=True), rounds=5, warmup=1,
+                  blocks=len(ernest.blocks))
+    # Checkpoint at the tip: only the resume link is fetched and checked
+    assert store.load()["last_index"] == len(ernest.blocks) - 1
+    bench.measure("tools.verify_chain.incremental", lambda: TOOLS_MAP["verify_chain"](), rounds=20)
@@ -0,0 +1,73 @@
+# conftest.py
+# Shared test setup for the auditor.
+#
+#   cd agentic-auditor && python -m pytest tests -q
+#
+# Benchmarks (tests/benchmarks, marked `bench`) are deselected by default:
+# run them with `-m bench` or BENCH=1.
+#
+# The app reads its configuration at import time: point it at the mock
+# servers (tests/benchmarks/mocks.py) and at scratch databases before anything
+# under app/ is imported. Unit tests live next to this file (test_<module>.py),
+# benchmarks under benchmarks/.
+import os
+import socket
+import tempfile
+
+import pytest
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+ERNEST_PORT = _free_port()
+LLM_PORT = _free_port()
+SCRATCH_DIR = tempfile.mkdtemp(prefix="auditor-tests-")
+os.environ["ERNEST_URL"] = f"http://127.0.0.1:{ERNEST_PORT}"
+os.environ["LLM_ENDPOINTS"] = f"http://127.0.0.1:{LLM_PORT}/v1|bench|8"
+os.environ["AUDITOR_CHECKPOINT_DB"] = os.path.join(SCRATCH_DIR, "auditor.sqlite")
+os.environ["EVENT_STORE_PATH"] = os.path.join(SCRATCH_DIR, "events.duckdb")
+# Measure the full agent loop, not the shortcuts in front of it
+os.environ.setdefault("AGENT_ROUTER", "0")
+os.environ.setdefault("AGENT_MEMO", "0")
+
+from tests.benchmarks.mocks import MockErnest, MockLLM  # noqa: E402
+
+BENCH_DIR = os.path.join(os.path.dirname(__file__), "benchmarks")
+BENCH = os.getenv("BENCH", "0") == "1"
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "bench: benchmark with regression gates (opt-in: -m bench or BENCH=1)")
+
+
+def pytest_collection_modifyitems(config, items):
+    selected, deselected = [], []
+    for item in items:
+        if str(item.path).startswith(BENCH_DIR + os.sep):
+            item.add_marker(pytest.mark.bench)
+            # An explicit -m decides; otherwise benchmarks only run with BENCH=1
+            if not BENCH and not config.option.markexpr:
+                deselected.append(item)
+                continue
+        selected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+@pytest.fixture(scope="session")
+def ernest():
+    server = MockErnest(port=ERNEST_PORT).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def llm():
+    server = MockLLM(port=LLM_PORT).start()
+    yield server
+    server.stop()
@@ -0,0 +1,187 @@
+# test_anomaly.py
+# AnomalyDetector over event_factory-shaped batches: quiet traffic gives no
+# findings, each rule fires on the case it is meant for, payment bursts carry
+# across ingest calls, reset clears the state.
+import pytest
+
+from app.agent.anomaly import AnomalyDetector
+
+NOW = 1_700_000_000.0
+MODELS = ["llama3-8b", "mixtral-8x7b", "phi-3-mini", "gpt-neo", "falcon-7b"]
+AGENTS = ["agent-1", "agent-2", "agent-3", "agent-4", "agent-demo"]
+
+
+def model_version(model, metadata=True):
+    event = {"type": "model_version", "model_id": model, "version": "1", "timestamp": NOW - 7200}
+    if metadata:
+        event["metadata"] = {"params": 7_000_000_000, "description": f"{model} weights"}
+    return event
+
+
+def inference(model, i, input=None, output=None, ts=None):
+    return {
+        "type": "model_inference",
+        "model_id": model,
+        "input": input if input is not None else f"input {model} {i}",
+        "output": output if output is not None else f"output {model} {i}",
+        "timestamp": NOW - 3600 + i if ts is None else ts,
+        "latency_ms": 5 + (i * 37) % 495,
+    }
+
+
+def action(agent, ts, payment=True, cost=0.003, links=None):
+    return {
+        "type": "agent_action",
+        "agent_id": agent,
+        "action_type": "x402_payment" if payment else "access_api",
+        "links": links if links is not None else {"inference_ids": [], "model_ids": [MODELS[0]]},
+        "metadata": {"decision": "ok", "cost": cost},
+        "timestamp": ts,
+    }
+
+
+def normal_traffic():
+    """Registered models with unique inputs/outputs, agents paying every 30 s."""
+    events = [model_version(m) for m in MODELS]
+    for i in range(200):
+        events.append(inference(MODELS[i % len(MODELS)], i))
+    for n, agent in enumerate(AGENTS):
+        for k in range(40):
+            events.append(action(agent, NOW - 3600 + 30 * k + n, payment=k % 2 == 0,
+                                 cost=0.002 + 0.0005 * n))
+    return events
+
+
+def _kinds(detector):
+    return sorted({f["kind"] for f in detector.findings()})
+
+
+def _find(detector, kind, **fields):
+    return [f for f in detector.findings()
+            if f["kind"] == kind and all(f.get(k) == v for k, v in fields.items())]
+
+
+@pytest.fixture
+def detector():
+    d = AnomalyDetector()
+    d.ingest(normal_traffic(), now=NOW)
+    return d
+
+
+def test_normal_traffic_has_no_findings(detector):
+    assert detector.findings() == []
+    summary = detector.summary()
+    assert summary["events_seen"] == 5 + 200 + 40 * len(AGENTS)
+    assert summary["agents"] == len(AGENTS) and summary["models"] == len(MODELS)
+    assert summary["finding_counts"] == {}
+
+
+def test_payment_burst(detector):
+    minute = (NOW - 600) // 60 * 60
+    detector.ingest([action("agent-susp", minute + s) for s in range(30)], now=NOW)
+    [burst] = _find(detector, "payment_burst")
+    assert burst["agent"] == "agent-susp"
+    assert burst["max_payments_per_min"] == 30
+
+
+def test_payment_burst_spans_two_batches():
+    d = AnomalyDetector()
+    d.ingest([model_version(m) for m in MODELS], now=NOW)
+    minute = (NOW - 600) // 60 * 60
+    d.ingest([action("agent-susp", minute + s) for s in range(6)], now=NOW)
+    assert _find(d, "payment_burst") == []
+    d.ingest([action("agent-susp", minute + 30 + s) for s in range(6)], now=NOW)
+    [burst] = _find(d, "payment_burst")
+    assert burst["max_payments_per_min"] == 12
+    # The next minute starts a new window
+    d.ingest([action("agent-susp", minute + 60 + s) for s in range(3)], now=NOW)
+    assert _find(d, "payment_burst")[0]["max_payments_per_min"] == 12
+
+
+def test_spread_out_payments_are_not_a_burst():
+    d = AnomalyDetector()
+    d.ingest([action("agent-1", NOW - 3600 + 10 * s) for s in range(60)], now=NOW)
+    assert _find(d, "payment_burst") == []
+
+
+def test_high_cost(detector):
+    detector.ingest([action("agent-pricey", NOW - 300 + 20 * k, cost=2.5) for k in range(3)], now=NOW)
+    [finding] = _find(detector, "high_cost")
+    assert finding["agent"] == "agent-pricey"
+    assert finding["mean_cost"] == 2.5 and finding["payments"] == 3
+
+
+def test_cost_outlier_against_the_fleet(detector):
+    # Well under COST_PER_PAYMENT_MAX, but 100x what every other agent pays
+    detector.ingest([action("agent-pricey", NOW - 300 + 20 * k, cost=0.3) for k in range(3)], now=NOW)
+    assert [f["agent"] for f in _find(detector, "high_cost")] == ["agent-pricey"]
+
+
+def test_repeated_input_varying_output(detector):
+    detector.ingest([inference("llama3-8b", 1000 + i, input="same-input", output=f"answer {i}")
+                     for i in range(12)], now=NOW)
+    [finding] = _find(detector, "repeated_input_varying_output")
+    assert finding["model"] == "llama3-8b"
+    assert finding["repeats"] == 12 and finding["distinct_outputs"] == 12
+
+
+def test_repeated_input_with_the_same_output_is_fine(detector):
+    detector.ingest([inference("llama3-8b", 1000 + i, input="same-input", output="same-output")
+                     for i in range(12)], now=NOW)
+    assert _find(detector, "repeated_input_varying_output") == []
+
+
+def test_ghost_model(detector):
+    detector.ingest([model_version("ghost", metadata=False)], now=NOW)
+    # Used without ever being registered
+    detector.ingest([inference("unregistered", i) for i in range(3)], now=NOW)
+    # Referenced by an agent before anything else mentions it
+    detector.ingest([action("agent-1", NOW - 50, payment=False,
+                            links={"inference_ids": [], "model_ids": ["orphan"]})], now=NOW)
+    assert sorted(f["model"] for f in _find(detector, "ghost_model")) == ["ghost", "orphan", "unregistered"]
+    assert _find(detector, "ghost_model", model="orphan")[0]["references"] == 1
+
+
+def test_future_timestamp(detector):
+    detector.ingest([action("agent-2", NOW + 9_999_999, payment=False),
+                     inference("phi-3-mini", 999, ts=NOW + 3600)], now=NOW)
+    [agent] = _find(detector, "future_timestamp", agent="agent-2")
+    assert agent["events"] == 1 and agent["max_skew_s"] == 9_999_999
+    assert _find(detector, "future_timestamp", model="phi-3-mini")[0]["events"] == 1
+    # Within the allowed skew
+    detector.ingest([action("agent-3", NOW + 60, payment=False)], now=NOW)
+    assert _find(detector, "future_timestamp", agent="agent-3") == []
+
+
+def test_empty_links(detector):
+    detector.ingest([action("agent-1", NOW - 100, payment=False, links={}),
+                     action("agent-1", NOW - 90, payment=False, links={"inference_ids": [], "model_ids": []})],
+                    now=NOW)
+    [finding] = _find(detector, "empty_links")
+    assert finding["agent"] == "agent-1"
+    assert finding["actions"] == 2 and finding["of"] == 42
+
+
+def test_unattributed_events_are_counted(detector):
+    detector.ingest([{"type": "agent_action", "links": {}},
+                     {"type": "model_inference", "input": "x", "output": "y"}], now=NOW)
+    summary = detector.summary()
+    assert summary["unattributed_actions"] == 1
+    assert summary["inferences_without_model"] == 1
+
+
+def test_reset(detector):
+    detector.ingest([model_version("ghost", metadata=False)], now=NOW)
+    assert _kinds(detector) == ["ghost_model"]
+    detector.reset()
+    assert detector.findings() == []
+    assert detector.summary()["events_seen"] == 0
+    assert len(detector.agents) == len(detector.models) == len(detector.inputs) == 0
+    # Works again after a reset
+    detector.ingest(normal_traffic(), now=NOW)
+    assert detector.findings() == []
+
+
+def test_empty_batch(detector):
+    assert detector.ingest([], now=NOW) == 0
+    assert detector.summary()["events_seen"] == 5 + 200 + 40 * len(AGENTS)
@@ -0,0 +1,312 @@
+# test_cache.py
+# ToolCache: TTL, LRU, error payloads, invalidation, unhashable arguments and
+# single-flight coalescing (threads and asyncio).
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.agent import cache
+from app.agent.cache import ToolCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def _counting(result=None):
+    calls = []
+
+    def fn(x, limit=10):
+        calls.append((x, limit))
+        return result if result is not None else {"x": x, "limit": limit}
+    return fn, calls
+
+
+def test_hit_until_ttl_expires(clock):
+    c = ToolCache()
+    fn, calls = _counting()
+    cached = c.cached("t", ttl=5)(fn)
+    assert cached(1) == {"x": 1, "limit": 10}
+    clock.now += 4.9
+    cached(1)
+    assert len(calls) == 1
+    clock.now += 0.2
+    cached(1)
+    assert len(calls) == 2
+    assert c.stats()["t"] == {"hits": 1, "misses": 2, "coalesced": 0, "entries": 1}
+
+
+def test_no_ttl_caches_until_evicted(clock):
+    c = ToolCache()
+    fn, calls = _counting()
+    cached = c.cached("t", ttl=None)(fn)
+    cached(1)
+    clock.now += 1e9
+    cached(1)
+    assert len(calls) == 1
+
+
+def test_positional_and_keyword_calls_share_an_entry(clock):
+    c = ToolCache()
+    fn, calls = _counting()
+    cached = c.cached("t", ttl=5)(fn)
+    cached(1, 10)
+    cached(1)
+    cached(x=1, limit=10)
+    assert len(calls) == 1
+    cached(1, limit=11)
+    assert len(calls) == 2
+
+
+def test_lru_eviction(clock):
+    c = ToolCache(max_entries=2)
+    fn, calls = _counting()
+    cached = c.cached("t", ttl=None)(fn)
+    cached(1)
+    cached(2)
+    cached(1)  # 1 is now the most recently used
+    cached(3)  # evicts 2
+    cached(1)
+    assert len(calls) == 3
+    cached(2)
+    assert len(calls) == 4
+
+
+def test_error_payloads_are_not_cached(clock):
+    c = ToolCache()
+    fn, calls = _counting({"error": "Block not found"})
+    cached = c.cached("t", ttl=None)(fn)
+    cached(1)
+    cached(1)
+    assert len(calls) == 2
+
+
+def test_invalidate_one_tool(clock):
+    c = ToolCache()
+    a, a_calls = _counting()
+    b, b_calls = _counting()
+    cached_a = c.cached("a", ttl=None)(a)
+    cached_b = c.cached("b", ttl=None)(b)
+    cached_a(1), cached_b(1)
+    c.invalidate("a")
+    cached_a(1), cached_b(1)
+    assert (len(a_calls), len(b_calls)) == (2, 1)
+    c.invalidate()
+    cached_b(1)
+    assert len(b_calls) == 2
+
+
+def test_single_flight_threads():
+    c = ToolCache()
+    release = threading.Event()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    def slow(x):
+        calls.append(x)
+        release.wait(5)
+        return {"x": x}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow(1))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [1]
+    assert results == [{"x": 1}] * 8
+    assert c.stats()["t"]["coalesced"] == 7
+
+
+def test_single_flight_threads_share_the_error():
+    c = ToolCache()
+    release = threading.Event()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    def failing(x):
+        calls.append(x)
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    errors = []
+
+    def run():
+        try:
+            failing(1)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [1]
+    assert errors == ["backend down"] * 4
+    # Nothing was cached: the next call goes to the backend again
+    with pytest.raises(RuntimeError):
+        failing(1)
+    assert calls == [1, 1]
+
+
+def test_single_flight_async():
+    c = ToolCache()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return {"x": x}
+
+    async def main():
+        return await asyncio.gather(*(slow(1) for _ in range(10)), slow(2))
+
+    results = asyncio.run(main())
+    assert sorted(calls) == [1, 2]
+    assert results == [{"x": 1}] * 10 + [{"x": 2}]
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    c = ToolCache()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.1)
+        return {"x": x}
+
+    async def main():
+        leader = asyncio.create_task(slow(1))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(slow(1))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        assert await leader == {"x": 1}
+        assert await slow(1) == {"x": 1}  # served from the cache
+
+    asyncio.run(main())
+    assert calls == [1]
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    c = ToolCache()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return {"x": x}
+
+    async def main():
+        leader = asyncio.create_task(slow(1))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(slow(1)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        return results
+
+    # The followers did not ask to be cancelled: one of them re-runs the call
+    assert asyncio.run(main()) == [{"x": 1}] * 3
+    assert calls == [1, 1]
+
+
+def test_interrupted_thread_leader_hands_over():
+    c = ToolCache()
+    release = threading.Event()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    def slow(x):
+        calls.append(x)
+        if len(calls) == 1:
+            release.wait(5)
+            raise KeyboardInterrupt
+        return {"x": x}
+
+    results = []
+
+    def leader():
+        try:
+            slow(1)
+        except KeyboardInterrupt:
+            results.append("interrupted")
+
+    first = threading.Thread(target=leader)
+    first.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=lambda: results.append(slow(1)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    first.join(5)
+    follower.join(5)
+    assert sorted(map(str, results)) == ["interrupted", "{'x': 1}"]
+    assert calls == [1, 1]
+
+
+@pytest.mark.parametrize("types", [["a", "b"], ("a", "b")])
+def test_list_arguments_are_cached(clock, types):
+    c = ToolCache()
+    calls = []
+
+    @c.cached("t", ttl=5)
+    def tool(types, filters=None):
+        calls.append(types)
+        return {"types": list(types)}
+
+    assert tool(types) == {"types": ["a", "b"]}
+    assert tool(list(types)) == {"types": ["a", "b"]}
+    assert tool(types, filters={"model": ["m1"], "since": 1}) == {"types": ["a", "b"]}
+    assert tool(types, filters={"since": 1, "model": ["m1"]}) == {"types": ["a", "b"]}
+    assert len(calls) == 2
+    # A dict is not the same key as the list of its items
+    tool(types, filters=[("model", ("m1",)), ("since", 1)])
+    assert len(calls) == 3
+
+
+def test_unhashable_arguments_fall_through_uncached(clock):
+    c = ToolCache()
+    calls = []
+
+    class Opaque:
+        __hash__ = None
+
+    @c.cached("t", ttl=5)
+    def tool(x):
+        calls.append(x)
+        return {"ok": True}
+
+    @c.cached("a", ttl=5)
+    async def atool(x):
+        calls.append(x)
+        return {"ok": True}
+
+    value = Opaque()
+    assert tool(value) == {"ok": True} and tool(value) == {"ok": True}
+    assert asyncio.run(atool(value)) == {"ok": True}
+    assert asyncio.run(atool([value])) == {"ok": True}
+    assert len(calls) == 4
+    assert c.stats() == {}
@@ -0,0 +1,70 @@
+# test_checkpoint.py
+# CheckpointStore: save/load round-trip, reset, when a full re-verification
+# is due.
+import pytest
+
+from app.agent import checkpoint
+from app.agent.checkpoint import CheckpointStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(checkpoint, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "nested" / "auditor.sqlite"))
+
+
+def test_empty_store_has_no_checkpoint(store):
+    assert store.load() is None
+
+
+def test_save_and_load(store, clock):
+    store.save(41, "hash-41", "digest-41", full=True)
+    assert store.load() == {"last_index": 41, "last_hash": "hash-41", "digest": "digest-41",
+                            "verified_at": clock.now, "full_verified_at": clock.now}
+    # Survives reopening the database
+    assert CheckpointStore(store.path).load() == store.load()
+
+
+def test_incremental_save_keeps_the_last_full_run(store, clock):
+    store.save(9, "hash-9", "digest-9", full=True)
+    full_at = clock.now
+    clock.now += 30
+    store.save(19, "hash-19", "digest-19", full=False)
+    saved = store.load()
+    assert (saved["last_index"], saved["verified_at"], saved["full_verified_at"]) == (19, clock.now, full_at)
+    clock.now += 30
+    store.save(29, "hash-29", "digest-29", full=True)
+    assert store.load()["full_verified_at"] == clock.now
+
+
+def test_reset(store):
+    store.save(1, "h", "d", full=True)
+    store.reset()
+    assert store.load() is None
+    store.reset()  # nothing to delete
+
+
+def test_full_due_after_the_interval(store, clock, monkeypatch):
+    monkeypatch.setattr(checkpoint, "FULL_REVERIFY_INTERVAL", 3600)
+    store.save(1, "h", "d", full=True)
+    clock.now += 3599
+    store.save(2, "h2", "d2", full=False)
+    assert not store.full_due(store.load())
+    clock.now += 1
+    assert store.full_due(store.load())
+    store.save(3, "h3", "d3", full=True)
+    assert not store.full_due(store.load())
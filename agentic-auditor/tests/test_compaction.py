@@ -0,0 +1,70 @@
+# test_compaction.py
+# Tool results are cut down to their token budget before the second LLM
+# pass, however large or oddly shaped they are.
+import json
+
+import pytest
+
+from app.agent import summarize
+from app.agent.compaction import compact, compact_tool_result, estimate_tokens, result_store
+from app.agent.summarize import StreamSummary
+
+
+def _fits(value, budget):
+    return estimate_tokens(json.dumps(value, default=str)) <= budget
+
+
+def test_small_result_is_left_alone():
+    content, stats = compact_tool_result("healthcheck", {"status": "ok"})
+    assert json.loads(content) == {"status": "ok"}
+    assert stats["saved_tokens"] == 0
+
+
+@pytest.mark.parametrize("payload", [
+    {f"key-{i}": i for i in range(20000)},                       # many keys
+    {"k" * 50000: 1},                                             # one huge key
+    {"items": [{"id": i, "blob": "x" * 500} for i in range(5000)]},
+    [[[[[[[[{"deep": "y" * 1000}]]]]]]]] * 200,                   # nesting
+    {"quotes": '"' * 40000, "unicode": "漢" * 40000},             # escaping
+])
+def test_oversized_payload_fits_the_budget(payload):
+    content, stats = compact_tool_result("list_events", payload)
+    assert stats["prompt_tokens"] <= 1200
+    envelope = json.loads(content)
+    assert envelope["compacted"]
+    assert result_store.get(envelope["result_id"]) is payload
+
+
+def test_many_keys_are_reported():
+    shrunk = compact({f"key-{i}": i for i in range(200)}, 200)
+    assert _fits(shrunk, 200)
+    assert "keys" in shrunk["..."]
+
+
+def test_truncated_text_is_marked():
+    # Nesting survives every shrink level: only cutting the text helps
+    nested = "x"
+    for _ in range(200):
+        nested = [nested]
+    data = compact(nested, 20)
+    assert isinstance(data, str) and data.endswith("...(truncated)")
+    assert _fits(data, 20)
+
+
+def test_trace_lines_are_trimmed():
+    trace = "\n".join(f"line {i}" for i in range(100))
+    content, _ = compact_tool_result("verify_chain", {"error": "boom", "traceback": trace})
+    assert json.loads(content)["traceback"].splitlines() == ["line 96", "line 97", "line 98", "line 99"]
+
+
+def test_summary_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(summarize, "MAX_KEYS", 10)
+    monkeypatch.setattr(summarize, "TOP_TYPES", 5)
+    summary = StreamSummary(sample_size=0)
+    for i in range(100):
+        summary.add({"type": f"type-{i}", "modelId": f"model-{i}"})
+    result = summary.result()
+    assert len(summary.by_type) == len(summary.by_model) == 11
+    assert len(result["by_type"]) == 5
+    assert sum(result["by_type"].values()) == result["count"] == 100
+    assert result["by_type"]["other"] == 96
@@ -0,0 +1,168 @@
+# test_dashboard.py
+# Dashboard snapshot: refresh replaces what is served, ETags answer 304 until
+# the data changes, and the last good data stays up (flagged) while the
+# backend is down.
+import asyncio
+
+import httpx
+import pytest
+from fastapi.templating import Jinja2Templates
+from fastapi.testclient import TestClient
+
+import dashboard
+from dashboard import Snapshot, refresh
+
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeBackend:
+    """Stands in for the dashboard's httpx.AsyncClient."""
+
+    def __init__(self, events, reports=()):
+        self.events = events
+        self.reports = list(reports)
+        self.down = set()
+        self.calls = []
+
+    async def get(self, path, params=None):
+        self.calls.append((path, params))
+        name = path.strip("/")
+        if name in self.down:
+            raise httpx.ConnectError("backend down")
+        return Response(self.events if name == "events" else self.reports)
+
+
+def make_events(n, agent="agent-1"):
+    return [{"type": "agent_action", "agent_id": agent, "modelId": f"m{i % 2}",
+             "timestamp": 1_700_000_000 + i} for i in range(n)]
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snapshot = Snapshot()
+    monkeypatch.setattr(dashboard, "snapshot", snapshot)
+    return snapshot
+
+
+@pytest.fixture
+def client(snapshot, tmp_path, monkeypatch):
+    (tmp_path / "events.html").write_text("{% for ev in events %}{{ ev.agent_id }};{% endfor %}")
+    monkeypatch.setattr(dashboard, "templates", Jinja2Templates(directory=str(tmp_path)))
+    # No context manager: the refresh and verify loops stay off
+    return TestClient(dashboard.app)
+
+
+def _refresh(backend):
+    asyncio.run(refresh(backend))
+
+
+def test_refresh_replaces_the_snapshot(snapshot, client):
+    backend = FakeBackend(make_events(4), reports=[{"id": "r1"}])
+    _refresh(backend)
+    assert sorted(path for path, _ in backend.calls) == ["/audit", "/events"]
+    data = client.get("/api/dashboard").json()
+    assert data["counts"]["events"] == 4 and data["counts"]["by_model"] == {"m0": 2, "m1": 2}
+    assert data["reports"] == [{"id": "r1"}] and data["errors"] == {}
+    first = snapshot.refreshed_at
+
+    backend.events = make_events(6, agent="agent-2")
+    backend.reports = []
+    _refresh(backend)
+    data = client.get("/api/dashboard").json()
+    assert data["counts"]["events"] == 6 and data["counts"]["top_agents"] == {"agent-2": 6}
+    assert data["reports"] == []
+    assert snapshot.refreshed_at >= first
+    assert client.get("/api/dashboard/counts").json()["counts"]["events"] == 6
+
+
+def test_recent_events_are_trimmed(snapshot, client, monkeypatch):
+    monkeypatch.setattr(dashboard, "RECENT_EVENTS", 3)
+    _refresh(FakeBackend(make_events(10)))
+    data = client.get("/api/dashboard").json()
+    # Aggregates cover everything fetched, the event list only the newest page
+    assert data["counts"]["events"] == 10 and len(data["events"]) == 3
+
+
+def test_matching_etag_gets_304(client):
+    backend = FakeBackend(make_events(4))
+    _refresh(backend)
+    r = client.get("/api/dashboard")
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.headers["x-refreshed-at"]
+
+    r = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b"" and r.headers["etag"] == etag
+    assert client.get("/api/dashboard", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Unchanged data keeps its ETag across refreshes; new data changes it
+    _refresh(backend)
+    assert client.get("/api/dashboard", headers={"If-None-Match": etag}).status_code == 304
+    backend.events = make_events(5)
+    _refresh(backend)
+    r = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+
+
+def test_sections_have_their_own_etag(client):
+    backend = FakeBackend(make_events(4), reports=[{"id": "r1"}])
+    _refresh(backend)
+    etag = client.get("/api/dashboard/reports").headers["etag"]
+    backend.events = make_events(5)
+    _refresh(backend)
+    # Only events changed: the reports section is still current
+    assert client.get("/api/dashboard/reports", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/dashboard/nope").status_code == 404
+
+
+def test_pages_use_the_snapshot_etag(snapshot, client):
+    _refresh(FakeBackend(make_events(2)))
+    r = client.get("/events")
+    assert r.status_code == 200 and r.text == "agent-1;agent-1;"
+    assert r.headers["etag"] == snapshot.etag
+    assert client.get("/events", headers={"If-None-Match": snapshot.etag}).status_code == 304
+
+
+def test_stale_snapshot_is_served_while_the_backend_is_down(snapshot, client):
+    backend = FakeBackend(make_events(4), reports=[{"id": "r1"}])
+    _refresh(backend)
+    before = client.get("/api/dashboard").json()
+
+    backend.down = {"events", "audit"}
+    backend.events = make_events(9)
+    _refresh(backend)
+    r = client.get("/api/dashboard")
+    assert r.status_code == 200
+    data = r.json()
+    # Last good data, flagged per section
+    assert data["counts"] == before["counts"] and data["reports"] == before["reports"]
+    assert set(data["errors"]) == {"events", "reports"}
+    assert data["errors"]["events"].startswith("ConnectError")
+
+    # One source back: its data and flag are current again
+    backend.down = {"audit"}
+    _refresh(backend)
+    data = client.get("/api/dashboard").json()
+    assert data["counts"]["events"] == 9 and set(data["errors"]) == {"reports"}
+    backend.down = set()
+    _refresh(backend)
+    assert client.get("/api/dashboard").json()["errors"] == {}
+
+
+def test_chain_from_the_checkpoint_when_not_verifying(snapshot, client, monkeypatch):
+    class Store:
+        def load(self):
+            return {"last_index": 41, "last_hash": "h41"}
+
+    monkeypatch.setattr(dashboard, "VERIFY_INTERVAL", 0)
+    monkeypatch.setattr(dashboard, "get_checkpoint_store", Store)
+    _refresh(FakeBackend([]))
+    assert client.get("/api/dashboard/chain").json()["chain"] == {"last_index": 41, "last_hash": "h41"}
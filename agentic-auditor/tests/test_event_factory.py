@@ -0,0 +1,158 @@
+# test_event_factory.py
+# event_factory.py load mode against the ingest stub (scripts/stub_backend.py)
+# served in-process: open-loop and closed-loop runs, warmup, drops, errors and
+# the JSON report; plus the stub's handling of bodies it cannot store.
+import argparse
+import asyncio
+import json
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from scripts import event_factory, stub_backend
+from scripts.event_factory import HIST_EDGES_MS, LoadStats, parse_mix, percentile, run_load
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """The ingest stub on a free port; returns it with .url and .configure()."""
+    monkeypatch.setattr(stub_backend, "counts", {})
+    monkeypatch.setattr(stub_backend, "events", [])
+    monkeypatch.setattr(stub_backend, "args",
+                        argparse.Namespace(delay=0.0, jitter=0.0, fail_rate=0.0, keep=1_000_000))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_backend.Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.configure = lambda **kw: vars(stub_backend.args).update(kw)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def load_args(url, **overrides):
+    args = dict(url=url, rps=0, concurrency=4, max_inflight=1000, duration=0.3, warmup=0, timeout=5,
+                mix=event_factory.DEFAULT_MIX, events_path="/events", inference_path="/api/inferences", out=None)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _run(args):
+    return asyncio.run(run_load(args))
+
+
+def _stored(stub):
+    return sum(c for path, c in stub_backend.counts.items() if path.startswith("/"))
+
+
+def test_parse_mix():
+    assert parse_mix("model_inference=3,agent_action,inference=0.5") == {
+        "model_inference": 3.0, "agent_action": 1.0, "inference": 0.5}
+    with pytest.raises(SystemExit):
+        parse_mix("model_inference=1,nope=2")
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([5.0], 0.99) == 5.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+
+
+def test_report_from_recorded_requests():
+    stats = LoadStats()
+    for ms in (0.5, 3, 3, 40, 20000):
+        stats.record("agent_action", ms, ms / 2, status=201)
+    stats.record("inference", 7, 7, status=503)
+    stats.record("inference", 9, 9, error="ConnectError")
+    stats.dropped = 2
+    report = stats.report(2.0, load_args("http://stub", rps=10))
+    assert report["mode"] == "open" and report["target_rps"] == 10
+    assert report["requests"] == 7 and report["achieved_rps"] == 3.5
+    assert report["errors"] == 2 and report["error_rate"] == round(2 / 7, 4) and report["dropped"] == 2
+    assert report["status"] == {"201": 5, "503": 1} and report["exceptions"] == {"ConnectError": 1}
+    assert report["by_kind"] == {"agent_action": {"requests": 5, "errors": 0},
+                                 "inference": {"requests": 2, "errors": 2}}
+    hist = report["histogram_ms"]
+    assert list(hist) == [f"<={e}" for e in HIST_EDGES_MS] + [f">{HIST_EDGES_MS[-1]}"]
+    assert (hist["<=1"], hist["<=5"], hist["<=10"], hist["<=50"], hist[">10000"]) == (1, 2, 2, 1, 1)
+    assert sum(hist.values()) == 7
+    assert report["latency_ms"]["max"] == 20000 and report["latency_ms"]["p50"] == 7
+
+
+def test_empty_report():
+    report = LoadStats().report(1.0, load_args("http://stub"))
+    assert report["mode"] == "closed" and report["target_rps"] is None
+    assert report["requests"] == 0 and report["error_rate"] is None
+    assert report["latency_ms"]["p50"] is None and report["latency_ms"]["mean"] is None
+
+
+def test_closed_loop(stub):
+    report = _run(load_args(stub.url, rps=0, concurrency=4, duration=0.3))
+    assert report["mode"] == "closed" and report["concurrency"] == 4
+    assert report["requests"] > 0 and report["errors"] == 0
+    assert report["status"] == {"201": report["requests"]}
+    # Every request sent in the measured phase reached the stub
+    assert _stored(stub) == report["requests"]
+    assert set(report["by_kind"]) <= {"model_inference", "agent_action", "model_version"}
+    assert sum(k["requests"] for k in report["by_kind"].values()) == report["requests"]
+
+
+def test_open_loop_paces_arrivals(stub):
+    report = _run(load_args(stub.url, rps=200, duration=0.5, mix="inference=1"))
+    assert report["mode"] == "open" and report["target_rps"] == 200
+    # Poisson arrivals: around 100, far from a back-to-back closed loop
+    assert 40 <= report["requests"] <= 200
+    assert report["dropped"] == 0 and report["errors"] == 0
+    assert stub_backend.counts == {"/api/inferences": report["requests"]}
+    stored = stub_backend.events[0]
+    assert stored["type"] == "model_inference" and stored["inferenceId"]
+
+
+def test_open_loop_drops_past_max_inflight(stub):
+    stub.configure(delay=0.05)
+    report = _run(load_args(stub.url, rps=400, duration=0.3, max_inflight=2))
+    assert report["dropped"] > 0
+    # Latency counts from the intended start, service time from the send
+    assert report["latency_ms"]["p50"] >= report["service_ms"]["p50"] >= 40
+
+
+def test_warmup_is_not_reported(stub):
+    report = _run(load_args(stub.url, concurrency=2, duration=0.2, warmup=0.2))
+    assert 0 < report["requests"] < _stored(stub)
+
+
+def test_failures_are_reported(stub):
+    stub.configure(fail_rate=1.0)
+    report = _run(load_args(stub.url, concurrency=2, duration=0.2))
+    assert report["status"] == {"503": report["requests"]}
+    assert report["error_rate"] == 1.0
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed = f"http://127.0.0.1:{s.getsockname()[1]}"
+    report = _run(load_args(closed, concurrency=2, duration=0.1))
+    assert report["status"] == {} and report["exceptions"] == {"ConnectError": report["requests"]}
+
+
+def test_load_command_prints_and_writes_the_report(stub, tmp_path, capsys):
+    out = tmp_path / "report.json"
+    event_factory.load(["--url", stub.url, "--rps", "0", "--concurrency", "2", "--duration", "0.1",
+                        "--warmup", "0", "--mix", "weird=1,suspicious=1", "--out", str(out)])
+    printed = json.loads(capsys.readouterr().out)
+    assert json.loads(out.read_text()) == printed
+    assert printed["target_url"] == stub.url and printed["requests"] > 0
+
+
+def test_stub_rejects_bodies_it_cannot_store(stub):
+    with httpx.Client(base_url=stub.url) as client:
+        r = client.post("/events", content=b"[1, 2]", headers={"Content-Type": "application/json"})
+        assert r.status_code == 400 and r.json() == {"error": "expected a JSON object"}
+        assert client.post("/events", content=b"not json").status_code == 400
+        assert client.post("/api/models", json={"modelId": "m1"}).json() == {"ok": True, "id": "m1"}
+        assert client.post("/nope", json={}).status_code == 404
+        [stored] = client.get("/api/events", params={"skip": 0, "limit": 10}).json()
+    assert stored["modelId"] == "m1" and stored["type"] == "model_version"
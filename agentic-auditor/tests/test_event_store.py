@@ -0,0 +1,100 @@
+# test_event_store.py
+# DuckDB mirror: appends by high-water mark, aggregation, and the guard on
+# ad-hoc SQL (single SELECT, no file access, row cap, timeout).
+import duckdb
+import pytest
+
+from app.agent import event_store
+from app.agent.event_store import EventStore
+
+EVENTS = [
+    {"type": "model_inference", "modelId": "m1", "agentId": "a1", "latency_ms": 10, "timestamp": 1700000000},
+    {"type": "model_inference", "modelId": "m1", "agentId": "a2", "latency_ms": 30, "timestamp": 1700003600},
+    {"type": "agent_action", "agentId": "a1", "action_type": "query", "timestamp": 1700007200},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(str(tmp_path / "events.duckdb"))
+    store.append_events(EVENTS, 0)
+    return store
+
+
+def test_events_are_appended_by_position(store):
+    assert store.high_water("events") == (3, None)
+    assert store.append_events(EVENTS[:1], 3) == 4
+    rows = store.query("SELECT seq, type, model_id, latency_ms FROM events ORDER BY seq")["rows"]
+    assert rows[0] == [0, "model_inference", "m1", 10.0]
+    assert rows[2] == [2, "agent_action", None, None]
+    assert [r[0] for r in rows] == [0, 1, 2, 3]
+
+
+def test_blocks_must_link(store):
+    blocks = [{"index": i, "hash": f"h{i}", "previousHash": f"h{i - 1}", "data": {"type": "t"}} for i in range(3)]
+    assert store.append_blocks(blocks[:2]) == 2
+    assert store.high_water("blocks") == (1, "h1")
+    assert store.append_blocks([{**blocks[2], "previousHash": "other"}]) is None
+    assert store.append_blocks(blocks[2:]) == 1
+    store.reset("blocks")
+    assert store.high_water("blocks") == (-1, None)
+
+
+def test_aggregate(store):
+    result = store.aggregate(group_by="model_id", type="model_inference")
+    assert result["groups"] == [{
+        "model_id": "m1", "events": 2, "models": 1, "agents": 2, "latency_avg_ms": 20.0,
+        "latency_p50_ms": 20.0, "latency_p95_ms": 29.0, "cost_total": None,
+        "first": "2023-11-14T22:13:20", "last": "2023-11-14T23:13:20",
+    }]
+    with pytest.raises(ValueError):
+        store.aggregate(group_by="raw")
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM events",
+    "DROP TABLE events",
+    "INSERT INTO events (seq) VALUES (99)",
+    "UPDATE sync_state SET high_water = 0",
+    "CREATE TABLE x AS SELECT 1",
+    "SELECT 1; DROP TABLE events",
+    "SET enable_external_access = true",
+    "ATTACH 'other.duckdb'",
+    "COPY events TO 'out.csv'",
+    "CHECKPOINT",
+    "EXPORT DATABASE 'dump'",
+    "LOAD httpfs",
+    "",
+])
+def test_only_one_select_is_accepted(store, sql):
+    with pytest.raises((ValueError, duckdb.Error)):
+        store.query(sql)
+    assert store.query("SELECT count(*) FROM events")["rows"] == [[3]]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM read_csv('/etc/passwd')",
+    "SELECT * FROM read_text('/etc/hostname')",
+    "SELECT * FROM 'events.duckdb'",
+])
+def test_no_file_access(store, sql):
+    with pytest.raises(duckdb.Error):
+        store.query(sql)
+
+
+def test_configuration_is_locked(store):
+    with pytest.raises(duckdb.Error):
+        store._con.execute("SET enable_external_access = true")
+
+
+def test_rows_are_capped(store, monkeypatch):
+    monkeypatch.setattr(event_store, "MAX_ROWS", 5)
+    result = store.query("SELECT * FROM range(100)", limit=1000)
+    assert result["row_count"] == 5 and result["truncated"]
+    assert not store.query("SELECT * FROM range(3)")["truncated"]
+
+
+def test_slow_queries_are_cancelled(store):
+    with pytest.raises(TimeoutError):
+        store.query("SELECT count(*) FROM range(100000000000) a", timeout=0.2)
+    assert store.query("SELECT 1")["rows"] == [[1]]
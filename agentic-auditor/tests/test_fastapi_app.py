@@ -0,0 +1,161 @@
+# test_fastapi_app.py
+# /audit/stream: the agent run as server-sent events (step, token, tool_start,
+# tool_end, done / error) against the mock backend and LLM, and the audit
+# limiter in front of it (overload answers, slots freed by aborted streams).
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agent import run_agent
+from app.api import fastapi_app
+from app.api.fastapi_app import app
+from app.api.limiter import AuditLimiter, audit_limiter
+
+QUESTION = "Is the backend healthy?"
+
+
+@pytest.fixture
+def client(ernest, llm):
+    # No context manager: the startup hooks (job runner, subscription) stay off
+    return TestClient(app)
+
+
+def parse_sse(text):
+    events = []
+    for chunk in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in chunk.splitlines())
+        events.append({"event": lines["event"], **json.loads(lines["data"])})
+    return events
+
+
+def test_stream_events(client):
+    r = client.get("/audit/stream", params={"message": QUESTION})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert r.headers["cache-control"] == "no-cache"
+
+    events = parse_sse(r.text)
+    names = [e["event"] for e in events]
+    # The stub LLM calls healthcheck, then answers token by token
+    assert names[:4] == ["step", "tool_start", "tool_end", "step"]
+    assert set(names[4:-1]) == {"token"}
+    done = events[-1]
+    assert done["event"] == "done"
+    assert done["response"] == "".join(e["text"] for e in events if e["event"] == "token")
+    assert done["steps"] == 2
+    assert [t["name"] for t in done["tools"]] == ["healthcheck"]
+    assert done["request_id"]
+    assert audit_limiter.active == 0
+
+
+def test_stream_post(client):
+    r = client.post("/audit/stream", json={"message": QUESTION})
+    assert r.status_code == 200
+    assert parse_sse(r.text)[-1]["event"] == "done"
+
+
+def test_stream_reports_errors_as_events(client, monkeypatch):
+    async def failing(messages, deadline, tools=True, parent=None, step=None):
+        raise RuntimeError("LLM unreachable")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(run_agent, "_stream_completion", failing)
+    events = parse_sse(client.get("/audit/stream", params={"message": QUESTION}).text)
+    assert [e["event"] for e in events] == ["step", "error"]
+    assert events[-1]["error"] == "LLM unreachable"
+    assert events[-1]["request_id"]
+    assert audit_limiter.active == 0
+
+
+def test_last_step_is_forced_to_answer(monkeypatch):
+    # An LLM that keeps calling tools gets one final turn without them
+    turns = []
+
+    async def completion(messages, deadline, tools=True, parent=None, step=None):
+        turns.append(tools)
+        if tools:
+            call = {"id": f"call_{step}", "type": "function",
+                    "function": {"name": "healthcheck", "arguments": "{}"}}
+            yield "message", {"role": "assistant", "content": None, "tool_calls": [call]}
+        else:
+            yield "token", "done"
+            yield "message", {"role": "assistant", "content": "done"}
+
+    async def healthcheck():
+        return "ALIVE"
+
+    monkeypatch.setattr(run_agent, "_stream_completion", completion)
+    monkeypatch.setitem(run_agent.ASYNC_TOOLS_MAP, "healthcheck", healthcheck)
+
+    async def collect():
+        return [e async for e in run_agent.run_agent_stream(QUESTION, max_steps=2, memo=False, router=False)]
+
+    events = asyncio.run(collect())
+    assert turns == [True, True, False]
+    assert [e["step"] for e in events if e["event"] == "step"] == [1, 2, 3]
+    assert events[-1]["event"] == "done" and events[-1]["steps"] == 3
+    assert len(events[-1]["tools"]) == 2
+
+
+# ---------------------------------------------------------------------------
+# Admission limiter
+# ---------------------------------------------------------------------------
+
+def _busy_limiter(queue_max, queue_timeout=5):
+    # One slot, already taken by an audit that never ends
+    limiter = AuditLimiter(concurrency=1, queue_max=queue_max, queue_timeout=queue_timeout)
+    limiter._semaphore = asyncio.Semaphore(0)
+    limiter.active = 1
+    return limiter
+
+
+@pytest.mark.parametrize("queue_max,status", [(0, 429), (5, 503)])
+def test_overload_status_and_retry_after(client, monkeypatch, queue_max, status):
+    requests = [
+        lambda: client.post("/audit", json={"message": QUESTION}),
+        lambda: client.get("/audit/stream", params={"message": QUESTION}),
+    ]
+    for send in requests:
+        # A limiter per request: TestClient runs each one on a new event loop
+        monkeypatch.setattr(fastapi_app, "audit_limiter", _busy_limiter(queue_max, queue_timeout=0.05))
+        r = send()
+        assert r.status_code == status
+        assert int(r.headers["Retry-After"]) >= 1
+
+
+async def _aborted_stream(disconnect_after_first_event):
+    """GET /audit/stream straight through ASGI, the client leaving early."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/audit/stream", "raw_path": b"/audit/stream", "root_path": "",
+        "query_string": b"message=hello", "headers": [], "server": ("test", 80), "client": ("test", 1),
+    }
+    first_event = asyncio.Event()
+
+    async def receive():
+        if disconnect_after_first_event:
+            await first_event.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_event.set()
+
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    await asyncio.sleep(0.1)
+    return audit_limiter.active
+
+
+@pytest.mark.parametrize("disconnect_after_first_event", [False, True])
+def test_aborted_streams_free_their_slot(monkeypatch, disconnect_after_first_event):
+    async def slow(messages, deadline, tools=True, parent=None, step=None):
+        for i in range(100):
+            yield "token", f"t{i} "
+            await asyncio.sleep(0.05)
+        yield "message", {"role": "assistant", "content": "late"}
+
+    monkeypatch.setattr(run_agent, "_stream_completion", slow)
+    for _ in range(3):
+        assert asyncio.run(_aborted_stream(disconnect_after_first_event)) == 0
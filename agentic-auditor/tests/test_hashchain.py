@@ -0,0 +1,185 @@
+# test_hashchain.py
+# The Python verifier against the Go one: cli-ernest's TestFixture writes
+# testdata/chains.json with the hash CalculateBlockHash gives every block and
+# the blocks verifyBlock rejects; both implementations must agree on them.
+# Also: incremental verification from a checkpoint, against a fake backend.
+import json
+import os
+
+import pytest
+
+from app.agent import checkpoint, hashchain
+from app.agent.checkpoint import CheckpointStore
+from app.agent.hashchain import calculate_block_hash, verify_blocks, verify_chain_incremental
+from tests.benchmarks.mocks import make_block, make_chain
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "..", "..", "cli-ernest", "cmd", "hashchain", "testdata", "chains.json",
+)
+
+with open(FIXTURE) as f:
+    CHAINS = {chain["name"]: chain for chain in json.load(f)}
+
+
+def _pages(blocks, size):
+    return [blocks[i:i + size] for i in range(0, len(blocks), size)]
+
+
+@pytest.mark.parametrize("name", sorted(CHAINS))
+def test_block_hashes_match_go(name):
+    chain = CHAINS[name]
+    assert [calculate_block_hash(b) for b in chain["blocks"]] == chain["hashes"]
+
+
+@pytest.mark.parametrize("workers,page_size", [(1, 100), (1, 2), (2, 2)])
+@pytest.mark.parametrize("name", sorted(CHAINS))
+def test_verdict_matches_go(name, workers, page_size):
+    chain = CHAINS[name]
+    result = verify_blocks(_pages(chain["blocks"], page_size), workers=workers)
+    assert result["valid"] == (not chain["invalid"])
+    assert sorted({e["index"] for e in result["errors"]}) == chain["invalid"]
+    assert result["blocks_checked"] == len(chain["blocks"])
+
+
+def test_genesis_hash_is_not_recomputed():
+    # verifyBlock skips i == 0; the link from block 1 still has to hold
+    chain = CHAINS["bad_genesis_hash"]
+    assert chain["blocks"][0]["hash"] != chain["hashes"][0]
+    assert verify_blocks([chain["blocks"]], workers=1)["valid"]
+
+
+def test_resumed_verification_checks_its_first_block():
+    # Past a checkpoint the first page does not start the chain
+    blocks = CHAINS["tampered_data"]["blocks"]
+    result = verify_blocks([blocks[2:]], workers=1, prev_index=1, prev_hash=blocks[1]["hash"])
+    assert [(e["index"], e["kind"]) for e in result["errors"]] == [(2, "hash_mismatch")]
+
+
+# ---------------------------------------------------------------------------
+# Incremental verification from a checkpoint
+# ---------------------------------------------------------------------------
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeChain:
+    """/api/blocks behind hashchain.request; records the pages asked for."""
+
+    def __init__(self, n):
+        self.blocks = make_chain(n)
+        self.pages = []
+
+    def request(self, method, path, endpoint, params=None):
+        if path == "/api/blocks":
+            self.pages.append(params["from"])
+            start = params["from"]
+            return Response(self.blocks[start:start + params["limit"]])
+        i = int(path.rsplit("/", 1)[1])
+        return Response(self.blocks[i] if i < len(self.blocks) else {"error": "Block not found"})
+
+    def append(self, n):
+        for _ in range(n):
+            self.blocks.append(make_block(len(self.blocks), self.blocks[-1]["hash"]))
+
+    def rewrite(self, index, rehash=True):
+        """Change a block's data; with rehash, fix up every hash after it too."""
+        self.blocks[index]["data"]["metadata"]["tokens"] += 1
+        if not rehash:
+            return
+        previous = self.blocks[index - 1]["hash"] if index else ""
+        for b in self.blocks[index:]:
+            b["previousHash"] = previous
+            b["hash"] = previous = calculate_block_hash(b)
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    fake = FakeChain(30)
+    monkeypatch.setattr(hashchain, "request", fake.request)
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "auditor.sqlite"))
+
+
+def _kinds(result):
+    return [e["kind"] for e in result["errors"]]
+
+
+def test_first_run_is_full_and_saves_a_checkpoint(chain, store):
+    result = verify_chain_incremental(store=store)
+    assert result["valid"] and result["mode"] == "full"
+    assert result["blocks_checked"] == 30
+    assert result["checkpoint"]["last_index"] == 29
+    assert result["checkpoint"]["last_hash"] == chain.blocks[29]["hash"]
+
+
+def test_resume_only_checks_new_blocks(chain, store):
+    verify_chain_incremental(store=store)
+    chain.append(5)
+    chain.pages.clear()
+    result = verify_chain_incremental(store=store)
+    assert result["valid"] and result["mode"] == "incremental"
+    assert chain.pages == [30]
+    assert result["blocks_checked"] == 5
+    # Same rolling digest as verifying the whole chain at once
+    assert result["checkpoint"]["digest"] == verify_blocks([chain.blocks], workers=1)["digest"]
+    assert result["checkpoint"]["last_index"] == 34
+
+    again = verify_chain_incremental(store=store)
+    assert again["valid"] and again["blocks_checked"] == 0
+    assert again["checkpoint"]["last_index"] == 34
+
+
+def test_rewritten_tip_forces_a_full_pass(chain, store):
+    verify_chain_incremental(store=store)
+    saved = store.load()
+    chain.rewrite(29)
+    chain.append(3)
+    result = verify_chain_incremental(store=store)
+    assert not result["valid"] and result["mode"] == "full"
+    assert result["errors"][0] == {"index": 29, "kind": "checkpoint_mismatch", "stored": saved["last_hash"],
+                                   "actual": chain.blocks[29]["hash"]}
+    assert result["blocks_checked"] == 33
+    assert store.load() == saved  # not moved past a rewrite
+
+
+def test_rewritten_history_below_the_tip(chain, store):
+    verify_chain_incremental(store=store)
+    saved = store.load()
+    chain.rewrite(10)  # and every hash after it, so the chain links again
+    result = verify_chain_incremental(store=store)
+    assert result["mode"] == "full" and not result["valid"]
+    # The tip differs, and the rolling digest over the rewritten prefix too
+    assert _kinds(result) == ["checkpoint_mismatch", "checkpoint_mismatch"]
+    assert result["errors"][1]["stored_digest"] == saved["digest"]
+    assert store.load() == saved
+
+
+def test_tampered_block_is_found_by_the_periodic_full_pass(chain, store, monkeypatch):
+    verify_chain_incremental(store=store)
+    chain.rewrite(10, rehash=False)
+    # Only new blocks are checked until a full pass is due
+    assert verify_chain_incremental(store=store)["valid"]
+    monkeypatch.setattr(checkpoint, "FULL_REVERIFY_INTERVAL", 0)
+    result = verify_chain_incremental(store=store)
+    assert result["mode"] == "full" and not result["valid"]
+    assert [(e["index"], e["kind"]) for e in result["errors"]] == [(10, "hash_mismatch")]
+
+
+def test_reset_store_starts_from_genesis(chain, store):
+    verify_chain_incremental(store=store)
+    store.reset()
+    chain.pages.clear()
+    result = verify_chain_incremental(store=store)
+    assert result["mode"] == "full" and chain.pages == [0]
@@ -0,0 +1,195 @@
+# test_http_client.py
+# Pooled backend clients: retries on 503 and transport errors (GET only),
+# backoff stopping at the request deadline, timeouts capped by it, and
+# connection reuse, against a scripted in-process server.
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import httpx
+import pytest
+
+from app.agent import http_client
+from app.agent import deadline as deadlines
+from app.agent.http_client import DeadlineExceeded, request, request_async
+from tests.benchmarks.mocks import _Server
+
+
+class ScriptedServer(_Server):
+    """Answers every request with the next scripted action: an int status,
+    "drop" (close without answering) or ("sleep", seconds); 200 once the
+    script runs out. Records (method, path, client port) per request."""
+
+    def __init__(self):
+        self.script = []
+        self.seen = []
+        self._lock = threading.Lock()
+        super().__init__(self._handler())
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _answer(self):
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    self.rfile.read(length)
+                with server._lock:
+                    server.seen.append((self.command, self.path, self.client_address[1]))
+                    action = server.script.pop(0) if server.script else 200
+                if action == "drop":
+                    self.close_connection = True
+                    return
+                if isinstance(action, tuple):
+                    time.sleep(action[1])
+                    action = 200
+                data = json.dumps({"status": action}).encode()
+                self.send_response(action)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _answer
+
+        return Handler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ScriptedServer().start()
+    monkeypatch.setattr(http_client, "ERNEST_URL", server.url)
+    monkeypatch.setattr(http_client, "_sync_client", None)
+    delays = []
+    monkeypatch.setattr(http_client, "_delay", lambda policy, attempt: delays.append(attempt) or 0)
+    server.delays = delays
+    yield server
+    if http_client._sync_client is not None:
+        http_client._sync_client.close()
+    server.stop()
+
+
+@pytest.fixture
+def deadline():
+    tokens = []
+
+    def set_in(seconds):
+        tokens.append(deadlines.set_deadline(time.monotonic() + seconds))
+    yield set_in
+    for token in reversed(tokens):
+        deadlines._deadline.reset(token)
+
+
+def _closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_get_is_retried_on_503(server):
+    server.script = [503, 503]
+    assert request("GET", "/api/events", "events").status_code == 200
+    assert len(server.seen) == 3 and server.delays == [0, 1]
+
+
+def test_async_get_is_retried_on_503(server):
+    server.script = [503]
+    assert asyncio.run(request_async("GET", "/api/events", "events")).status_code == 200
+    assert len(server.seen) == 2
+
+
+def test_retries_run_out(server):
+    server.script = [503] * 5
+    # "events" allows 2 retries: the third 503 is returned
+    assert request("GET", "/api/events", "events").status_code == 503
+    assert len(server.seen) == 3
+    # "health" allows none
+    server.seen.clear()
+    assert request("GET", "/health", "health").status_code == 503
+    assert len(server.seen) == 1
+
+
+def test_dropped_connection_is_retried(server):
+    server.script = ["drop"]
+    assert request("GET", "/api/blocks/1", "blocks").status_code == 200
+    server.script = ["drop"]
+    assert asyncio.run(request_async("GET", "/api/blocks/1", "blocks")).status_code == 200
+    assert [path for _, path, _ in server.seen] == ["/api/blocks/1"] * 4
+
+
+def test_connect_error_is_retried_then_raised(server, monkeypatch):
+    monkeypatch.setattr(http_client, "ERNEST_URL", _closed_port_url())
+    with pytest.raises(httpx.ConnectError):
+        request("GET", "/api/events", "events")
+    assert server.delays == [0, 1]
+    server.delays.clear()
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(request_async("GET", "/api/events", "events"))
+    assert server.delays == [0, 1]
+
+
+def test_post_is_never_retried(server):
+    server.script = [503]
+    assert request("POST", "/events", "events", json={"type": "x"}).status_code == 503
+    server.script = ["drop"]
+    with pytest.raises(httpx.TransportError):
+        asyncio.run(request_async("POST", "/events", "events", json={"type": "x"}))
+    assert [m for m, _, _ in server.seen] == ["POST", "POST"]
+    assert server.delays == []
+
+
+def test_timeout_is_capped_by_the_deadline(server, deadline):
+    server.script = [("sleep", 2)]
+    deadline(0.3)
+    started = time.monotonic()
+    # The provenance policy allows 5 s; the deadline leaves 0.3 s
+    with pytest.raises(httpx.TimeoutException):
+        request("GET", "/api/provenances/m", "provenance")
+    assert time.monotonic() - started < 1.5
+
+
+def test_spent_deadline_fails_without_a_request(server, deadline):
+    deadline(-1)
+    with pytest.raises(DeadlineExceeded):
+        request("GET", "/api/events", "events")
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(request_async("GET", "/api/events", "events"))
+    assert server.seen == []
+
+
+def test_no_backoff_past_the_deadline(server, deadline):
+    server.script = [503, 503]
+    # Less left than the first backoff (0.1 s): return the 503 instead of retrying
+    deadline(0.05)
+    assert request("GET", "/api/events", "events").status_code == 503
+    assert len(server.seen) == 1
+
+
+def test_sync_requests_share_one_pooled_connection(server):
+    for _ in range(3):
+        request("GET", "/api/events", "events")
+    assert http_client.get_client() is http_client.get_client()
+    assert len({port for _, _, port in server.seen}) == 1
+
+
+def test_async_requests_share_the_loop_pool(server):
+    async def main():
+        client = http_client.get_async_client()
+        for _ in range(3):
+            await request_async("GET", "/api/events", "events")
+        assert http_client.get_async_client() is client
+        await http_client.aclose_clients()
+        return client
+
+    first = asyncio.run(main())
+    assert len({port for _, _, port in server.seen}) == 1
+    # Another loop gets its own client
+    assert asyncio.run(main()) is not first
@@ -0,0 +1,181 @@
+# test_jobs.py
+# Batch jobs: claiming (with duplicates and stored answers), retries,
+# recovery, cancellation, the model template and the worker pool.
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agent import jobs
+from app.agent.jobs import JobRunner, JobStore, check_model_template, expand_model_template
+from app.api.fastapi_app import app
+
+ANSWER = {"response": "all good", "steps": 1, "tools": []}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def _statuses(store, job_id):
+    return [(r["status"], r["deduped"]) for r in store.results(job_id)]
+
+
+def test_duplicates_are_claimed_and_answered_together(store, clock):
+    job = store.submit(["Audit model A", "  audit   MODEL a ", "Audit model B"])
+    key, prompt = store.claim()
+    assert prompt == "Audit model A"
+    assert _statuses(store, job) == [("running", False), ("running", True), ("pending", False)]
+    store.complete(key, ANSWER)
+    assert store.claim()[1] == "Audit model B"
+    assert store.job(job)["deduped"] == 1
+
+
+def test_fresh_answer_is_reused(store, clock):
+    first = store.submit(["Audit model A"])
+    store.complete(store.claim()[0], ANSWER)
+
+    clock.now += jobs.JOB_DEDUPE_TTL - 1
+    second = store.submit(["Audit model A"])
+    assert store.claim() is None
+    assert _statuses(store, second) == [("done", True)]
+    assert store.results(second)[0]["result"] == store.results(first)[0]["result"]
+    assert store.job(second)["status"] == "done"
+
+
+def test_reused_answers_do_not_extend_the_ttl(store, clock):
+    store.submit(["Audit model A"])
+    store.complete(store.claim()[0], ANSWER)
+    # Answered from the stored result just before it expires...
+    clock.now += jobs.JOB_DEDUPE_TTL - 1
+    store.submit(["Audit model A"])
+    assert store.claim() is None
+    # ...which does not make the original run fresh again
+    clock.now += 2
+    job = store.submit(["Audit model A"])
+    assert store.claim() is not None
+    assert _statuses(store, job) == [("running", False)]
+
+
+def test_failed_attempts_are_retried_then_failed(store, clock, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    job = store.submit(["Audit model A"])
+    store.complete(store.claim()[0], {"error": "LLM down"})
+    [task] = store.results(job)
+    assert (task["status"], task["attempts"], task["error"]) == ("pending", 1, "LLM down")
+    store.complete(store.claim()[0], {"error": "LLM still down"})
+    [task] = store.results(job)
+    assert (task["status"], task["attempts"]) == ("failed", 2)
+    assert store.claim() is None
+    # Failures are never reused as answers
+    store.submit(["Audit model A"])
+    assert store.claim() is not None
+
+
+def test_recover_requeues_running_tasks(store, clock):
+    job = store.submit(["Audit model A"])
+    store.claim()
+    assert store.recover() == 1
+    [task] = store.results(job)
+    assert (task["status"], task["attempts"]) == ("pending", 0)
+
+
+def test_cancel_skips_pending_tasks(store, clock):
+    job = store.submit(["Audit model A", "Audit model B"])
+    key, _ = store.claim()
+    assert store.cancel(job)
+    assert store.job(job)["status"] == "cancelling"
+    store.complete(key, ANSWER)
+    assert store.job(job)["status"] == "cancelled"
+    assert store.claim() is None
+    assert not store.cancel("no-such-job")
+
+
+# ---------------------------------------------------------------------------
+# Model template
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("template", ["Audit model {model_id}", "{model_id}: {model_id}", "{{x}} {model_id}"])
+def test_valid_templates(template):
+    check_model_template(template)
+
+
+@pytest.mark.parametrize("template", [
+    "Audit {model_id.__class__.__mro__}",
+    "Audit {model_id[0]}",
+    "Audit {0}",
+    "Audit {}",
+    "Audit {model_id} for {org}",
+    "Audit {model_id!r}",
+    "Audit {model_id:{model_id}}",
+    "Audit {model_id",
+    "Audit all models",
+])
+def test_invalid_templates(template):
+    with pytest.raises(ValueError):
+        check_model_template(template)
+
+
+def test_expand_model_template(ernest):
+    prompts = asyncio.run(expand_model_template("Audit model {model_id}"))
+    assert prompts and all(p.startswith("Audit model ") for p in prompts)
+    assert len(prompts) == len(set(prompts))
+
+
+def test_bad_template_is_a_400(ernest):
+    r = TestClient(app).post("/jobs", json={"model_template": "{model_id.__init__.__globals__}"})
+    assert r.status_code == 400
+    assert "model_id" in r.json()["detail"]
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+def test_runner_drains_the_queue(store, monkeypatch):
+    runs = []
+
+    async def fake_agent(prompt):
+        runs.append(prompt)
+        await asyncio.sleep(0.01)
+        if prompt == "boom":
+            raise RuntimeError("agent crashed")
+        return {**ANSWER, "response": prompt.upper()}
+
+    monkeypatch.setattr(jobs, "run_agent_async", fake_agent)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+
+    async def main():
+        runner = JobRunner(store, workers=2)
+        await runner.start()
+        job = store.submit(["a", "b", "a", "boom"])
+        runner.notify()
+        for _ in range(200):
+            if store.job(job)["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert sorted(runs) == ["a", "b", "boom"]
+    results = store.results(job)
+    assert [r["status"] for r in results] == ["done", "done", "done", "failed"]
+    assert results[2]["result"]["response"] == "A" and results[2]["deduped"]
+    assert results[3]["error"] == "agent crashed"
@@ -0,0 +1,74 @@
+# test_limiter.py
+# AuditLimiter: slots, queue-full 429, queue-timeout 503, Retry-After.
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.limiter import AuditLimiter
+
+
+def test_slots_are_reused():
+    limiter = AuditLimiter(concurrency=2, queue_max=10, queue_timeout=1)
+
+    async def main():
+        running = []
+
+        async def audit(n):
+            async with limiter.slot():
+                running.append(limiter.active)
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(audit(n) for n in range(6)))
+        return running
+
+    running = asyncio.run(main())
+    assert max(running) == 2
+    assert (limiter.active, limiter.waiting, limiter.completed) == (0, 0, 6)
+
+
+def test_full_queue_is_rejected_with_429():
+    limiter = AuditLimiter(concurrency=1, queue_max=1, queue_timeout=5)
+
+    async def main():
+        started = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire()
+        limiter.release(started)
+        limiter.release(await waiter)
+        return exc.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert limiter.rejected == 1
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_waiting_too_long_gives_503():
+    limiter = AuditLimiter(concurrency=1, queue_max=5, queue_timeout=0.05)
+
+    async def main():
+        started = await limiter.acquire()
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire(timeout=10)  # capped at queue_timeout
+        limiter.release(started)
+        return exc.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+    assert limiter.timed_out == 1
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_retry_after_follows_queue_and_duration():
+    limiter = AuditLimiter(concurrency=2, queue_max=10, queue_timeout=1)
+    assert limiter.retry_after() == 3  # 5 s default average, half a slot
+    limiter._avg_s = 10.0
+    limiter.waiting = 3
+    assert limiter.retry_after() == 20
+    limiter._avg_s = 0.01
+    assert limiter.retry_after() == 1
@@ -0,0 +1,213 @@
+# test_llm_pool.py
+# Endpoint choice (load counts queued requests), slots, failover and
+# cooldown, and micro-batched completions, with fake OpenAI clients (and the
+# stub LLM for one batched round-trip).
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.agent import llm_pool
+from app.agent.llm_pool import Endpoint, LLMPool, parse_endpoints
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.prompts = []
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        if "prompt" in kwargs:
+            # /completions: one choice per prompt, like vLLM
+            prompts = kwargs["prompt"] if isinstance(kwargs["prompt"], list) else [kwargs["prompt"]]
+            self.prompts.append(kwargs["prompt"])
+            await asyncio.sleep(self.delay)
+            return SimpleNamespace(choices=[SimpleNamespace(index=i, text=f"summary of {p}")
+                                            for i, p in reversed(list(enumerate(prompts)))])
+        return self._chunks()
+
+    async def _chunks(self):
+        for chunk in ("a", "b"):
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.completions = FakeCompletions(**kwargs)
+        self.chat = self
+
+
+def _install(endpoint, **kwargs):
+    # Must run inside the loop that will use it (state is per event loop)
+    client = FakeClient(**kwargs)
+    endpoint._per_loop[asyncio.get_running_loop()] = (client, asyncio.Semaphore(endpoint.limit))
+    return client.completions
+
+
+def _connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+
+
+async def _drain(pool):
+    return [chunk async for chunk in pool.stream([{"role": "user", "content": "hi"}])]
+
+
+def test_parse_endpoints():
+    a, b = parse_endpoints("http://gpu1/v1|qwen3:8b|4, http://gpu2/v1|||batch")
+    assert (a.url, a.model, a.limit, a.batch) == ("http://gpu1/v1", "qwen3:8b", 4, False)
+    assert (b.url, b.model, b.limit, b.batch) == (
+        "http://gpu2/v1", llm_pool.DEFAULT_LLM_MODEL, llm_pool.DEFAULT_CONCURRENCY, True)
+
+
+def test_queued_requests_count_as_load():
+    a, b = Endpoint("http://a", limit=1), Endpoint("http://b", limit=1)
+    pool = LLMPool([a, b])
+
+    async def main():
+        _install(a)
+        async with a.slot():
+            waiter = asyncio.create_task(a.slot().__aenter__())
+            await asyncio.sleep(0)
+            assert (a.in_flight, a.waiting) == (1, 1)
+            assert a.load() == 2.0
+            b.in_flight = 1  # busy, but nobody queued behind it
+            assert pool._pick([]) is b
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert (a.in_flight, a.waiting) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_burst_is_spread_over_endpoints():
+    endpoints = [Endpoint("http://a", limit=1), Endpoint("http://b", limit=1)]
+    pool = LLMPool(endpoints)
+
+    async def main():
+        completions = [_install(e, delay=0.02) for e in endpoints]
+        results = await asyncio.gather(*(_drain(pool) for _ in range(6)))
+        assert results == [["a", "b"]] * 6
+        return [c.calls for c in completions]
+
+    # Without the queued requests in the load, ties kept piling onto the first endpoint
+    assert asyncio.run(main()) == [3, 3]
+    assert [(e.in_flight, e.waiting, e.requests) for e in endpoints] == [(0, 0, 3), (0, 0, 3)]
+
+
+def test_failover_and_cooldown(monkeypatch):
+    monkeypatch.setattr(llm_pool, "FAILURE_THRESHOLD", 2)
+    down, up = Endpoint("http://down", limit=4), Endpoint("http://up", limit=4)
+    pool = LLMPool([down, up])
+
+    async def main():
+        broken = _install(down, error=_connection_error())
+        working = _install(up)
+        for _ in range(3):
+            assert await _drain(pool) == ["a", "b"]
+        return broken.calls, working.calls
+
+    # Tried first while tied, then skipped once cooling down
+    broken_calls, working_calls = asyncio.run(main())
+    assert broken_calls == 2 and working_calls == 3
+    assert not down.available(llm_pool.time.monotonic())
+    assert pool.stats()["endpoints"][0]["errors"] == 2
+
+
+def test_all_endpoints_failing_raises_the_last_error():
+    pool = LLMPool([Endpoint("http://a"), Endpoint("http://b")])
+
+    async def main():
+        for e in pool.endpoints:
+            _install(e, error=_connection_error())
+        with pytest.raises(openai.APIConnectionError):
+            await _drain(pool)
+
+    asyncio.run(main())
+    assert [e.requests for e in pool.endpoints] == [1, 1]
+
+
+def test_concurrent_summaries_are_coalesced():
+    plain, batching = Endpoint("http://plain", limit=4), Endpoint("http://vllm", limit=4, batch=True)
+    pool = LLMPool([plain, batching])
+
+    async def main():
+        plain_calls, batch_calls = _install(plain), _install(batching)
+        texts = await asyncio.gather(*(pool.complete(f"report {i}") for i in range(5)))
+        return texts, plain_calls, batch_calls
+
+    texts, plain_calls, batch_calls = asyncio.run(main())
+    assert texts == [f"summary of report {i}" for i in range(5)]
+    # One request with every prompt, and only to the endpoint that takes lists
+    assert batch_calls.prompts == [[f"report {i}" for i in range(5)]]
+    assert plain_calls.calls == 0
+    assert pool.stats()["batched_requests"] == 1 and pool.stats()["batched_prompts"] == 5
+
+
+def test_full_batch_is_sent_before_the_window_closes(monkeypatch):
+    monkeypatch.setattr(llm_pool, "BATCH_MAX", 3)
+    monkeypatch.setattr(llm_pool, "BATCH_WINDOW", 10)
+    pool = LLMPool([Endpoint("http://vllm", batch=True)])
+
+    async def main():
+        calls = _install(pool.endpoints[0])
+        texts = await asyncio.wait_for(asyncio.gather(*(pool.complete(str(i)) for i in range(3))), 1)
+        return texts, calls
+
+    texts, calls = asyncio.run(main())
+    assert texts == ["summary of 0", "summary of 1", "summary of 2"]
+    assert calls.prompts == [["0", "1", "2"]]
+
+
+def test_different_settings_are_separate_batches():
+    pool = LLMPool([Endpoint("http://vllm", batch=True)])
+
+    async def main():
+        calls = _install(pool.endpoints[0])
+        await asyncio.gather(pool.complete("a"), pool.complete("b", max_tokens=16), pool.complete("c"))
+        return calls
+
+    assert sorted(asyncio.run(main()).prompts) == [["a", "c"], ["b"]]
+
+
+def test_batch_error_reaches_every_caller():
+    pool = LLMPool([Endpoint("http://vllm", batch=True)])
+
+    async def main():
+        _install(pool.endpoints[0], error=_connection_error())
+        return await asyncio.gather(*(pool.complete(str(i)) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, openai.APIConnectionError) for r in results)
+
+
+def test_without_batch_endpoints_prompts_go_one_by_one():
+    pool = LLMPool([Endpoint("http://ollama")])
+
+    async def main():
+        calls = _install(pool.endpoints[0])
+        texts = await asyncio.gather(pool.complete("a"), pool.complete("b"))
+        return texts, calls
+
+    texts, calls = asyncio.run(main())
+    assert texts == ["summary of a", "summary of b"]
+    assert sorted(calls.prompts) == ["a", "b"]
+    assert pool.stats()["batched_requests"] == 0
+
+
+def test_batched_round_trip_through_the_stub(llm):
+    pool = LLMPool([Endpoint(f"{llm.url}/v1", model="stub", batch=True)])
+
+    async def main():
+        return await asyncio.gather(*(pool.complete(f"block {i}") for i in range(4)))
+
+    texts = asyncio.run(main())
+    assert [t.rsplit(": ", 1)[1] for t in texts] == [f"block {i}" for i in range(4)]
+    assert pool.stats()["batched_requests"] == 1
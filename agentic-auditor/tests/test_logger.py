@@ -0,0 +1,186 @@
+# test_logger.py
+# Queued logging: the writer thread flushes what is queued on stop, keeps
+# records in order across batches, a full queue drops instead of blocking,
+# and the orjson and json encoders write the same lines.
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+from app.core import logger as log
+from app.core.logger import BatchWriter, DebugSampler, JsonFormatter, QueueHandler, truncate
+
+
+class Stream(io.StringIO):
+    """Counts write() calls: one per batch."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class PlainFormatter(logging.Formatter):
+    def format(self, record):
+        return record.getMessage()
+
+
+@pytest.fixture
+def pipeline():
+    """A logger wired to its own queue, handler and (not yet started) writer."""
+    log_queue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    writer = BatchWriter(log_queue, Stream(), PlainFormatter())
+    writer.handler = handler
+    logger = logging.getLogger(f"test-logger-{id(handler)}")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.handlers = [handler]
+    yield logger, handler, writer
+    writer.stop()
+    logger.handlers = []
+
+
+def _lines(writer):
+    return writer.stream.getvalue().splitlines()
+
+
+def test_queued_records_are_written_on_stop(pipeline):
+    logger, handler, writer = pipeline
+    for i in range(50):
+        logger.info("record %d", i)
+    # Nothing written until the writer runs
+    assert writer.stream.getvalue() == ""
+    writer.start()
+    writer.stop()
+    assert _lines(writer) == [f"record {i}" for i in range(50)]
+    assert writer._thread is None
+
+
+def test_batches_keep_the_order(pipeline):
+    logger, handler, writer = pipeline
+    writer.batch_max = 7
+    for i in range(100):
+        logger.info("record %d", i)
+    writer.start()
+    writer.stop()
+    assert _lines(writer) == [f"record {i}" for i in range(100)]
+    # 100 records in batches of at most 7 (the stop marker shares the last)
+    assert writer.stream.writes == 15
+
+
+def test_order_is_kept_while_the_writer_runs(pipeline):
+    logger, handler, writer = pipeline
+    writer.batch_max = 16
+    writer.start()
+    threads = [threading.Thread(target=lambda t=t: [logger.info("t%d %d", t, i) for i in range(200)])
+               for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.stop()
+    lines = _lines(writer)
+    assert len(lines) == 800
+    for t in range(4):
+        assert [line for line in lines if line.startswith(f"t{t} ")] == [f"t{t} {i}" for i in range(200)]
+
+
+def test_full_queue_drops_without_blocking(pipeline):
+    logger, handler, writer = pipeline
+    handler.max_size = 3
+    started = time.perf_counter()
+    for i in range(10):
+        logger.info("record %d", i)
+    # No writer is draining the queue: the caller must not wait on it
+    assert time.perf_counter() - started < 0.5
+    assert handler.dropped == 7
+    writer.formatter = JsonFormatter()
+    writer.start()
+    writer.stop()
+    lines = [json.loads(line) for line in _lines(writer)]
+    assert [line["message"] for line in lines[:3]] == ["record 0", "record 1", "record 2"]
+    assert lines[3]["level"] == "WARNING"
+    assert lines[3]["message"] == "7 log records dropped (queue full)"
+
+
+def test_message_is_rendered_by_the_caller(pipeline):
+    logger, handler, writer = pipeline
+    args = ["before"]
+    logger.info("value %s", args)
+    args[0] = "after"
+    writer.start()
+    writer.stop()
+    assert _lines(writer) == ["value ['before']"]
+
+
+def test_formatting_error_does_not_stop_the_writer(pipeline):
+    logger, handler, writer = pipeline
+
+    class Broken(PlainFormatter):
+        def format(self, record):
+            if "bad" in record.msg:
+                raise ValueError("nope")
+            return super().format(record)
+
+    writer.formatter = Broken()
+    logger.info("good 1")
+    logger.info("bad")
+    logger.info("good 2")
+    writer.start()
+    writer.stop()
+    lines = _lines(writer)
+    assert lines[0] == "good 1" and lines[2] == "good 2"
+    assert lines[1].startswith("log formatting failed: ValueError('nope')")
+
+
+@pytest.mark.skipif(log.orjson is None, reason="orjson not installed")
+def test_orjson_and_json_write_the_same_line(monkeypatch):
+    record = logging.makeLogRecord({
+        "name": "agent", "module": "tools", "funcName": "run", "levelno": logging.INFO,
+        "levelname": "INFO", "msg": "año %s → %d", "args": ("ñandú", 3), "created": 1_700_000_000.25,
+        "request_id": "req-1",
+    })
+    try:
+        raise KeyError("missing")
+    except KeyError:
+        record.exc_info = sys.exc_info()
+    lines = []
+    for dumps in (log._orjson_dumps, log._json_dumps):
+        monkeypatch.setattr(log, "_dumps", dumps)
+        lines.append(JsonFormatter().format(record))
+    assert lines[0] == lines[1]
+    data = json.loads(lines[0])
+    assert data["timestamp"] == "2023-11-14T22:13:20.250000Z"
+    assert data["message"] == "año ñandú → 3" and data["request_id"] == "req-1"
+    assert "KeyError" in data["exception"]
+    # Values json cannot encode go through str() on both paths
+    assert log._orjson_dumps({"x": object}) == log._json_dumps({"x": object})
+
+
+def test_truncate():
+    assert truncate("abc", limit=5) == "abc"
+    assert truncate(None) is None
+    assert truncate("x" * 10, limit=4) == "xxxx... [+6 chars]"
+
+
+def test_debug_sampler():
+    sampler = DebugSampler(rate=0.25)
+
+    def record(level, line):
+        return logging.makeLogRecord({"levelno": level, "pathname": "f.py", "lineno": line})
+
+    kept = [sampler.filter(record(logging.DEBUG, 1)) for _ in range(8)]
+    assert kept == [True, False, False, False] * 2
+    # Per call site, and other levels always pass
+    assert sampler.filter(record(logging.DEBUG, 2))
+    assert all(sampler.filter(record(logging.INFO, 1)) for _ in range(3))
+    assert not DebugSampler(rate=0).filter(record(logging.DEBUG, 1))
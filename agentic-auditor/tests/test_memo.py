@@ -0,0 +1,197 @@
+# test_memo.py
+# Answer memo: the backend fingerprint (high-water probes), exact and
+# semantic lookups (entities must match), invalidation when the fingerprint
+# moves, TTL and LRU.
+import asyncio
+
+import pytest
+
+from app.agent import memo
+from app.agent.memo import AnswerMemo, Fingerprinter, _high_water
+
+ANSWER = {"response": "chain is valid", "tools": [], "steps": 2}
+
+
+def _sequence(length):
+    probes = []
+
+    async def exists(i):
+        probes.append(i)
+        return 0 <= i < length
+    return exists, probes
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 7, 100, 1025])
+@pytest.mark.parametrize("known", [0, 1, 5, 100, 5000])
+def test_high_water_finds_the_length(length, known):
+    exists, _ = _sequence(length)
+    assert asyncio.run(_high_water(exists, known)) == length
+
+
+def test_high_water_is_cheap_when_nothing_changed():
+    exists, probes = _sequence(10_000)
+    assert asyncio.run(_high_water(exists, 10_000)) == 10_000
+    assert probes == [9_999, 10_000]
+
+
+def test_high_water_growth_costs_log_delta():
+    exists, probes = _sequence(10_000 + 1000)
+    assert asyncio.run(_high_water(exists, 10_000)) == 11_000
+    assert len(probes) <= 2 * 11 + 2
+
+
+class FakeBackend:
+    """Blocks, events and models behind request_async, as Fingerprinter reads them."""
+
+    def __init__(self, blocks, events, models=3):
+        self.blocks = [f"hash-{i}" for i in range(blocks)]
+        self.events = events
+        self.models = models
+        self.down = False
+
+    async def request_async(self, method, path, endpoint, params=None):
+        if self.down:
+            raise ConnectionError("backend down")
+        if endpoint == "blocks":
+            i = int(path.rsplit("/", 1)[1])
+            body = {"index": i, "hash": self.blocks[i]} if i < len(self.blocks) else {"error": "Block not found"}
+        else:
+            count = self.events if endpoint == "events" else self.models
+            body = [{"n": params["skip"]}] if params["skip"] < count else []
+        return Response(body)
+
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class NoCheckpoint:
+    def load(self):
+        return None
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = FakeBackend(blocks=40, events=7)
+    monkeypatch.setattr(memo, "request_async", backend.request_async)
+    monkeypatch.setattr(memo, "FINGERPRINT_TTL", 0)
+    return backend
+
+
+def test_fingerprint_tracks_chain_tip_and_events(backend):
+    fingerprinter = Fingerprinter(NoCheckpoint())
+    first = asyncio.run(fingerprinter.fingerprint())
+    assert first == "40:hash-39:7:3"
+    assert asyncio.run(fingerprinter.fingerprint()) == first
+
+    backend.events += 1
+    assert asyncio.run(fingerprinter.fingerprint()) == "40:hash-39:8:3"
+    backend.blocks.append("hash-40")
+    assert asyncio.run(fingerprinter.fingerprint()) == "41:hash-40:8:3"
+    # A new model version is registered
+    backend.models += 1
+    assert asyncio.run(fingerprinter.fingerprint()) == "41:hash-40:8:4"
+    # Backend reset to a shorter chain
+    backend.blocks = backend.blocks[:3]
+    assert asyncio.run(fingerprinter.fingerprint()) == "3:hash-2:8:4"
+
+
+def _memo(backend, **kwargs):
+    return AnswerMemo(fingerprinter=Fingerprinter(NoCheckpoint()), **kwargs)
+
+
+def test_exact_and_semantic_hits(backend):
+    m = _memo(backend, similarity=0.6)
+    fp = asyncio.run(m.current_fingerprint())
+    m.put("Verify the chain, please", fp, ANSWER)
+
+    assert m.get("verify   THE chain please!", fp)["cached"] == "exact"
+    semantic = m.get("can you verify the whole chain", fp)
+    assert semantic["cached"] == "semantic" and semantic["response"] == ANSWER["response"]
+    assert m.get("list anomalies for model x", fp) is None
+    assert m.stats()["hits_exact"] == m.stats()["hits_semantic"] == m.stats()["misses"] == 1
+
+
+def test_ids_must_match_exactly(backend):
+    m = _memo(backend, similarity=0.1)
+    fp = asyncio.run(m.current_fingerprint())
+    m.put("Show block 42", fp, ANSWER)
+    assert m.get("Show block 43", fp) is None
+    assert m.get("block 42 show me", fp)["cached"] == "semantic"
+
+
+def test_entity_names_must_match_exactly(backend):
+    m = _memo(backend)
+    fp = asyncio.run(m.current_fingerprint())
+    question = "Summarize payment bursts, high costs and empty links for agent {} over the last week"
+    m.put(question.format("alice"), fp, ANSWER)
+    assert m.get(question.format("bob"), fp) is None
+    assert m.get("summarize payment bursts high costs and empty links for agent alice over last week",
+                 fp)["cached"] == "semantic"
+    m.put("List provenance for models llama and mistral", fp, ANSWER)
+    assert m.get("List provenance for models llama and falcon", fp) is None
+    assert m.get("list the provenance for models llama and mistral", fp)["cached"] == "semantic"
+
+
+def test_new_model_version_drops_answers(backend):
+    m = _memo(backend)
+    fp = asyncio.run(m.current_fingerprint())
+    m.put("List models", fp, ANSWER)
+    backend.models += 1
+    assert asyncio.run(m.current_fingerprint()) != fp
+    assert m.stats()["entries"] == 0
+
+
+def test_new_data_drops_answers(backend):
+    m = _memo(backend)
+    fp = asyncio.run(m.current_fingerprint())
+    m.put("Verify the chain", fp, ANSWER)
+    backend.blocks.append("hash-new")
+    new_fp = asyncio.run(m.current_fingerprint())
+    assert new_fp != fp
+    assert m.get("Verify the chain", new_fp) is None
+    assert m.get("Verify the chain", fp) is None
+    # An answer computed against the old data is not stored
+    m.put("Verify the chain", fp, ANSWER)
+    assert m.stats()["entries"] == 0
+    assert m.stats()["invalidations"] == 1
+
+
+def test_unreachable_backend_bypasses_the_memo(backend):
+    m = _memo(backend)
+    backend.down = True
+    assert asyncio.run(m.current_fingerprint()) is None
+    m.put("Verify the chain", None, ANSWER)
+    assert m.get("Verify the chain", None) is None
+    assert m.stats()["bypassed"] == 1
+
+
+def test_ttl_and_lru(backend, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(memo, "time", clock)
+    m = _memo(backend, ttl=10, max_entries=2, similarity=1.0)
+    fp = asyncio.run(m.current_fingerprint())
+    m.put("first question", fp, ANSWER)
+    m.put("second question", fp, ANSWER)
+    m.get("first question", fp)
+    m.put("third question", fp, ANSWER)  # evicts "second"
+    assert m.get("second question", fp) is None
+    assert m.get("first question", fp) is not None
+    clock.now += 11
+    assert m.get("first question", fp) is None
+    assert m.stats()["evictions"] == 1
@@ -0,0 +1,136 @@
+# test_merkle.py
+# Merkle roots and proofs. Roots are checked against merkle-wasm's
+# testdata/roots.txt, written by the Rust implementation.
+import hashlib
+import os
+
+import pytest
+
+from app.agent import merkle
+from app.agent.merkle import ChainMerkleIndex, MerkleTree, inclusion_proof, merkle_root, verify_proof
+
+ROOTS = os.path.join(os.path.dirname(__file__), "..", "..", "merkle-wasm", "testdata", "roots.txt")
+
+
+def _leaves(n):
+    return [hashlib.sha256(f"leaf-{i}".encode()).hexdigest() for i in range(n)]
+
+
+def _wasm_roots():
+    with open(ROOTS) as f:
+        rows = [line.split() for line in f if line.strip() and not line.startswith("#")]
+    return [(int(count), root) for count, root in rows]
+
+
+@pytest.mark.parametrize("count,root", _wasm_roots())
+def test_root_matches_merkle_wasm(count, root):
+    assert merkle_root(_leaves(count)) == root
+
+
+def test_parallel_layers_give_the_same_root(monkeypatch):
+    leaves = _leaves(1025)
+    expected = merkle_root(leaves)
+    monkeypatch.setattr(merkle, "PARALLEL_PAIRS", 4)
+    monkeypatch.setattr(merkle, "MERKLE_WORKERS", 2)
+    assert merkle_root(leaves) == expected
+
+
+def test_single_leaf_is_its_own_root():
+    [leaf] = _leaves(1)
+    tree = MerkleTree.from_hex([leaf])
+    assert tree.root == leaf
+    assert tree.proof(0) == []
+    assert verify_proof(leaf, [], tree.root)
+
+
+def test_odd_node_is_paired_with_itself():
+    a, b, c = _leaves(3)
+    h = lambda x, y: hashlib.sha256(bytes.fromhex(x) + bytes.fromhex(y)).hexdigest()  # noqa: E731
+    tree = MerkleTree.from_hex([a, b, c])
+    assert tree.root == h(h(a, b), h(c, c))
+    assert tree.proof(2) == [
+        {"hash": c, "position": "right"},
+        {"hash": h(a, b), "position": "left"},
+    ]
+
+
+@pytest.mark.parametrize("count", [2, 3, 5, 6, 7, 9, 16, 17, 33])
+def test_every_proof_verifies(count):
+    leaves = _leaves(count)
+    tree = MerkleTree.from_hex(leaves)
+    for index, leaf in enumerate(leaves):
+        assert tree.leaf(index) == leaf
+        assert verify_proof(leaf, tree.proof(index), tree.root)
+
+
+def test_proof_rejects_wrong_leaf_path_or_root():
+    leaves = _leaves(6)
+    tree = MerkleTree.from_hex(leaves)
+    proof = tree.proof(4)
+    assert not verify_proof(leaves[3], proof, tree.root)
+    assert not verify_proof(leaves[4], proof, merkle_root(leaves[:5]))
+    flipped = [dict(step) for step in proof]
+    flipped[0]["position"] = "left" if flipped[0]["position"] == "right" else "right"
+    assert not verify_proof(leaves[4], flipped, tree.root)
+    # Roots anchored on chain come 0x-prefixed
+    assert verify_proof(leaves[4], proof, "0x" + tree.root.upper())
+
+
+@pytest.mark.parametrize("index", [-1, 5, 100])
+def test_out_of_range_index(index):
+    with pytest.raises(IndexError):
+        MerkleTree.from_hex(_leaves(5)).proof(index)
+
+
+def test_invalid_leaves():
+    with pytest.raises(ValueError):
+        MerkleTree(b"")
+    with pytest.raises(ValueError):
+        MerkleTree(b"\x00" * 33)
+
+
+# ---------------------------------------------------------------------------
+# Chain index (against the mock backend)
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def chain(ernest, monkeypatch):
+    index = ChainMerkleIndex(max_trees=2)
+    monkeypatch.setattr(merkle, "chain_index", index)
+    return index, [b["hash"] for b in ernest.blocks]
+
+
+def test_inclusion_proof_of_block(chain):
+    index, hashes = chain
+    result = inclusion_proof(block_index=7)
+    assert result["proof_valid"]
+    assert result["root"] == merkle_root(hashes)
+    assert result["leaf"] == hashes[7]
+
+
+def test_inclusion_proof_against_anchor(chain, ernest):
+    index, hashes = chain
+    anchored = merkle_root(hashes[:101])
+    block = ernest.blocks[42]
+    result = inclusion_proof(inference_id=block["data"]["inferenceId"], merkle_root="0x" + anchored,
+                             anchored_index=100)
+    assert result["block_index"] == 42
+    assert result["leaf_count"] == 101
+    assert result["root_matches"] and result["included"]
+
+    other = inclusion_proof(block_index=42, merkle_root=merkle_root(hashes[:50]), anchored_index=100)
+    assert not other["root_matches"] and not other["included"]
+
+
+def test_inclusion_proof_errors(chain):
+    index, hashes = chain
+    assert "error" in inclusion_proof()
+    assert "error" in inclusion_proof(inference_id="no-such-inference")
+    assert "error" in inclusion_proof(block_index=20, anchored_index=9)
+
+
+def test_cached_trees_are_bounded(chain):
+    index, hashes = chain
+    for anchored in (10, 20, 30, 40):
+        index.tree(anchored)
+    assert list(index._trees) == [30, 40]
@@ -0,0 +1,47 @@
+# test_metrics.py
+# Prometheus exposition and label cardinality.
+import asyncio
+
+from app.agent import run_agent
+from app.core import metrics
+from app.core.metrics import Counter, Histogram, Registry
+
+
+def test_counter_and_histogram_render():
+    registry = Registry()
+    calls = registry.counter("t_calls_total", "Calls", ("tool",))
+    latency = registry.histogram("t_seconds", "Latency", ("tool",), buckets=(0.1, 1))
+    calls.inc(tool='a"b')
+    calls.inc(2, tool='a"b')
+    latency.observe(0.05, tool="x")
+    latency.observe(5, tool="x")
+    text = registry.render()
+    assert 't_calls_total{tool="a\\"b"} 3' in text
+    assert 't_seconds_bucket{tool="x",le="0.1"} 1' in text
+    assert 't_seconds_bucket{tool="x",le="+Inf"} 2' in text
+    assert 't_seconds_count{tool="x"} 2' in text
+
+
+def test_label_sets_are_capped():
+    counter = Counter("c", "C", ("model", "outcome"), max_series=3)
+    for i in range(10):
+        counter.inc(model=f"model-{i}", outcome="ok")
+    counter.inc(model="model-0", outcome="ok")
+    assert counter.value(model="model-0", outcome="ok") == 2
+    assert counter.value(model="other", outcome="other") == 7
+    assert len(counter._values) == 4
+
+    histogram = Histogram("h", "H", ("tool",))
+    histogram.max_series = 1
+    histogram.observe(1, tool="a")
+    histogram.observe(1, tool="b")
+    assert set(histogram._values) == {("a",), ("other",)}
+
+
+def test_unknown_tools_are_labelled_unknown():
+    call = {"id": "call_0", "function": {"name": "drop_all_tables_please", "arguments": "{}"}}
+    before = metrics.tool_calls.value(tool="unknown", outcome="error")
+    result = asyncio.run(run_agent._run_tool(call, asyncio.Semaphore(1)))
+    assert "error" in result["result"]
+    assert metrics.tool_calls.value(tool="unknown", outcome="error") == before + 1
+    assert "drop_all_tables_please" not in metrics.registry.render()
@@ -0,0 +1,87 @@
+# test_router.py
+# Router patterns: plain tool requests are routed with their arguments,
+# open-ended questions fall through to the LLM. Plus the answer templates.
+import pytest
+
+from app.agent import router
+from app.agent.router import RouterStats, render, route
+
+ROOT = "ab" * 32
+
+
+@pytest.mark.parametrize("message,intent,tool,args", [
+    ("health", "health", "healthcheck", {}),
+    ("  Please, healthcheck?  ", "health", "healthcheck", {}),
+    ("is the backend up", "health", "healthcheck", {}),
+    ("estado", "health", "healthcheck", {}),
+    ("verify the chain", "verify_chain", "verify_chain", {}),
+    ("Can you check the hash chain integrity?", "verify_chain", "verify_chain", {}),
+    ("verifica la cadena completa", "verify_chain", "verify_chain", {"full": True}),
+    ("validate chain from genesis", "verify_chain", "verify_chain", {"full": True}),
+    ("is the chain intact", "verify_chain", "verify_chain", {}),
+    ("get block 123", "get_block", "get_block", {"block_id": 123}),
+    ("show me block #7", "get_block", "get_block", {"block_id": 7}),
+    ("bloque 42", "get_block", "get_block", {"block_id": 42}),
+    ("list all models", "list_models", "list_models", {}),
+    ("show registered models", "list_models", "list_models", {}),
+    ("list events", "list_events", "list_events", {}),
+    ("show recent events for model llama3-8b", "list_events", "list_events", {"model_id": "llama3-8b"}),
+    ("provenance of model mistral-7b", "provenance", "provenance_by_model", {"model_id": "mistral-7b"}),
+    ("get the provenance for gpt:4.1", "provenance", "provenance_by_model", {"model_id": "gpt:4.1"}),
+    ("detect anomalies", "anomalies", "detect_anomalies", {}),
+    ("show suspicious agents", "anomalies", "detect_anomalies", {}),
+    ("prove block 12", "verify_inclusion", "verify_inclusion", {"block_index": 12}),
+    (f"verify inclusion of block #3 in root 0x{ROOT}", "verify_inclusion", "verify_inclusion",
+     {"block_index": 3, "merkle_root": f"0x{ROOT}"}),
+])
+def test_direct_requests_are_routed(message, intent, tool, args):
+    assert route(message) == (intent, tool, args)
+
+
+@pytest.mark.parametrize("message", [
+    "",
+    None,
+    "Is the backend healthy, and is anything unusual going on?",
+    "why is block 123 different from block 124",
+    "get block abc",
+    "verify the chain and list anomalies",
+    "which models produced the most events last week",
+    "health of model llama3",
+    "list events for model ",
+    "prove block 3 in root 0x1234",
+    "show anomalies for agent-7 since yesterday",
+])
+def test_open_questions_fall_back(message):
+    assert route(message) is None
+
+
+def test_stats_count_direct_and_fallback(monkeypatch):
+    stats = RouterStats()
+    monkeypatch.setattr(router, "router_stats", stats)
+    route("health")
+    route("health")
+    route("get block 1")
+    route("what happened today")
+    assert stats.stats() == {
+        "direct": 3,
+        "fallback": 1,
+        "direct_ratio": 0.75,
+        "by_intent": {"health": 2, "get_block": 1},
+    }
+
+
+def test_render_templates():
+    assert render("healthcheck", {}, "ALIVE") == "Backend is **ALIVE**."
+    invalid = render("verify_chain", {}, {
+        "valid": False, "error_count": 1, "blocks_checked": 10, "last_index": 9, "duration_ms": 3,
+        "errors": [{"kind": "hash_mismatch", "index": 4}],
+    })
+    assert "**INVALID**" in invalid and "hash_mismatch at #4" in invalid
+    block = render("get_block", {"block_id": 4}, {"index": 4, "hash": "h", "previousHash": "p",
+                                                 "data": {"type": "model_inference", "modelId": "m"}})
+    assert block.startswith("Block **#4** (model_inference)") and "- model: m" in block
+
+
+def test_render_errors_and_unexpected_shapes():
+    assert render("get_block", {}, {"error": "Block not found"}) == "`get_block` failed: Block not found"
+    assert render("verify_chain", {}, {"unexpected": True}).startswith("`verify_chain` result:")
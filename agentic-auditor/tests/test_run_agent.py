@@ -0,0 +1,86 @@
+# test_run_agent.py
+# Tool calls of one turn: concurrency, ordering and cancellation when the run
+# ends early.
+import asyncio
+import json
+
+from app.agent import run_agent
+
+
+def _call(n, name="slow"):
+    return {"id": f"call_{n}", "type": "function", "function": {"name": name, "arguments": json.dumps({"n": n})}}
+
+
+def _tools(monkeypatch, delay):
+    state = {"started": 0, "cancelled": 0, "finished": 0}
+
+    async def slow(n):
+        state["started"] += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        state["finished"] += 1
+        return {"n": n}
+
+    monkeypatch.setitem(run_agent.ASYNC_TOOLS_MAP, "slow", slow)
+    return state
+
+
+def test_tool_calls_run_concurrently_in_order(monkeypatch):
+    state = _tools(monkeypatch, 0.2)
+
+    async def main():
+        start = asyncio.get_running_loop().time()
+        results = await run_agent.execute_tool_calls([_call(n) for n in range(5)])
+        return results, asyncio.get_running_loop().time() - start
+
+    results, elapsed = asyncio.run(main())
+    assert [r["result"] for r in results] == [{"n": n} for n in range(5)]
+    assert state["finished"] == 5
+    assert elapsed < 0.8
+
+
+def test_closing_the_stream_cancels_running_tools(monkeypatch):
+    state = _tools(monkeypatch, 30)
+
+    async def completion(messages, deadline, tools=True, parent=None, step=None):
+        yield "message", {"role": "assistant", "content": None, "tool_calls": [_call(n) for n in range(3)]}
+
+    monkeypatch.setattr(run_agent, "_stream_completion", completion)
+
+    async def main():
+        events = []
+
+        async def consume():
+            async for event in run_agent.run_agent_stream("check", memo=False, router=False):
+                events.append(event)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)  # tools are now waiting on the backend
+        assert [e["event"] for e in events].count("tool_start") == 3
+        # The SSE client went away: Starlette cancels the response task
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        # Checked before asyncio.run() cancels whatever is left at exit
+        assert state["cancelled"] == 3
+
+    asyncio.run(main())
+    assert state["started"] == 3
+    assert state["finished"] == 0
+
+
+def test_deadline_cancels_running_tools(monkeypatch):
+    state = _tools(monkeypatch, 30)
+
+    async def main():
+        try:
+            await asyncio.wait_for(run_agent.execute_tool_calls([_call(n) for n in range(2)]), timeout=0.1)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.05)
+        assert state["cancelled"] == 2
+
+    asyncio.run(main())
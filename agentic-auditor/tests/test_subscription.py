@@ -0,0 +1,232 @@
+# test_subscription.py
+# Event subscription: cursor polling (after=, with the skip fallback) and
+# fan-out to consumers under the "block" and "latest" policies.
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.agent import subscription
+from app.agent.subscription import Consumer, EventSubscription
+
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeBackend:
+    """/api/events behind request_async. positions=False serves events without
+    blockNumber/logIndex; paging=False ignores skip/after like an old backend."""
+
+    def __init__(self, n, positions=True, paging=True):
+        self.events = []
+        self.positions = positions
+        self.paging = paging
+        self.calls = []
+        self.extend(n)
+
+    def extend(self, n):
+        for _ in range(n):
+            i = len(self.events)
+            event = {"n": i}
+            if self.positions:
+                event.update(blockNumber=100 + i // 3, logIndex=i % 3)
+            self.events.append(event)
+
+    async def request_async(self, method, path, endpoint, params=None):
+        self.calls.append(dict(params))
+        if not self.paging:
+            return Response(list(self.events))
+        start = params.get("skip", 0)
+        if "after" in params:
+            block, log = (int(x) for x in params["after"].split(":"))
+            start = next((i for i, e in enumerate(self.events)
+                          if (e["blockNumber"], e["logIndex"]) > (block, log)), len(self.events))
+        return Response(self.events[start:start + params["limit"]])
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    def install(*args, **kwargs):
+        fake = FakeBackend(*args, **kwargs)
+        monkeypatch.setattr(subscription, "request_async", fake.request_async)
+        return fake
+    return install
+
+
+def _drain(sub):
+    """Poll until the backend has nothing new; returns the page sizes."""
+    async def main():
+        sizes = []
+        while (n := await sub.poll()):
+            sizes.append(n)
+        return sizes
+    return asyncio.run(main())
+
+
+def _collector(policy="block", **kwargs):
+    seen = []
+    return Consumer("c", lambda events, start: seen.append((start, [e["n"] for e in events])),
+                    policy=policy, **kwargs), seen
+
+
+@pytest.mark.skipif("SUBSCRIPTION_ENABLED" in os.environ, reason="set in the environment")
+def test_disabled_by_default():
+    assert subscription.SUBSCRIPTION_ENABLED is False
+
+
+def test_polls_by_cursor_after_the_first_page(backend):
+    fake = backend(7)
+    sub = EventSubscription(page_size=3)
+    assert _drain(sub) == [3, 3, 1]
+    assert [c.get("skip") for c in fake.calls] == [0, None, None, None]
+    assert [c.get("after") for c in fake.calls] == [None, "100:2", "101:2", "102:0"]
+    assert sub.high_water == 7
+    assert sub.stats()["cursor"] == "102:0"
+
+    fake.extend(2)
+    assert _drain(sub) == [2]
+    assert fake.calls[-2]["after"] == "102:0"
+    assert sub.high_water == 9
+
+
+def test_resumes_from_a_mark_with_skip(backend):
+    fake = backend(5)
+    sub = EventSubscription(start=3, page_size=10)
+    assert _drain(sub) == [2]
+    assert fake.calls[0] == {"limit": 10, "skip": 3}
+    assert fake.calls[1] == {"limit": 10, "after": "101:1"}
+
+
+def test_events_without_positions_keep_using_skip(backend):
+    fake = backend(5, positions=False)
+    sub = EventSubscription(page_size=2)
+    assert _drain(sub) == [2, 2, 1]
+    assert [c["skip"] for c in fake.calls] == [0, 2, 4, 5]
+    assert sub.cursor is None
+
+
+def test_backend_that_ignores_paging(backend):
+    fake = backend(5, paging=False)
+    sub = EventSubscription(page_size=2)
+    assert _drain(sub) == [5]
+    fake.extend(3)
+    assert _drain(sub) == [2, 1]
+    assert sub.high_water == 8
+
+
+def test_every_block_consumer_gets_every_batch(backend):
+    backend(7)
+    a, seen_a = _collector()
+    b, seen_b = _collector()
+
+    async def main():
+        sub = EventSubscription([a, b], page_size=3)
+        for c in sub.consumers:
+            c.queue = asyncio.Queue(maxsize=c.max_batches)
+        workers = [asyncio.create_task(c.run()) for c in sub.consumers]
+        while await sub.poll():
+            pass
+        while a.position != 7 or b.position != 7:
+            await asyncio.sleep(0.01)
+        for w in workers:
+            w.cancel()
+
+    asyncio.run(main())
+    assert seen_a == seen_b == [(0, [0, 1, 2]), (3, [3, 4, 5]), (6, [6])]
+    assert a.stats()["batches"] == 3 and a.stats()["events"] == 7 and a.dropped == 0
+
+
+def test_full_block_queue_makes_the_poller_wait(backend):
+    backend(6)
+    consumer = Consumer("slow", lambda events, start: time.sleep(0.05), max_batches=1)
+
+    async def main():
+        sub = EventSubscription([consumer], page_size=1)
+        consumer.queue = asyncio.Queue(maxsize=1)
+        worker = asyncio.create_task(consumer.run())
+        while await sub.poll():
+            pass
+        while consumer.position != 6:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(main())
+    assert consumer.batches == 6 and consumer.dropped == 0
+    assert consumer.blocked_s > 0
+
+
+def test_latest_consumer_drops_superseded_batches(backend):
+    backend(5)
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def fn(events, start):
+        seen.append(start)
+        started.set()
+        release.wait(5)
+
+    consumer = Consumer("latest", fn, policy="latest")
+
+    async def main():
+        sub = EventSubscription([consumer], page_size=1)
+        consumer.queue = asyncio.Queue(maxsize=consumer.max_batches)
+        worker = asyncio.create_task(consumer.run())
+        await sub.poll()
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        # The worker is busy with batch 0: the next four replace each other
+        while await sub.poll():
+            pass
+        release.set()
+        while consumer.position != 5:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(main())
+    assert seen == [0, 4]
+    assert consumer.dropped == 3
+    assert consumer.stats()["batches"] == 2
+
+
+def test_failing_consumer_does_not_stop_the_others(backend):
+    backend(4)
+
+    def fail(events, start):
+        raise RuntimeError("boom")
+
+    broken = Consumer("broken", fail)
+    ok, seen = _collector()
+
+    async def main():
+        sub = EventSubscription([broken, ok], page_size=2)
+        for c in sub.consumers:
+            c.queue = asyncio.Queue(maxsize=c.max_batches)
+        workers = [asyncio.create_task(c.run()) for c in sub.consumers]
+        while await sub.poll():
+            pass
+        while ok.position != 4 or broken.errors < 2:
+            await asyncio.sleep(0.01)
+        for w in workers:
+            w.cancel()
+
+    asyncio.run(main())
+    assert seen == [(0, [0, 1]), (2, [2, 3])]
+    assert broken.errors == 2 and broken.position is None
+    assert broken.stats()["last_error"] == "RuntimeError: boom"
+
+
+def test_unknown_policy_or_consumer():
+    with pytest.raises(ValueError):
+        Consumer("x", print, policy="sometimes")
+    with pytest.raises(ValueError):
+        subscription.build_consumers(["anomaly", "nope"])
@@ -0,0 +1,168 @@
+# test_tools.py
+# Paging (iter_pages / iter_pages_async), the list tools' summaries and the
+# sync/async tool variants, against a fake backend behind request().
+import asyncio
+
+import httpx
+import pytest
+
+from app.agent import tools
+from app.agent.cache import tool_cache
+from app.agent.summarize import StreamSummary, summarize
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            request = httpx.Request("GET", "http://ernest/")
+            raise httpx.HTTPStatusError("error", request=request,
+                                        response=httpx.Response(self.status_code, request=request))
+
+    def json(self):
+        return self.body
+
+
+def make_events(n):
+    return [{"type": "model_inference" if i % 2 else "agent_action", "modelId": f"m{i % 3}",
+             "timestamp": 1_700_000_000 + i, "latency_ms": i} for i in range(n)]
+
+
+class FakeBackend:
+    def __init__(self, events, paging=True):
+        self.events = events
+        self.paging = paging
+        self.calls = []
+        self.down = False
+
+    def request(self, method, path, endpoint, params=None, json=None):
+        self.calls.append((method, path, dict(params or {})))
+        if self.down:
+            raise httpx.ConnectError("backend down")
+        if path == "/health":
+            return Response({"status": "ok"})
+        if path.startswith("/api/blocks/"):
+            i = int(path.rsplit("/", 1)[1])
+            return Response({"index": i}) if i < 3 else Response({}, status_code=404)
+        if path == "/audit":
+            return Response({"ok": True}, status_code=201)
+        if not self.paging:
+            return Response(list(self.events))
+        skip, limit = params["skip"], params["limit"]
+        return Response(self.events[skip:skip + limit])
+
+    async def request_async(self, *args, **kwargs):
+        return self.request(*args, **kwargs)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    def install(events, **kwargs):
+        fake = FakeBackend(events, **kwargs)
+        monkeypatch.setattr(tools, "request", fake.request)
+        monkeypatch.setattr(tools, "request_async", fake.request_async)
+        tool_cache.invalidate()
+        return fake
+    yield install
+    tool_cache.invalidate()
+
+
+def _pages(**kwargs):
+    """iter_pages and iter_pages_async must agree: returns the items once."""
+    sync = list(tools.iter_pages("/api/events", "events", **kwargs))
+
+    async def collect():
+        return [item async for item in tools.iter_pages_async("/api/events", "events", **kwargs)]
+    assert asyncio.run(collect()) == sync
+    return sync
+
+
+def _skips(backend):
+    return [params["skip"] for _, _, params in backend.calls]
+
+
+def test_walks_every_page_without_a_limit(backend):
+    fake = backend(make_events(25))
+    assert _pages(page_size=10) == fake.events
+    # Last page is short: no extra request after it (sync then async)
+    assert _skips(fake) == [0, 10, 20] * 2
+
+
+def test_full_last_page_needs_one_empty_page(backend):
+    fake = backend(make_events(20))
+    assert _pages(page_size=10) == fake.events
+    assert _skips(fake) == [0, 10, 20] * 2
+
+
+@pytest.mark.parametrize("limit,skips", [(5, [0]), (10, [0]), (15, [0, 10]), (100, [0, 10, 20]), (0, [])])
+def test_limit_stops_paging(backend, limit, skips):
+    fake = backend(make_events(25))
+    assert _pages(page_size=10, limit=limit) == fake.events[:limit]
+    assert _skips(fake) == skips * 2
+
+
+def test_start_and_params(backend):
+    fake = backend(make_events(25))
+    assert _pages(page_size=10, start=7, limit=5, params={"since": 1, "until": None}) == fake.events[7:12]
+    assert fake.calls[0][2] == {"since": 1, "limit": 10, "skip": 7}
+
+
+def test_backend_that_ignores_paging(backend):
+    fake = backend(make_events(25), paging=False)
+    # The whole collection in one (over-long) page
+    assert _pages(page_size=10) == fake.events
+    assert _pages(page_size=25) == fake.events
+
+
+def test_list_events_summary(backend):
+    fake = backend(make_events(25))
+    result = tools.list_events(sample=3)
+    assert result == summarize(fake.events, 3)
+    assert result["count"] == 25
+    assert result["by_type"] == {"model_inference": 12, "agent_action": 13}
+    assert asyncio.run(tools.list_events_async(sample=3)) == result
+
+
+def test_type_filter_is_applied_after_the_limit(backend):
+    backend(make_events(25))
+    # limit bounds the events read; type is matched on those
+    result = tools.list_events(type="model_inference", limit=10)
+    assert result["count"] == 5 and result["by_type"] == {"model_inference": 5}
+    assert asyncio.run(tools.list_events_async(type="model_inference", limit=10)) == result
+    assert tools.list_events(type="model_inference", model_id="m1")["count"] == 4
+
+
+def test_stream_summary_latency_and_sample():
+    summary = StreamSummary(sample_size=2)
+    for event in make_events(101):
+        summary.add(event)
+    result = summary.result()
+    assert result["count"] == 101 and len(result["sample"]) == 2
+    assert result["latency_ms"]["p50"] == 50 and result["latency_ms"]["max"] == 100
+    assert result["time_range"]["first"] == "2023-11-14T22:13:20Z"
+
+
+def test_list_models_sends_model_id(backend):
+    fake = backend(make_events(3))
+    tools.list_models(model_id="m1")
+    assert fake.calls[0][2]["modelId"] == "m1"
+
+
+def test_sync_and_async_tools_agree(backend):
+    fake = backend(make_events(3))
+    assert tools.ernest_health() == asyncio.run(tools.ernest_health_async()) == "ALIVE"
+    assert tools.get_block(1) == asyncio.run(tools.get_block_async(1)) == {"index": 1}
+    missing = tools.get_block(9)
+    assert "error" in missing and asyncio.run(tools.get_block_async(9)).keys() == missing.keys()
+    assert tools.audit_inference("ok") == asyncio.run(tools.audit_inference_async("ok")) == {"status": 201}
+    assert fake.calls[-1][0] == "POST"
+
+    fake.down = True
+    assert tools.ernest_health() == asyncio.run(tools.ernest_health_async()) == "DOWN"
+    with pytest.raises(httpx.ConnectError):
+        tools.provenance_by_model("m1")
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(tools.provenance_by_model_async("m1"))
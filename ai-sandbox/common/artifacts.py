@@ -0,0 +1,157 @@
+# artifacts.py
+# Almacén local de artefactos direccionado por contenido.
+#
+# - El modelo se serializa directamente a un fichero temporal del almacén y
+#   el SHA-256 se calcula sobre los mismos bytes según pickle los escribe: una
+#   sola pasada, sin releer el fichero ni tenerlo entero en memoria.
+# - El fichero queda en objects/<hh>/<hash>: si ya existía (modelo sin
+#   cambios) se descarta el temporal y no se vuelve a subir a MLflow.
+# - Para ficheros ya existentes, el hash se cachea por (ruta, tamaño, mtime).
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "artifacts")
+CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(1 << 20)))
+
+
+class HashingWriter:
+    """Fichero de solo escritura que va calculando el hash de lo escrito."""
+
+    def __init__(self, f, algorithm="sha256"):
+        self.f = f
+        self.digest = hashlib.new(algorithm)
+        self.size = 0
+
+    def write(self, data):
+        # Con protocolo 5, pickle pasa los buffers grandes (arrays de numpy)
+        # como PickleBuffer, sin copiarlos
+        view = memoryview(data)
+        self.digest.update(view)
+        self.size += view.nbytes
+        return self.f.write(view)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """SHA-256 de un fichero leído por bloques en un buffer reutilizado."""
+    digest = hashlib.sha256()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Hashes de ficheros por (ruta, tamaño, mtime), persistidos en JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["hash"]
+        digest = hash_file(path)
+        self.put(path, digest, st)
+        return digest
+
+    def put(self, path, digest, st=None):
+        path = os.path.abspath(path)
+        st = st or os.stat(path)
+        with self._lock:
+            self._entries[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            self._save()
+
+    def _save(self):
+        # Escritura atómica: varios procesos pueden compartir el almacén
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_STORE):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.hashes = HashCache(os.path.join(root, "hash_cache.json"))
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def save(self, obj, protocol=pickle.HIGHEST_PROTOCOL):
+        """Serializa obj en el almacén. Devuelve {hash, path, size, reused}."""
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, "objects"), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer = HashingWriter(f)
+                pickle.dump(obj, writer, protocol=protocol)
+            digest = writer.hexdigest()
+            path = self.object_path(digest)
+            reused = os.path.exists(path)
+            if reused:
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+                self.hashes.put(path, digest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return {"hash": digest, "path": path, "size": writer.size, "reused": reused}
+
+    def add_file(self, src):
+        """Copia un fichero existente al almacén (hash cacheado por mtime)."""
+        digest = self.hashes.get(src)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(src, path)
+            except OSError:
+                shutil.copyfile(src, path)
+        return {"hash": digest, "path": path, "size": os.path.getsize(path)}
+
+    def load(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return pickle.load(f)
+
+    # Marcas por artefacto (p.ej. "mlflow": ya subido, con su model_uri)
+
+    def _marks_path(self, digest):
+        return self.object_path(digest) + ".json"
+
+    def marks(self, digest):
+        try:
+            with open(self._marks_path(digest)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def mark(self, digest, key, value=True):
+        marks = self.marks(digest)
+        marks[key] = value
+        with open(self._marks_path(digest), "w") as f:
+            json.dump(marks, f)
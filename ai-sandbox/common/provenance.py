@@ -0,0 +1,174 @@
+# provenance.py
+# Registro de inferencias en Ernest para los pipelines del sandbox.
+#
+# - Hashes canónicos por fila (sin pickle): el mismo input da el mismo hash
+#   en cualquier máquina/versión de Python.
+# - Los registros se escriben primero en un spool local (JSONL) y después se
+#   envían por una sesión HTTP con pool de conexiones, varios en vuelo a la
+#   vez. Lo que falla se queda en el spool para el siguiente intento.
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE = os.getenv("ERNEST_API", "http://localhost:3001/api")
+SPOOL_FILE = os.getenv("INFERENCE_SPOOL", "inference_spool.jsonl")
+# Peticiones en vuelo contra /api/inferences
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "16"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT_S", "10"))
+
+
+def _canonical(values):
+    """(tag, 2-D array) con un dtype fijo little-endian por fila."""
+    arr = np.asarray(values)
+    arr = arr.reshape(len(arr), -1) if arr.ndim != 1 else arr.reshape(-1, 1)
+    if arr.dtype.kind == "b":
+        return "bool", arr.astype("u1")
+    if arr.dtype.kind in "iu":
+        return "i8", np.ascontiguousarray(arr, dtype="<i8")
+    if arr.dtype.kind == "f":
+        return "f8", np.ascontiguousarray(arr, dtype="<f8")
+    return "json", arr
+
+
+def hash_rows(values):
+    """SHA-256 de cada fila de `values` (hex). Numéricos: tag + forma + bytes
+    little-endian; el resto (etiquetas de texto, objetos): JSON canónico."""
+    tag, arr = _canonical(values)
+    width = arr.shape[1]
+    header = f"{tag}:{width}:".encode()
+    if tag == "json":
+        return [
+            hashlib.sha256(header + json.dumps(row.tolist(), sort_keys=True, separators=(",", ":"),
+                                               ensure_ascii=False, default=str).encode()).hexdigest()
+            for row in arr
+        ]
+    # Un solo buffer para todo el lote; cada fila es una vista, sin copias
+    buf = memoryview(arr).cast("B")
+    step = arr.itemsize * width
+    return [hashlib.sha256(header + buf[i:i + step]).hexdigest() for i in range(0, len(buf), step)]
+
+
+def inference_records(model_id, inputs, outputs, metadata=None):
+    """Un registro LogInferenceDto por predicción."""
+    input_hashes = hash_rows(inputs)
+    output_hashes = hash_rows(outputs)
+    if len(input_hashes) != len(output_hashes):
+        raise ValueError(f"{len(input_hashes)} inputs para {len(output_hashes)} outputs")
+    return [
+        {
+            "modelId": model_id,
+            "inferenceId": uuid.uuid4().hex,
+            "inputHash": input_hash,
+            "outputHash": output_hash,
+            "metadata": metadata or {},
+        }
+        for input_hash, output_hash in zip(input_hashes, output_hashes)
+    ]
+
+
+def pooled_session(pool_size):
+    """Sesión con pool_size conexiones keep-alive. Solo se reintenta lo que
+    seguro no ha llegado a registrarse (sin conexión, 503)."""
+    session = requests.Session()
+    retry = Retry(total=2, read=0, backoff_factor=0.2, status_forcelist=(503,), allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class InferenceLogger:
+    def __init__(self, api_base=API_BASE, spool_path=SPOOL_FILE, workers=INFERENCE_WORKERS,
+                 timeout=INFERENCE_TIMEOUT):
+        self.url = f"{api_base}/inferences"
+        self.spool_path = spool_path
+        self.workers = workers
+        self.timeout = timeout
+        self.session = pooled_session(workers)
+
+    def close(self):
+        self.session.close()
+
+    def spool(self, records):
+        """Añade registros al spool (pendientes de envío)."""
+        if not records:
+            return
+        with open(self.spool_path, "a") as f:
+            f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+
+    def pending(self):
+        total = 0
+        for path in (self.spool_path + ".sending", self.spool_path):
+            if os.path.exists(path):
+                with open(path) as f:
+                    total += sum(1 for _ in f)
+        return total
+
+    def _post(self, record):
+        try:
+            r = self.session.post(self.url, json=record, timeout=self.timeout)
+            return r.status_code in (200, 201), r.status_code
+        except requests.RequestException as e:
+            return False, type(e).__name__
+
+    def send(self, records):
+        """Envía los registros: (nº enviados, registros fallidos, errores por código)."""
+        failed, errors = [], {}
+        window = self.workers * 64
+        with ThreadPoolExecutor(self.workers) as pool:
+            for i in range(0, len(records), window):
+                chunk = records[i:i + window]
+                chunk_failed = 0
+                for record, (ok, status) in zip(chunk, pool.map(self._post, chunk)):
+                    if not ok:
+                        chunk_failed += 1
+                        failed.append(record)
+                        errors[str(status)] = errors.get(str(status), 0) + 1
+                if chunk_failed == len(chunk):
+                    # Ernest no acepta nada: no esperar timeouts por el resto
+                    failed.extend(records[i + window:])
+                    break
+        return len(records) - len(failed), failed, errors
+
+    def drain(self, batch_size=10000):
+        """Envía el spool. Lo que no se acepta vuelve al spool."""
+        start = time.perf_counter()
+        sending = self.spool_path + ".sending"
+        # Un envío interrumpido deja su fichero .sending: se reintenta primero
+        # (entrega al menos una vez: puede repetir registros ya aceptados)
+        if not os.path.exists(sending):
+            if not os.path.exists(self.spool_path):
+                return {"sent": 0, "failed": 0, "errors": {}, "duration_s": 0.0}
+            os.replace(self.spool_path, sending)
+
+        sent, failed_total, errors = 0, 0, {}
+        with open(sending) as f:
+            while True:
+                batch = [json.loads(line) for _, line in zip(range(batch_size), f)]
+                if not batch:
+                    break
+                ok, failed, batch_errors = self.send(batch)
+                sent += ok
+                failed_total += len(failed)
+                for k, v in batch_errors.items():
+                    errors[k] = errors.get(k, 0) + v
+                self.spool(failed)
+                if not ok:
+                    # Ernest caído: el resto del fichero vuelve al spool tal cual
+                    rest = f.read()
+                    if rest:
+                        with open(self.spool_path, "a") as out:
+                            out.write(rest)
+                        failed_total += rest.count("\n")
+                    break
+        os.remove(sending)
+        return {"sent": sent, "failed": failed_total, "errors": errors,
+                "duration_s": round(time.perf_counter() - start, 3)}
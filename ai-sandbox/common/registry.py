@@ -0,0 +1,78 @@
+# registry.py
+# Registro idempotente de modelos en Ernest.
+#
+# La versión publicada lleva el hash del artefacto (0.1.3+<hash12>) y antes
+# de registrar se busca ese hash entre las versiones del modelId: relanzar un
+# entrenamiento que produce el mismo artefacto no crea un bloque nuevo.
+import os
+import subprocess
+
+from common.provenance import API_BASE, pooled_session
+
+REGISTRY_TIMEOUT = float(os.getenv("REGISTRY_TIMEOUT_S", "15"))
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def artifact_version(version, artifact_hash):
+    return f"{version}+{artifact_hash[:12]}"
+
+
+def find_registered(session, model_id, artifact_hash, api_base=API_BASE):
+    """La versión de model_id registrada con este artefacto, o None."""
+    r = session.get(f"{api_base}/models", params={"modelId": model_id}, timeout=REGISTRY_TIMEOUT)
+    r.raise_for_status()
+    for model in r.json():
+        if (model.get("metadata") or {}).get("artifactHash") == artifact_hash:
+            return model
+    return None
+
+
+def register_model(state, session=None, api_base=API_BASE, commit=None):
+    """Registra el modelo descrito por el estado de un entrenamiento
+    (model_id, hash_main, version, dataset, accuracy, params).
+    Devuelve {"status": "registered" | "skipped", "version", ...}."""
+    own_session = session is None
+    session = session or pooled_session(1)
+    try:
+        model_id = state["model_id"]
+        artifact_hash = state["hash_main"]
+        version = artifact_version(state.get("version", "0.0.0"), artifact_hash)
+
+        existing = find_registered(session, model_id, artifact_hash, api_base)
+        if existing is not None:
+            return {"status": "skipped", "version": existing.get("version"), "reason": "artifact already registered"}
+
+        accuracy = state.get("accuracy")
+        payload = {
+            "modelId": model_id,
+            "modelName": model_id,
+            "version": version,
+            "params": state.get("params") or {},
+            "metrics": {"accuracy": accuracy} if accuracy is not None else {},
+            "metadata": {
+                "dataset": state.get("dataset"),
+                "accuracy": accuracy,
+                "artifactHash": artifact_hash,
+            },
+            "mlflow": {"modelHash": artifact_hash, "gitCommit": commit or git_commit()},
+        }
+        resp = session.post(f"{api_base}/models", json=payload, timeout=REGISTRY_TIMEOUT)
+        if resp.status_code == 400 and "already exists" in resp.text:
+            # Otro proceso lo registró entre la consulta y el POST
+            return {"status": "skipped", "version": version, "reason": "registered concurrently"}
+        if resp.status_code not in (200, 201):
+            raise RuntimeError(f"Error al registrar modelo: {resp.status_code} {resp.text}")
+        return {"status": "registered", "version": version, "response": resp.json()}
+    finally:
+        if own_session:
+            session.close()
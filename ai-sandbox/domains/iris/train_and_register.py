@@ -1,16 +1,32 @@
 import argparse
-import hashlib
+import os
 import pickle
-import requests
+import sys
+import time
 import json
+import numpy as np
 from sklearn import datasets
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsClassifier
 import mlflow
 from mlflow.models import infer_signature
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.artifacts import ArtifactStore
+from common.provenance import InferenceLogger, inference_records
+from common.registry import register_model as register_in_ernest
+
 STATE_FILE = "state.json"
-API_BASE = "http://localhost:3001/api" 
+MODEL_ID = "iris-classifier-v1"
+# La versión registrada es MODEL_VERSION+<hash del artefacto>
+MODEL_VERSION = "0.1.3"
+DATASET = "iris"
+# Filas por llamada a model.predict en la inferencia por lotes
+INFERENCE_BATCH = int(os.getenv("INFERENCE_BATCH", "10000"))
+
+def load_state():
+    with open(STATE_FILE) as sf:
+        return json.load(sf)
 
 def train_model():
     iris = datasets.load_iris()
@@ -31,17 +47,19 @@ def train_model():
     accuracy = model.score(X_test, y_test)
     print(f"Modelo entrenado, accuracy = {accuracy:.4f}")
 
-    model_file = "iris_model_v1.pkl"
-    with open(model_file, "wb") as f:
-        pickle.dump((model, X_test, y_test), f)
-
-    with open(model_file, "rb") as f:
-        bytes_model = f.read()
-    hash_main = hashlib.sha256(bytes_model).hexdigest()
-    print(f"Hash del artefacto: {hash_main}")
+    # Serialización y hash en una sola pasada, directamente al almacén
+    store = ArtifactStore()
+    artifact = store.save((model, X_test, y_test))
+    hash_main = artifact["hash"]
+    model_file = artifact["path"]
+    print(f"Hash del artefacto: {hash_main} ({artifact['size']} bytes"
+          f"{', sin cambios' if artifact['reused'] else ''})")
 
     state = {
-        "model_id": "iris-classifier-v1",
+        "model_id": MODEL_ID,
+        "version": MODEL_VERSION,
+        "dataset": DATASET,
+        "params": params,
         "hash_main": hash_main,
         "accuracy": accuracy,
         "model_file": model_file
@@ -50,6 +68,11 @@ def train_model():
         json.dump(state, sf)
 
     # START MLFlow integration - you can skip and comment this if not using MLflow
+    # Un artefacto idéntico ya subido no se vuelve a subir
+    if store.marks(hash_main).get("mlflow"):
+        print("Modelo sin cambios, ya registrado en MLflow")
+        return model, X_test, y_test, hash_main, accuracy
+
     # Set our tracking server uri for logging
     mlflow.set_tracking_uri(uri="http://127.0.0.1:8111")
 
@@ -79,117 +102,78 @@ def train_model():
         # Set a tag that we can use to remind ourselves what this model was for
         mlflow.set_logged_model_tags(
             model_info.model_id, {"Training Info": "Basic KNC model for iris data"}
-        )    
+        )
+        store.mark(hash_main, "mlflow", model_info.model_uri)
     # END MLFlow integration - you can skip and comment this if not using MLflow    
 
     return model, X_test, y_test, hash_main, accuracy
 
-def register_model(hash_main, accuracy):
-    with open(STATE_FILE) as sf:
-        state = json.load(sf)
-
-    payload = {
-        "modelName": state["model_id"],
-        "version": "0.1.3",
-        "status": "published",
-        "metadata": {
-            "dataset": "iris",
-            "accuracy": accuracy
-        }
-    }
-
-    resp = requests.post(f"{API_BASE}/models", json=payload)
-    if resp.status_code not in (200, 201):
-        raise RuntimeError(f"Error al registrar modelo: {resp.status_code} {resp.text}")
-    print("Modelo registrado correctamente:", resp.json())
-
-def run_inference(model_file, hash_main):
-    with open(STATE_FILE) as sf:
-        state = json.load(sf)
-
-    model_file = state["model_file"]
-    model_id   = state["model_id"]
-
-    with open(model_file, "rb") as f:
+def register_model(state):
+    result = register_in_ernest(state)
+    if result["status"] == "skipped":
+        print(f"Modelo ya registrado ({result['version']}): {result['reason']}")
+    else:
+        print("Modelo registrado correctamente:", result["response"])
+    return result
+
+def run_inference(state, input_file=None, batch_size=INFERENCE_BATCH):
+    """Predice sobre todo el conjunto (X_test o un .npy) por lotes y deja un
+    registro de provenance por predicción en el spool."""
+    model_id = state["model_id"]
+    with open(state["model_file"], "rb") as f:
         model, X_test, y_test = pickle.load(f)
-
-    input_data = X_test[0].tolist()
-    predicted = model.predict([X_test[0]])[0]
-    print(f"Inferencia realizada: input → {input_data}, prediction → {predicted}")
-
-    input_bytes = pickle.dumps(input_data)
-    output_bytes = pickle.dumps(predicted)
-    input_hash = hashlib.sha256(input_bytes).hexdigest()
-    output_hash = hashlib.sha256(output_bytes).hexdigest()
-    print(f"input_hash={input_hash}, output_hash={output_hash}")
-
-    return model_id, hash_main, input_hash, output_hash
-
-def register_inference(model_id, hash_main):
-    if model_id is None:
-        with open(STATE_FILE) as sf:
-            state = json.load(sf)
-        model_id = state.get("model_id")
-        if model_id is None:
-            raise RuntimeError("model_id no definido en el estado. Ejecute primero inferencia o train.")
-    
-    if hash_main is None:
-        with open(STATE_FILE) as sf:
-            state = json.load(sf)
-        hash_main = state.get("hash_main")
-        if hash_main is None:
-            raise RuntimeError("hash_main no definido en el estado. Ejecute primero train o register.")
-
-    payload = {
-        "modelId": model_id,
-        "input": {"hash": hash_main}
-    }
-
-    resp = requests.post(f"{API_BASE}/inference", json=payload)
-    if resp.status_code not in (200, 201):
-        raise RuntimeError(f"Error al registrar inferencia: {resp.status_code} {resp.text}")
-    print("Inferencia registrada correctamente:", resp.json())
+    # mmap: un .npy más grande que la memoria se lee por trozos
+    X = np.load(input_file, mmap_mode="r") if input_file else X_test
+
+    inference_logger = InferenceLogger()
+    metadata = {"artifactHash": state["hash_main"], "runId": os.urandom(8).hex()}
+    start = time.perf_counter()
+    for i in range(0, len(X), batch_size):
+        batch = np.asarray(X[i:i + batch_size])
+        predicted = model.predict(batch)
+        inference_logger.spool(inference_records(model_id, batch, predicted, metadata))
+    elapsed = time.perf_counter() - start
+    print(f"Inferencia realizada: {len(X)} predicciones en {elapsed:.2f}s "
+          f"({len(X) / max(elapsed, 1e-9):.0f}/s), pendientes de registro: {inference_logger.pending()}")
+    inference_logger.close()
+    return len(X)
+
+def register_inference(state):
+    """Envía a Ernest los registros pendientes del spool."""
+    if state.get("model_id") is None:
+        raise RuntimeError("model_id no definido en el estado. Ejecute primero inferencia o train.")
+    inference_logger = InferenceLogger()
+    try:
+        result = inference_logger.drain()
+    finally:
+        inference_logger.close()
+    print(f"Inferencias registradas: {result['sent']} en {result['duration_s']}s, "
+          f"fallidas (quedan en el spool): {result['failed']} {result['errors'] or ''}")
+    if result["failed"]:
+        raise RuntimeError(f"{result['failed']} inferencias sin registrar, reintente con --step register_inference")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--step", choices=["train", "register", "infer", "register_inference", "all"],
                         default="all", help="Paso del flujo a ejecutar")
+    parser.add_argument("--input", help="Fichero .npy con las filas a predecir (por defecto, X_test)")
+    parser.add_argument("--batch-size", type=int, default=INFERENCE_BATCH, help="Filas por lote de inferencia")
     args = parser.parse_args()
 
-    model = None
-    X_test = None
-    y_test = None
-    hash_main = None
-    accuracy = None
-
     if args.step in ("train", "all"):
-        model, X_test, y_test, hash_main, accuracy = train_model()
+        train_model()
+
+    # train escribe el estado; los demás pasos lo leen una sola vez
+    state = load_state()
 
     if args.step in ("register", "all"):
-        if hash_main is None:
-            with open(STATE_FILE) as sf:
-                state = json.load(sf)
-            hash_main = state["hash_main"]
-            accuracy = state.get("accuracy")
-        register_model(hash_main, accuracy)
+        register_model(state)
 
     if args.step in ("infer", "all"):
-        with open(STATE_FILE) as sf:
-            state = json.load(sf)
-        model_id = state["model_id"]
-        model_file = state["model_file"]
-        hash_main = state["hash_main"]
-        # Ejecuta inferencia
-        model_id, hash_main, input_hash, output_hash = run_inference(model_file, hash_main)
+        run_inference(state, args.input, args.batch_size)
 
     if args.step in ("register_inference", "all"):
-        # Asegura que input_hash/output_hash están definidos
-        with open(STATE_FILE) as sf:
-            state = json.load(sf)
-        model_id = state["model_id"]
-        model_file = state["model_file"]
-        hash_main = state["hash_main"]
-        register_inference(model_id, hash_main)
+        register_inference(state)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,188 @@
+# runner.py
+# Entrena y registra en paralelo todos los pipelines de domains/.
+#
+#   python runner.py                      # todos los dominios
+#   python runner.py --domains iris --no-register
+#
+# Cada dominio es un domains/<nombre>/train_and_register.py con train_model()
+# (deja su estado en state.json del directorio actual). Se entrena cada uno en
+# su propio proceso y en su propio directorio, runs/<run_id>/<dominio>/, así
+# que los estados no se pisan; el almacén de artefactos sí es compartido.
+# En cuanto un dominio termina se registra en Ernest (en hilos, con una sesión
+# HTTP compartida), sin esperar a los demás; el registro es idempotente por
+# hash del artefacto. Al final se escribe runs/<run_id>/report.json con los
+# tiempos de cada etapa.
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DOMAINS_DIR = os.path.join(HERE, "domains")
+PIPELINE_FILE = "train_and_register.py"
+
+
+def discover(domains_dir=DOMAINS_DIR, only=None):
+    names = sorted(
+        name for name in os.listdir(domains_dir)
+        if os.path.isfile(os.path.join(domains_dir, name, PIPELINE_FILE))
+    )
+    if only:
+        missing = set(only) - set(names)
+        if missing:
+            raise SystemExit(f"Dominios desconocidos: {', '.join(sorted(missing))} (disponibles: {', '.join(names)})")
+        names = [n for n in names if n in only]
+    return names
+
+
+def _init_worker():
+    # Un proceso por dominio: que numpy/BLAS no lance además un hilo por core
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+
+
+def train_domain(domain, run_dir, domains_dir=DOMAINS_DIR):
+    """Worker: importa el pipeline del dominio y entrena en run_dir/<dominio>."""
+    result = {"domain": domain, "pid": os.getpid(), "timings": {}}
+    work_dir = os.path.join(run_dir, domain)
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    try:
+        start = time.perf_counter()
+        path = os.path.join(domains_dir, domain, PIPELINE_FILE)
+        spec = importlib.util.spec_from_file_location(f"domain_{domain}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        result["timings"]["import_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        module.train_model()
+        result["timings"]["train_s"] = round(time.perf_counter() - start, 3)
+
+        with open(getattr(module, "STATE_FILE", "state.json")) as f:
+            state = json.load(f)
+        # Rutas relativas al directorio del dominio: el registro corre en otro proceso
+        if state.get("model_file"):
+            state["model_file"] = os.path.abspath(state["model_file"])
+        result["state"] = state
+        result["status"] = "trained"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def register_domain(result, session):
+    from common.registry import register_model
+
+    start = time.perf_counter()
+    try:
+        registration = register_model(result["state"], session=session)
+        result["registration"] = registration.get("status")
+        result["version"] = registration.get("version")
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"register: {type(e).__name__}: {e}"
+    result["timings"]["register_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run(domains, run_dir, workers, register_workers, register=True, domains_dir=DOMAINS_DIR):
+    from common.provenance import pooled_session
+
+    results = {}
+    start = time.perf_counter()
+    submitted = {}
+    session = pooled_session(register_workers) if register else None
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool, \
+            ThreadPoolExecutor(max_workers=register_workers) as registrar:
+        for domain in domains:
+            submitted[pool.submit(train_domain, domain, run_dir, domains_dir)] = domain
+        registrations = []
+        for future in as_completed(submitted):
+            domain = submitted[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # El proceso murió (OOM, señal): el resto de dominios sigue
+                result = {"domain": domain, "status": "failed", "timings": {}, "error": f"{type(e).__name__}: {e}"}
+            result["timings"]["trained_after_s"] = round(time.perf_counter() - start, 3)
+            results[domain] = result
+            status = result["status"]
+            print(f"[{domain}] {status} en {result['timings'].get('train_s', '-')}s"
+                  + (f": {result['error']}" if status == "failed" else ""), flush=True)
+            if register and status == "trained":
+                registrations.append(registrar.submit(register_domain, result, session))
+        for future in as_completed(registrations):
+            result = future.result()
+            print(f"[{result['domain']}] registro: {result.get('registration') or result.get('error')}", flush=True)
+    if session is not None:
+        session.close()
+
+    wall = time.perf_counter() - start
+    train_total = sum(r["timings"].get("train_s", 0) for r in results.values())
+    return {
+        "wall_s": round(wall, 3),
+        "train_sum_s": round(train_total, 3),
+        # Cuánto se gana frente a entrenar uno detrás de otro
+        "speedup": round(train_total / wall, 2) if wall else None,
+        "slowest": max(results.values(), key=lambda r: r["timings"].get("train_s", 0))["domain"] if results else None,
+        "domains": {d: {k: v for k, v in r.items() if k != "traceback"} for d, r in sorted(results.items())},
+        "errors": {d: r["traceback"] for d, r in results.items() if r.get("traceback")},
+    }
+
+
+def print_report(report):
+    print(f"\n{'dominio':<20} {'estado':<8} {'train_s':>8} {'register_s':>10}  registro")
+    for domain, r in report["domains"].items():
+        t = r["timings"]
+        print(f"{domain:<20} {r['status']:<8} {t.get('train_s', '-'):>8} {t.get('register_s', '-'):>10}  "
+              f"{r.get('registration') or r.get('error') or ''}")
+    print(f"\nTotal {report['wall_s']}s (suma de entrenamientos {report['train_sum_s']}s, "
+          f"x{report['speedup']}); el más lento: {report['slowest']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena y registra los dominios en paralelo")
+    parser.add_argument("--domains", help="Lista separada por comas (por defecto, todos)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos de entrenamiento")
+    parser.add_argument("--register-workers", type=int, default=8, help="Registros concurrentes en Ernest")
+    parser.add_argument("--runs-dir", default=os.path.join(HERE, "runs"))
+    parser.add_argument("--artifact-store", default=os.path.join(HERE, "artifacts"),
+                        help="Almacén de artefactos compartido por todos los dominios")
+    parser.add_argument("--no-register", action="store_true", help="Solo entrenar")
+    args = parser.parse_args()
+
+    domains = discover(only=args.domains.split(",") if args.domains else None)
+    if not domains:
+        raise SystemExit(f"No hay pipelines en {DOMAINS_DIR}")
+
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    run_dir = os.path.abspath(os.path.join(args.runs_dir, run_id))
+    os.makedirs(run_dir, exist_ok=True)
+    # Los workers (spawn) heredan el entorno: almacén común, no uno por dominio
+    os.environ["ARTIFACT_STORE"] = os.path.abspath(args.artifact_store)
+    sys.path.insert(0, HERE)
+
+    workers = max(1, min(args.workers, len(domains)))
+    print(f"Run {run_id}: {len(domains)} dominios, {workers} procesos")
+    report = run(domains, run_dir, workers, args.register_workers, register=not args.no_register)
+    report["run_id"] = run_id
+    with open(os.path.join(run_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print_report(report)
+    print(f"Informe: {os.path.join(run_dir, 'report.json')}")
+    if any(r["status"] == "failed" for r in report["domains"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# conftest.py
+# Tests de common/ (no necesitan MLflow ni Ernest en marcha).
+#
+#   cd ai-sandbox && python -m pytest tests -q
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
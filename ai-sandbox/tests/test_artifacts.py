@@ -0,0 +1,101 @@
+# test_artifacts.py
+# ArtifactStore: direccionado por contenido, un modelo sin cambios reutiliza
+# el objeto existente; hashes de ficheros cacheados por (tamaño, mtime).
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from common import artifacts
+from common.artifacts import ArtifactStore, HashCache, hash_file
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "store"))
+
+
+def _model(seed=0):
+    rng = np.random.default_rng(seed)
+    return {"coef": rng.normal(size=(64, 64)), "classes": ["a", "b"]}
+
+
+def _objects(store):
+    return sorted(
+        name for _, _, files in os.walk(os.path.join(store.root, "objects")) for name in files
+    )
+
+
+def test_save_hashes_the_pickled_bytes(store):
+    model = _model()
+    saved = store.save(model)
+    with open(saved["path"], "rb") as f:
+        data = f.read()
+    assert saved["hash"] == hashlib.sha256(data).hexdigest() == hash_file(saved["path"])
+    assert saved["size"] == len(data)
+    assert data == pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    assert saved["path"] == os.path.join(store.root, "objects", saved["hash"][:2], saved["hash"])
+    assert not saved["reused"]
+
+
+def test_unchanged_model_is_reused(store):
+    first = store.save(_model())
+    mtime = os.stat(first["path"]).st_mtime_ns
+    second = store.save(_model())
+    assert second["reused"]
+    assert second["hash"] == first["hash"] and second["path"] == first["path"]
+    assert os.stat(first["path"]).st_mtime_ns == mtime
+    # No leftover temporary files
+    assert _objects(store) == [first["hash"]]
+
+    changed = store.save(_model(seed=1))
+    assert not changed["reused"] and changed["hash"] != first["hash"]
+    assert np.array_equal(store.load(first["hash"])["coef"], _model()["coef"])
+
+
+def test_failed_save_leaves_nothing_behind(store):
+    class Unpicklable:
+        def __reduce__(self):
+            raise TypeError("nope")
+
+    with pytest.raises(TypeError):
+        store.save({"x": Unpicklable()})
+    assert _objects(store) == []
+
+
+def test_add_file_and_marks(store, tmp_path):
+    src = tmp_path / "model.bin"
+    src.write_bytes(b"weights" * 1000)
+    added = store.add_file(str(src))
+    assert added["hash"] == hashlib.sha256(src.read_bytes()).hexdigest()
+    assert store.add_file(str(src))["path"] == added["path"]
+
+    assert store.marks(added["hash"]) == {}
+    store.mark(added["hash"], "mlflow", {"model_uri": "runs:/1/model"})
+    assert store.marks(added["hash"]) == {"mlflow": {"model_uri": "runs:/1/model"}}
+
+
+def test_hash_cache_rehashes_only_changed_files(tmp_path, monkeypatch):
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+    cache_path = str(tmp_path / "hash_cache.json")
+    calls = []
+    real_hash_file = artifacts.hash_file
+    monkeypatch.setattr(artifacts, "hash_file", lambda path: calls.append(path) or real_hash_file(path))
+
+    cache = HashCache(cache_path)
+    first = cache.get(str(src))
+    assert HashCache(cache_path).get(str(src)) == first  # persisted
+    assert len(calls) == 1
+
+    src.write_text("a,b\n1,23\n")  # other size: mtime may not tick
+    assert HashCache(cache_path).get(str(src)) != first
+    assert len(calls) == 2
+
+
+def test_hash_file_with_small_chunks(tmp_path):
+    src = tmp_path / "blob"
+    src.write_bytes(os.urandom(10_000))
+    assert hash_file(str(src), chunk_size=7) == hashlib.sha256(src.read_bytes()).hexdigest()
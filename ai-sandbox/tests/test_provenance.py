@@ -0,0 +1,80 @@
+# test_provenance.py
+# hash_rows: el hash de una fila depende solo de sus valores, no del dtype,
+# el orden de bytes, la forma o la contigüidad del array que la contiene.
+import hashlib
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from common.provenance import hash_rows, inference_records
+
+ROWS = [[5, 3, 1, 0], [6, 2, 4, 1]]
+
+
+def _expected_int(row):
+    header = f"i8:{len(row)}:".encode()
+    return hashlib.sha256(header + struct.pack(f"<{len(row)}q", *row)).hexdigest()
+
+
+def _expected_float(row):
+    header = f"f8:{len(row)}:".encode()
+    return hashlib.sha256(header + struct.pack(f"<{len(row)}d", *row)).hexdigest()
+
+
+def test_integer_rows_have_a_fixed_format():
+    assert hash_rows(ROWS) == [_expected_int(r) for r in ROWS]
+
+
+@pytest.mark.parametrize("values", [
+    np.array(ROWS, dtype=np.int8),
+    np.array(ROWS, dtype=np.int32),
+    np.array(ROWS, dtype=">i8"),            # big-endian
+    np.array(ROWS, dtype=np.uint16),
+    np.asfortranarray(np.array(ROWS)),
+    np.array([[5, 9, 3, 9, 1, 9, 0], [6, 9, 2, 9, 4, 9, 1]])[:, ::2],  # non-contiguous view
+])
+def test_integer_rows_do_not_depend_on_layout(values):
+    assert hash_rows(values) == hash_rows(ROWS)
+
+
+def test_float_rows():
+    rows = [[5.1, 3.5, 1.4, 0.2], [-0.0, 1e300, 2.5, 3.0]]
+    assert hash_rows(rows) == [_expected_float(r) for r in rows]
+    assert hash_rows(np.array(rows, dtype=">f8")) == hash_rows(rows)
+    # float32 values are widened: exact ones hash like the float64 row
+    assert hash_rows(np.array([[0.5, 1.25]], dtype=np.float32)) == hash_rows([[0.5, 1.25]])
+
+
+def test_one_value_per_row():
+    assert hash_rows([1, 2, 3]) == hash_rows([[1], [2], [3]]) == [_expected_int([i]) for i in (1, 2, 3)]
+    # int and float of the same number are different inputs
+    assert hash_rows([1]) != hash_rows([1.0])
+
+
+def test_booleans_and_labels():
+    assert hash_rows([True, False]) == [
+        hashlib.sha256(b"bool:1:" + bytes([v])).hexdigest() for v in (1, 0)
+    ]
+    labels = ["setosa", "virginica", "ñandú"]
+    expected = [
+        hashlib.sha256(b"json:1:" + json.dumps([v], ensure_ascii=False, separators=(",", ":")).encode()).hexdigest()
+        for v in labels
+    ]
+    assert hash_rows(labels) == hash_rows(np.array(labels, dtype=object)) == expected
+
+
+def test_equal_rows_hash_equal():
+    hashes = hash_rows([[1, 2], [3, 4], [1, 2]])
+    assert hashes[0] == hashes[2] != hashes[1]
+
+
+def test_inference_records():
+    records = inference_records("iris", ROWS, ["setosa", "virginica"], {"run": "r1"})
+    assert [r["inputHash"] for r in records] == hash_rows(ROWS)
+    assert [r["outputHash"] for r in records] == hash_rows(["setosa", "virginica"])
+    assert len({r["inferenceId"] for r in records}) == 2
+    assert all(r["modelId"] == "iris" and r["metadata"] == {"run": "r1"} for r in records)
+    with pytest.raises(ValueError):
+        inference_records("iris", ROWS, ["setosa"])
@@ -0,0 +1,99 @@
+# test_registry.py
+# register_model es idempotente por hash del artefacto: el mismo artefacto
+# no se registra dos veces, ni siquiera con dos procesos a la vez.
+import pytest
+
+from common.registry import artifact_version, register_model
+
+API = "http://ernest/api"
+HASH = "ab" * 32
+STATE = {
+    "model_id": "iris-rf",
+    "hash_main": HASH,
+    "version": "0.1.3",
+    "dataset": "iris",
+    "accuracy": 0.97,
+    "params": {"n_estimators": 100},
+}
+
+
+class Response:
+    def __init__(self, status_code, body=None, text=""):
+        self.status_code = status_code
+        self.body = body
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return self.body
+
+
+class FakeErnest:
+    """GET/POST /api/models en memoria, con la misma sesión que usa registry."""
+
+    def __init__(self):
+        self.models = []
+        self.posts = 0
+        self.race = False  # otro proceso registra entre el GET y el POST
+
+    def get(self, url, params=None, timeout=None):
+        assert url == f"{API}/models"
+        return Response(200, [m for m in self.models if m["modelId"] == params["modelId"]])
+
+    def post(self, url, json=None, timeout=None):
+        assert url == f"{API}/models"
+        self.posts += 1
+        if self.race or any((m["modelId"], m["version"]) == (json["modelId"], json["version"]) for m in self.models):
+            return Response(400, text=f"Model {json['modelId']} version {json['version']} already exists")
+        self.models.append(json)
+        return Response(201, {"modelId": json["modelId"], "version": json["version"]})
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def ernest():
+    return FakeErnest()
+
+
+def test_first_run_registers(ernest):
+    result = register_model(STATE, session=ernest, api_base=API, commit="c0ffee")
+    assert result["status"] == "registered"
+    assert result["version"] == artifact_version("0.1.3", HASH) == f"0.1.3+{HASH[:12]}"
+    [model] = ernest.models
+    assert model["metadata"] == {"dataset": "iris", "accuracy": 0.97, "artifactHash": HASH}
+    assert model["metrics"] == {"accuracy": 0.97}
+    assert model["mlflow"] == {"modelHash": HASH, "gitCommit": "c0ffee"}
+
+
+def test_same_artifact_is_skipped(ernest):
+    register_model(STATE, session=ernest, api_base=API, commit="c0ffee")
+    again = register_model(STATE, session=ernest, api_base=API, commit="other")
+    assert again == {"status": "skipped", "version": f"0.1.3+{HASH[:12]}", "reason": "artifact already registered"}
+    assert ernest.posts == 1 and len(ernest.models) == 1
+
+
+def test_new_artifact_is_a_new_version(ernest):
+    register_model(STATE, session=ernest, api_base=API)
+    retrained = register_model({**STATE, "hash_main": "cd" * 32}, session=ernest, api_base=API)
+    assert retrained["status"] == "registered"
+    assert [m["version"] for m in ernest.models] == [f"0.1.3+{HASH[:12]}", "0.1.3+" + "cd" * 6]
+    # Same artifact under another modelId is its own model
+    other = register_model({**STATE, "model_id": "iris-svm"}, session=ernest, api_base=API)
+    assert other["status"] == "registered"
+
+
+def test_concurrent_registration_is_skipped(ernest):
+    ernest.race = True
+    result = register_model(STATE, session=ernest, api_base=API)
+    assert result == {"status": "skipped", "version": f"0.1.3+{HASH[:12]}", "reason": "registered concurrently"}
+
+
+def test_other_errors_raise(ernest):
+    ernest.post = lambda url, json=None, timeout=None: Response(500, text="boom")
+    with pytest.raises(RuntimeError, match="500"):
+        register_model(STATE, session=ernest, api_base=API)
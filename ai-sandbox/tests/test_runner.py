@@ -0,0 +1,164 @@
+# test_runner.py
+# runner.py con un domains/ temporal: dos pipelines triviales y uno que falla.
+# Cada dominio deja su estado en su propio directorio del run, un fallo se
+# informa sin parar a los demás y no se vuelve a registrar un artefacto que
+# Ernest ya tiene.
+import json
+import os
+import textwrap
+
+import pytest
+
+import runner
+from common import provenance
+
+PIPELINE = textwrap.dedent("""
+    import json, os
+
+    def train_model():
+        with open("model.bin", "w") as f:
+            f.write({name!r})
+        state = {{"model_id": {name!r}, "version": "0.1.0", "hash_main": {hash!r},
+                  "model_file": "model.bin", "cwd": os.getcwd(), "pid": os.getpid()}}
+        with open("state.json", "w") as f:
+            json.dump(state, f)
+""")
+
+FAILING = textwrap.dedent("""
+    def train_model():
+        raise RuntimeError("sin datos")
+""")
+
+
+def _pipeline(domains_dir, name, source):
+    os.makedirs(domains_dir / name)
+    (domains_dir / name / runner.PIPELINE_FILE).write_text(source)
+
+
+@pytest.fixture
+def domains(tmp_path):
+    domains_dir = tmp_path / "domains"
+    _pipeline(domains_dir, "alpha", PIPELINE.format(name="alpha", hash="aa" * 32))
+    _pipeline(domains_dir, "beta", PIPELINE.format(name="beta", hash="bb" * 32))
+    _pipeline(domains_dir, "broken", FAILING)
+    # Ni un directorio sin pipeline ni un fichero suelto son dominios
+    os.makedirs(domains_dir / "notes")
+    (domains_dir / "README.md").write_text("")
+    return str(domains_dir)
+
+
+class Response:
+    def __init__(self, status_code, body=None, text=""):
+        self.status_code = status_code
+        self.body = body
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return self.body
+
+
+class FakeErnest:
+    """GET/POST /api/models en memoria, en lugar de la sesión de pooled_session."""
+
+    def __init__(self, models=()):
+        self.models = list(models)
+        self.posts = []
+        self.closed = False
+
+    def get(self, url, params=None, timeout=None):
+        return Response(200, [m for m in self.models if m["modelId"] == params["modelId"]])
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(json["modelId"])
+        self.models.append(json)
+        return Response(201, {"modelId": json["modelId"], "version": json["version"]})
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def ernest(monkeypatch):
+    fake = FakeErnest()
+    monkeypatch.setattr(provenance, "pooled_session", lambda pool_size: fake)
+    return fake
+
+
+def test_discover(domains):
+    assert runner.discover(domains) == ["alpha", "beta", "broken"]
+    assert runner.discover(domains, only=["beta", "alpha"]) == ["alpha", "beta"]
+    with pytest.raises(SystemExit, match="gamma"):
+        runner.discover(domains, only=["alpha", "gamma"])
+
+
+def test_train_domain(domains, tmp_path, monkeypatch):
+    # train_domain cambia de directorio: monkeypatch lo restaura
+    monkeypatch.chdir(tmp_path)
+    run_dir = str(tmp_path / "run")
+    result = runner.train_domain("alpha", run_dir, domains)
+    assert result["status"] == "trained"
+    assert set(result["timings"]) == {"import_s", "train_s"}
+    assert result["state"]["model_file"] == os.path.join(run_dir, "alpha", "model.bin")
+
+    failed = runner.train_domain("broken", run_dir, domains)
+    assert failed["status"] == "failed" and failed["error"] == "RuntimeError: sin datos"
+    assert "train_model" in failed["traceback"] and "state" not in failed
+
+
+def test_interrupt_is_not_swallowed(domains, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _pipeline(tmp_path / "domains", "ctrl_c", "def train_model():\n    raise KeyboardInterrupt\n")
+    with pytest.raises(KeyboardInterrupt):
+        runner.train_domain("ctrl_c", str(tmp_path / "run"), domains)
+
+
+def test_run_isolates_states_and_reports_failures(domains, tmp_path, ernest):
+    run_dir = str(tmp_path / "run")
+    report = runner.run(["alpha", "beta", "broken"], run_dir, workers=2, register_workers=2,
+                        domains_dir=domains)
+    alpha, beta, broken = (report["domains"][d] for d in ("alpha", "beta", "broken"))
+
+    # Cada dominio en su directorio, con su propio state.json
+    for name, result in (("alpha", alpha), ("beta", beta)):
+        work_dir = os.path.join(run_dir, name)
+        assert result["status"] == "trained"
+        assert os.path.realpath(result["state"]["cwd"]) == os.path.realpath(work_dir)
+        with open(os.path.join(work_dir, "state.json")) as f:
+            assert json.load(f)["model_id"] == name
+        with open(result["state"]["model_file"]) as f:
+            assert f.read() == name
+    # En procesos aparte del de los tests
+    assert os.getpid() not in (alpha["pid"], beta["pid"])
+
+    # El fallo se informa y los demás se entrenan y registran igualmente
+    assert broken["status"] == "failed" and broken["error"] == "RuntimeError: sin datos"
+    assert "traceback" not in broken and "RuntimeError" in report["errors"]["broken"]
+    assert sorted(ernest.posts) == ["alpha", "beta"]
+    assert alpha["registration"] == beta["registration"] == "registered"
+    assert alpha["version"] == "0.1.0+" + "aa" * 6
+    assert "register_s" in alpha["timings"] and "register_s" not in broken["timings"]
+    assert ernest.closed
+    assert report["slowest"] in ("alpha", "beta") and report["wall_s"] > 0
+
+
+def test_run_skips_registered_artifacts(domains, tmp_path, ernest):
+    ernest.models.append({"modelId": "alpha", "version": "0.1.0+" + "aa" * 6,
+                          "metadata": {"artifactHash": "aa" * 32}})
+    report = runner.run(["alpha", "beta"], str(tmp_path / "run"), workers=2, register_workers=2,
+                        domains_dir=domains)
+    assert report["domains"]["alpha"]["registration"] == "skipped"
+    assert report["domains"]["beta"]["registration"] == "registered"
+    assert ernest.posts == ["beta"]
+    assert report["errors"] == {}
+
+
+def test_run_without_registering(domains, tmp_path, monkeypatch):
+    monkeypatch.setattr(provenance, "pooled_session", lambda pool_size: pytest.fail("sin registro"))
+    report = runner.run(["beta"], str(tmp_path / "run"), workers=1, register_workers=1, register=False,
+                        domains_dir=domains)
+    beta = report["domains"]["beta"]
+    assert beta["status"] == "trained" and "registration" not in beta
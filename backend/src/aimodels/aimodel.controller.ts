@@ -1,4 +1,4 @@
-import { Controller, Get, Post, Body, Param, Put, Delete, Logger } from '@nestjs/common';
+import { Controller, Get, Post, Body, Param, Put, Delete, Logger, Query } from '@nestjs/common';
 import { AIModelService } from './aimodel.service';
 
 @Controller('api/models')
@@ -8,9 +8,21 @@ export class AIModelController {
   constructor(private readonly modelService: AIModelService) {}
 
   @Get()
-  async findAll() {
+  async findAll(
+    @Query('limit') limit?: string,
+    @Query('skip') skip?: string,
+    @Query('modelId') modelId?: string,
+    @Query('since') since?: string,
+    @Query('until') until?: string,
+  ) {
     this.logger.log('Fetching all AI models');
-    return await this.modelService.findAll();
+    return await this.modelService.findAll({
+      limit: limit !== undefined ? Number(limit) : undefined,
+      skip: skip !== undefined ? Number(skip) : undefined,
+      modelId,
+      since: since !== undefined ? new Date(Number(since) * 1000) : undefined,
+      until: until !== undefined ? new Date(Number(until) * 1000) : undefined,
+    });
   }
 
   @Get(':modelId')
@@ -16,8 +16,25 @@ export class AIModelService {
     return await this.aimodelModel.create(data);
   }
 
-  async findAll() {
-    return await this.aimodelModel.find().sort({ createdAt: -1 }).lean();
+  async findAll(options: { limit?: number; skip?: number; modelId?: string; since?: Date; until?: Date } = {}) {
+    const filter: any = {};
+    if (options.modelId) {
+      filter.modelId = options.modelId;
+    }
+    if (options.since || options.until) {
+      filter.createdAt = {};
+      if (options.since) filter.createdAt.$gte = options.since;
+      if (options.until) filter.createdAt.$lte = options.until;
+    }
+
+    let query = this.aimodelModel.find(filter).sort({ createdAt: -1 });
+    if (options.skip) {
+      query = query.skip(options.skip);
+    }
+    if (options.limit) {
+      query = query.limit(options.limit);
+    }
+    return await query.lean();
   }
 
   async findOne(modelId: string) {
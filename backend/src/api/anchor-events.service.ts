@@ -4,12 +4,41 @@ import { ethers } from 'ethers';
 import abiJson from '../abis/ErnestMerkleAnchor.json'; // Usa el ABI generado por Hardhat
 const abi = abiJson.abi;
 
+// Mirror of the Anchored log, extended incrementally: a refresh only asks the
+// node for the blocks after the last one scanned (in EVENTS_BLOCK_WINDOW
+// ranges), at most every EVENTS_REFRESH_MS, so paging through /api/events
+// never re-reads the whole log. Pages are cut from the mirror by position
+// (skip) or by log cursor (after=<blockNumber>:<logIndex>, binary search).
+const DEPLOY_BLOCK = Number(process.env.CONTRACT_DEPLOY_BLOCK ?? 0);
+const BLOCK_WINDOW = Number(process.env.EVENTS_BLOCK_WINDOW ?? 10000);
+const REFRESH_MS = Number(process.env.EVENTS_REFRESH_MS ?? 2000);
+
+export interface LogPosition {
+    blockNumber: number;
+    logIndex: number;
+}
+
+export interface EventsPageOptions {
+    after?: LogPosition;
+    fromBlock?: number;
+    toBlock?: number;
+    since?: number;
+    until?: number;
+    skip?: number;
+    limit?: number;
+}
+
 @Injectable()
 export class AnchorEventsService {
     private readonly logger = new Logger(AnchorEventsService.name);
     private provider: ethers.JsonRpcProvider;
     private contract: ethers.Contract;
 
+    private events: any[] = [];
+    private scannedTo = DEPLOY_BLOCK - 1;
+    private refreshedAt = 0;
+    private refreshing: Promise<void> | null = null;
+
     constructor() {
         const sepoliaUrl = process.env.INFURA_URL; // mete la url en tu secrets manager, .env o configVariable
         const contractAddress = process.env.CONTRACT_ADDRESS;         // pon la dirección del contrato desplegado
@@ -18,33 +47,128 @@ export class AnchorEventsService {
         this.contract = new ethers.Contract(contractAddress, abi, this.provider);
     }
 
-    async getAllAnchoredEvents(): Promise<any[]> {
-        const filter = this.contract.filters.Anchored(); // No filtra por args, muestra todos los eventos
-        const events = await this.contract.queryFilter(filter, 0, 'latest');
-        return events.map(e => {
-            // Type guard: solo si e tiene 'args' (EventLog)
-            if ("args" in e && Array.isArray(e.args)) {
-                this.logger.log(e.args);
-                return {
-                    technicalAddress: e.args[0],
-                    merkleRoot: e.args[1],
-                    organizationId: e.args[2]?.hash,
-                    organizationName: e.args[3],
-                    domain: e.args[4],
-                    timestamp: Number(e.args[5])
-                };
-            }
-            // Si no tiene 'args', devuelve log vacío (o los valores crudos del log si lo necesitas)
+    private toEvent(e: ethers.Log | ethers.EventLog): any {
+        const position = {
+            blockNumber: e.blockNumber,
+            logIndex: e.index,
+            transactionHash: e.transactionHash,
+        };
+        // Type guard: solo si e tiene 'args' (EventLog)
+        if ("args" in e && Array.isArray(e.args)) {
             return {
-                technicalAddress: null,
-                merkleRoot: null,
-                organizationId: null,
-                organizationName: null,
-                domain: null,
-                timestamp: null
+                technicalAddress: e.args[0],
+                merkleRoot: e.args[1],
+                organizationId: e.args[2]?.hash,
+                organizationName: e.args[3],
+                domain: e.args[4],
+                timestamp: Number(e.args[5]),
+                ...position,
             };
-        });
+        }
+        // Si no tiene 'args', devuelve log vacío (o los valores crudos del log si lo necesitas)
+        return {
+            technicalAddress: null,
+            merkleRoot: null,
+            organizationId: null,
+            organizationName: null,
+            domain: null,
+            timestamp: null,
+            ...position,
+        };
+    }
+
+    private async refresh(): Promise<void> {
+        if (Date.now() - this.refreshedAt < REFRESH_MS) {
+            return;
+        }
+        // One scan at a time; concurrent requests wait for the same one
+        if (!this.refreshing) {
+            this.refreshing = this.scanNewBlocks().finally(() => {
+                this.refreshing = null;
+            });
+        }
+        await this.refreshing;
+    }
+
+    private async scanNewBlocks(): Promise<void> {
+        const latest = await this.provider.getBlockNumber();
+        const filter = this.contract.filters.Anchored(); // No filtra por args, muestra todos los eventos
+        const before = this.events.length;
+        while (this.scannedTo < latest) {
+            const from = this.scannedTo + 1;
+            const to = Math.min(from + BLOCK_WINDOW - 1, latest);
+            // Logs come back in (blockNumber, logIndex) order
+            const logs = await this.contract.queryFilter(filter, from, to);
+            for (const e of logs) {
+                this.events.push(this.toEvent(e));
+            }
+            this.scannedTo = to;
+        }
+        this.refreshedAt = Date.now();
+        if (this.events.length > before) {
+            this.logger.log(`Anchored events: ${this.events.length - before} new up to block ${latest}`);
+        }
+    }
+
+    // Index of the first mirrored event strictly after (blockNumber, logIndex)
+    private firstAfter(blockNumber: number, logIndex: number): number {
+        let lo = 0;
+        let hi = this.events.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            const e = this.events[mid];
+            if (e.blockNumber < blockNumber || (e.blockNumber === blockNumber && e.logIndex <= logIndex)) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
 
+    async getAllAnchoredEvents(): Promise<any[]> {
+        await this.refresh();
+        return this.events.slice();
+    }
+
+    /**
+     * One page of anchored events. The block range and the cursor are index
+     * lookups; the time range (an event argument, not indexed) is filtered
+     * over that range before skip/limit are applied.
+     */
+    async getEventsPage(options: EventsPageOptions): Promise<any[]> {
+        await this.refresh();
+        let start = 0;
+        let end = this.events.length;
+        if (options.after) {
+            start = this.firstAfter(options.after.blockNumber, options.after.logIndex);
+        }
+        if (options.fromBlock !== undefined) {
+            start = Math.max(start, this.firstAfter(options.fromBlock - 1, Infinity));
+        }
+        if (options.toBlock !== undefined) {
+            end = this.firstAfter(options.toBlock, Infinity);
+        }
+        const skip = options.skip ?? 0;
+        const limit = options.limit ?? end;
+
+        if (options.since === undefined && options.until === undefined) {
+            return this.events.slice(Math.min(start + skip, end), Math.min(start + skip + limit, end));
+        }
+        const page = [];
+        let skipped = 0;
+        for (let i = start; i < end && page.length < limit; i++) {
+            const e = this.events[i];
+            if (e.timestamp === null) continue;
+            if (options.since !== undefined && e.timestamp < options.since) continue;
+            if (options.until !== undefined && e.timestamp > options.until) continue;
+            if (skipped < skip) {
+                skipped++;
+                continue;
+            }
+            page.push(e);
+        }
+        return page;
     }
 
     // Puedes añadir filtros por dominio, orgId, rango de fechas, etc.
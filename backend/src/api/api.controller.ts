@@ -1,8 +1,8 @@
-import { Controller, Post, Get, Body, Param, HttpCode, HttpStatus, ParseIntPipe, Logger, Query } from '@nestjs/common';
+import { Controller, Post, Get, Body, Param, HttpCode, HttpStatus, ParseIntPipe, Logger, Query, BadRequestException } from '@nestjs/common';
 import { ApiService } from './api.service';
 import { RegisterModelDto } from './dto/register-model.dto';
 import { LogInferenceDto } from './dto/log-inference.dto';
-import { AnchorEventsService } from './anchor-events.service';
+import { AnchorEventsService, LogPosition } from './anchor-events.service';
 
 @Controller('api')
 export class ApiController {
@@ -44,8 +44,12 @@ export class ApiController {
   }
 
   @Get('blocks')
-  async getAllBlocks() {
-    return await this.apiService.getAllBlocks();
+  async getAllBlocks(@Query('from') from?: string, @Query('limit') limit?: string) {
+    // Without paging params keep returning the whole chain (frontend, debug)
+    if (from === undefined && limit === undefined) {
+      return await this.apiService.getAllBlocks();
+    }
+    return await this.apiService.getBlocksRange(Number(from ?? 0), Number(limit ?? 1000));
   }
 
   @Get('blocks/:index')
@@ -77,8 +81,30 @@ export class ApiController {
   }
 
   @Get('events')
-  async getAllEvents() {
-    return await this.anchorEventsService.getAllAnchoredEvents();
+  async getAllEvents(
+    @Query('limit') limit?: string,
+    @Query('skip') skip?: string,
+    @Query('after') after?: string,
+    @Query('fromBlock') fromBlock?: string,
+    @Query('toBlock') toBlock?: string,
+    @Query('since') since?: string,
+    @Query('until') until?: string,
+  ) {
+    if ([limit, skip, after, fromBlock, toBlock, since, until].every(v => v === undefined)) {
+      return await this.anchorEventsService.getAllAnchoredEvents();
+    }
+    // Paging is answered from the service's mirror: after=<blockNumber>:<logIndex>
+    // (the position of the last event already seen) and fromBlock/toBlock are
+    // index lookups; since/until (unix seconds) are applied before skip/limit
+    return await this.anchorEventsService.getEventsPage({
+      after: after !== undefined ? parseLogPosition(after) : undefined,
+      fromBlock: optionalInt('fromBlock', fromBlock),
+      toBlock: optionalInt('toBlock', toBlock),
+      since: optionalInt('since', since),
+      until: optionalInt('until', until),
+      skip: optionalInt('skip', skip),
+      limit: optionalInt('limit', limit),
+    });
   }
 
   @Get('events/address')
@@ -92,3 +118,22 @@ export class ApiController {
   }
 
 }
+
+function optionalInt(name: string, value?: string): number | undefined {
+  if (value === undefined) {
+    return undefined;
+  }
+  const n = Number(value);
+  if (!Number.isInteger(n) || n < 0) {
+    throw new BadRequestException(`${name} must be a non-negative integer`);
+  }
+  return n;
+}
+
+function parseLogPosition(value: string): LogPosition {
+  const [block, index, ...rest] = value.split(':');
+  if (index === undefined || rest.length > 0) {
+    throw new BadRequestException('after must be <blockNumber>:<logIndex>');
+  }
+  return { blockNumber: optionalInt('after', block), logIndex: optionalInt('after', index) };
+}
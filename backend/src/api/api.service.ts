@@ -131,6 +131,10 @@ export class ApiService {
     return await this.blockchainService.getAllBlocks();
   }
 
+  async getBlocksRange(fromIndex: number, limit: number) {
+    return await this.blockchainService.getBlocksRange(fromIndex, limit);
+  }
+
   async getBlockByIndex(index: number) {
     return await this.blockchainService.getBlockByIndex(index);
   }
@@ -299,6 +299,18 @@ export class BlockchainService implements OnModuleInit {
             .lean();
     }
 
+    /**
+     * Get a page of blocks ordered by index, starting at fromIndex
+     */
+    async getBlocksRange(fromIndex: number, limit: number): Promise<any[]> {
+        const pageSize = Math.min(Math.max(limit || 1, 1), 10000);
+        return await this.provenanceBlockModel
+            .find({ index: { $gte: fromIndex || 0 } })
+            .sort({ index: 1 })
+            .limit(pageSize)
+            .lean();
+    }
+
     /**
      * Get block by index
     */
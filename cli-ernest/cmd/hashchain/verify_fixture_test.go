@@ -0,0 +1,223 @@
+package hashchain
+
+import (
+	"bytes"
+	"encoding/json"
+	"flag"
+	"os"
+	"path/filepath"
+	"reflect"
+	"strings"
+	"testing"
+)
+
+// testdata/chains.json holds small chains (valid, tampered, genesis cases)
+// with the hash CalculateBlockHash gives every block and the blocks
+// verifyBlock rejects. The auditor's Python verifier
+// (agentic-auditor/app/agent/hashchain.py) is checked against the same file.
+//
+//	go test ./cmd/hashchain -run TestFixture -update   # rewrite it
+var update = flag.Bool("update", false, "rewrite testdata/chains.json")
+
+const fixturePath = "testdata/chains.json"
+
+type fixtureChain struct {
+	Name    string                   `json:"name"`
+	Blocks  []map[string]interface{} `json:"blocks"`
+	Hashes  []string                 `json:"hashes"`
+	Invalid []int64                  `json:"invalid"`
+}
+
+// Payloads covering the canonicalization rules: nil/"" removal, nested
+// empty maps and slices, key order, floats, big ints and JSON escaping.
+func fixturePayloads() []map[string]interface{} {
+	return []map[string]interface{}{
+		{
+			"type":        "model_inference",
+			"modelId":     "llama3-8b",
+			"inferenceId": "inf-1",
+			"inputHash":   "",
+			"outputHash":  nil,
+			"metadata":    map[string]interface{}{"latency_ms": int64(42), "tokens": int64(0), "ok": true},
+		},
+		{
+			"type":    "agent_action",
+			"agentId": "agent-7",
+			"metadata": map[string]interface{}{
+				"cost":   0.1,
+				"tiny":   1e-7,
+				"huge":   1e21,
+				"big":    1e20,
+				"neg":    -2.5,
+				"whole":  3.0,
+				"exact":  123456789.125,
+				"maxInt": int64(9007199254740993),
+			},
+		},
+		{
+			"type":    "model_registration",
+			"modelId": "mistral-7b",
+			"metadata": map[string]interface{}{
+				"html":      "<script>alert('x') && \"y\"</script>",
+				"separator": "a\u2028b\u2029c",
+				"control":   "tab\tnl\nbs\bff\f",
+				"unicode":   "ñandú 漢字 😀",
+				"Zeta":      "upper case sorts first",
+			},
+		},
+		{
+			"type":    "model_inference",
+			"modelId": "phi-3",
+			"metadata": map[string]interface{}{
+				"empty":  map[string]interface{}{},
+				"blanks": map[string]interface{}{"a": "", "b": nil},
+				"list":   []interface{}{"x", "", nil, int64(1), map[string]interface{}{"k": "v", "drop": ""}},
+				"none":   []interface{}{"", nil},
+				"nested": map[string]interface{}{"deep": map[string]interface{}{"deeper": []interface{}{false, 0.5}}},
+			},
+		},
+	}
+}
+
+func chainBlock(index int64, data map[string]interface{}, previous string) map[string]interface{} {
+	block := map[string]interface{}{
+		"index":        index,
+		"timestamp":    int64(1700000000) + index,
+		"data":         data,
+		"previousHash": previous,
+	}
+	block["hash"] = CalculateBlockHash(MapResultsToBlocks([]map[string]interface{}{block})[0])
+	return block
+}
+
+// validChain builds genesis plus one block per payload; genesisHash
+// overrides the stored hash of the genesis block (the rest link to it).
+func validChain(genesisHash string) []map[string]interface{} {
+	genesis := chainBlock(0, map[string]interface{}{
+		"type":     "model_registration",
+		"modelId":  "genesis",
+		"metadata": map[string]interface{}{"description": "Genesis block for Ernest PoC"},
+	}, "0")
+	if genesisHash != "" {
+		genesis["hash"] = genesisHash
+	}
+	blocks := []map[string]interface{}{genesis}
+	for i, data := range fixturePayloads() {
+		blocks = append(blocks, chainBlock(int64(i+1), data, blocks[i]["hash"].(string)))
+	}
+	return blocks
+}
+
+func buildFixture() []fixtureChain {
+	tamperedData := validChain("")
+	tamperedData[2]["data"].(map[string]interface{})["agentId"] = "agent-8"
+
+	tamperedHash := validChain("")
+	tamperedHash[3]["hash"] = strings.Repeat("0", 64)
+
+	brokenLink := validChain("")
+	brokenLink[4] = chainBlock(4, brokenLink[4]["data"].(map[string]interface{}), strings.Repeat("a", 64))
+
+	// Only the genesis block's hash is wrong: verifyBlock never recomputes it
+	badGenesis := validChain(strings.Repeat("f", 64))
+
+	tamperedGenesis := validChain("")
+	tamperedGenesis[0]["data"].(map[string]interface{})["modelId"] = "not-genesis"
+
+	chains := []fixtureChain{
+		{Name: "valid", Blocks: validChain("")},
+		{Name: "tampered_data", Blocks: tamperedData},
+		{Name: "tampered_hash", Blocks: tamperedHash},
+		{Name: "broken_link", Blocks: brokenLink},
+		{Name: "bad_genesis_hash", Blocks: badGenesis},
+		{Name: "tampered_genesis", Blocks: tamperedGenesis},
+	}
+	for i := range chains {
+		expect(&chains[i])
+	}
+	return chains
+}
+
+func expect(chain *fixtureChain) {
+	blocks := MapResultsToBlocks(chain.Blocks)
+	chain.Hashes = make([]string, len(blocks))
+	chain.Invalid = []int64{}
+	for i := range blocks {
+		chain.Hashes[i] = CalculateBlockHash(blocks[i])
+		if verifyBlock(blocks, i) != nil {
+			chain.Invalid = append(chain.Invalid, blocks[i].Index)
+		}
+	}
+}
+
+// Numbers decode as Mongo returns them: int64 unless they have a fraction
+// or an exponent or do not fit.
+func mongoNumbers(v interface{}) interface{} {
+	switch t := v.(type) {
+	case json.Number:
+		if strings.ContainsAny(t.String(), ".eE") {
+			f, _ := t.Float64()
+			return f
+		}
+		if n, err := t.Int64(); err == nil {
+			return n
+		}
+		// Whole doubles beyond int64 (1e20 is written without a fraction)
+		f, _ := t.Float64()
+		return f
+	case map[string]interface{}:
+		for k, item := range t {
+			t[k] = mongoNumbers(item)
+		}
+	case []interface{}:
+		for i, item := range t {
+			t[i] = mongoNumbers(item)
+		}
+	}
+	return v
+}
+
+func loadFixture(t *testing.T) []fixtureChain {
+	raw, err := os.ReadFile(fixturePath)
+	if err != nil {
+		t.Fatalf("read %s: %v", fixturePath, err)
+	}
+	dec := json.NewDecoder(bytes.NewReader(raw))
+	dec.UseNumber()
+	var chains []fixtureChain
+	if err := dec.Decode(&chains); err != nil {
+		t.Fatalf("decode %s: %v", fixturePath, err)
+	}
+	for _, chain := range chains {
+		for _, block := range chain.Blocks {
+			mongoNumbers(block)
+		}
+	}
+	return chains
+}
+
+func TestFixture(t *testing.T) {
+	if *update {
+		out, err := json.MarshalIndent(buildFixture(), "", "  ")
+		if err != nil {
+			t.Fatal(err)
+		}
+		if err := os.MkdirAll(filepath.Dir(fixturePath), 0o755); err != nil {
+			t.Fatal(err)
+		}
+		if err := os.WriteFile(fixturePath, append(out, '\n'), 0o644); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	for _, chain := range loadFixture(t) {
+		got := fixtureChain{Name: chain.Name, Blocks: chain.Blocks}
+		expect(&got)
+		if !reflect.DeepEqual(got.Hashes, chain.Hashes) {
+			t.Errorf("%s: hashes %v, fixture %v", chain.Name, got.Hashes, chain.Hashes)
+		}
+		if !reflect.DeepEqual(got.Invalid, chain.Invalid) {
+			t.Errorf("%s: invalid blocks %v, fixture %v", chain.Name, got.Invalid, chain.Invalid)
+		}
+	}
+}
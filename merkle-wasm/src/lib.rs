@@ -106,6 +106,21 @@ mod tests {
         assert!(result.is_err());
     }
 
+    // testdata/roots.txt is also read by the auditor's Python tree
+    // (agentic-auditor/tests/test_merkle.py): both must give these roots.
+    #[test]
+    fn test_merkle_root_fixture() {
+        for line in include_str!("../testdata/roots.txt").lines() {
+            if line.starts_with('#') || line.trim().is_empty() {
+                continue;
+            }
+            let (count, root) = line.split_once(' ').unwrap();
+            let count: usize = count.parse().unwrap();
+            let leaves = (0..count).map(|i| hash_data(&format!("leaf-{}", i))).collect();
+            assert_eq!(calculate_merkle_root(leaves).unwrap(), root, "{} leaves", count);
+        }
+    }
+
     #[test]
     fn test_invalid_hex() {
         let invalid_hash = "not_valid_hex".to_string();